@@ -0,0 +1,126 @@
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from playwright.async_api import Browser, async_playwright
+from request_blocking import BlockingProfile
+from location_cache import LocationCache
+from metrics import metrics
+from http_fetch import BASE_URL
+from href_progress import HrefProgress
+from rate_limiter import AdaptiveRateLimiter, guarded_goto_async
+from wait_strategy import WaitStrategy
+
+
+async def _resolve_href(browser: Browser, semaphore: asyncio.Semaphore, href: str,
+                        blocking: BlockingProfile | None, limiter: AdaptiveRateLimiter | None,
+                        base_url: str, wait: WaitStrategy | None) -> str:
+    # 每個 href 都用新的 context，和 run2 一樣避免 cookies 被沿用
+    async with semaphore:
+        context = await browser.new_context()
+        try:
+            if blocking is not None:
+                await blocking.apply_async(context, href)
+            page = await context.new_page()
+            full_url = base_url + href
+            await guarded_goto_async(page, full_url, limiter, "#location_filter .js-title", wait=wait)
+            with metrics.stage("extract"):
+                location_span = page.locator("#location_filter .js-title").first
+                return await location_span.inner_text()
+        finally:
+            await context.close()
+
+
+async def run2_async(href_list: List, concurrency: int = 5, headless: bool = False,
+                     blocking: BlockingProfile | None = None,
+                     limiter: AdaptiveRateLimiter | None = None, base_url: str = BASE_URL,
+                     return_exceptions: bool = False, wait: WaitStrategy | None = None) -> List:
+    """
+    run2 的 asyncio 版本：同時解析多個地點頁面，最多 concurrency 個同時進行。
+    回傳的 list 順序和 href_list 相同，href 為 None 的位置回傳 None。
+
+    Args:
+        href_list (list): run 回傳的 href 列表。
+        concurrency (int): 同時開啟的頁面上限。
+        headless (bool): 傳給 chromium.launch 的 headless 參數。
+        blocking (BlockingProfile): 套用到每個 context 的請求攔截設定，None 代表不攔截。
+        limiter (AdaptiveRateLimiter): 和其他導覽共用的速率限制，None 代表不限制。
+        base_url (str): href 前面要加上的網站位址。
+        return_exceptions (bool): 為 True 時失敗的 href 在回傳的 list 中以例外物件表示，不影響其他 href。
+        wait (WaitStrategy): 導覽的等待策略，None 代表等 load。
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    async with async_playwright() as playwright:
+        with metrics.stage("browser_launch"):
+            browser = await playwright.chromium.launch(headless=headless)
+        try:
+            tasks = [
+                _resolve_href(browser, semaphore, href, blocking, limiter, base_url, wait) if href is not None else asyncio.sleep(0, result=None)
+                for href in href_list
+            ]
+            return list(await asyncio.gather(*tasks, return_exceptions=return_exceptions))
+        finally:
+            await browser.close()
+
+
+def resolve_locations(href_list: List, concurrency: int = 5, headless: bool = False,
+                      blocking: BlockingProfile | None = None, cache: LocationCache | None = None,
+                      limiter: AdaptiveRateLimiter | None = None, base_url: str = BASE_URL,
+                      progress: HrefProgress | None = None, project_index: int | None = None,
+                      wait: WaitStrategy | None = None) -> List[str|None]:
+    """
+    給同步程式呼叫的入口。
+    在獨立的 thread 中執行 event loop，所以在 `with sync_playwright()` 區塊內呼叫也不會衝突。
+    有 cache 時先查快取，只有未命中的 href 才會開頁面。
+    有 progress 時已解析的名次直接沿用，每個 href 的結果各自記錄，失敗的 href 不影響其他 href
+    (還有可重試的失敗時拋出 PartialResultError)。
+    """
+    known = progress.known(project_index) if progress is not None else {}
+    location = []
+    pending = []
+    for rank, href in enumerate(href_list, start=1):
+        city = None
+        if href is not None and progress is not None:
+            done, city = progress.resolved(project_index, rank, href, known)
+            if done:
+                location.append(city)
+                pending.append(None)
+                continue
+        if href is not None and cache is not None:
+            city = cache.get(href)
+        location.append(city)
+        pending.append(href if city is None else None)
+    if all(href is None for href in pending):
+        return location
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        resolved = executor.submit(asyncio.run, run2_async(pending, concurrency, headless, blocking, limiter, base_url,
+                                                           return_exceptions=progress is not None,
+                                                           wait=wait)).result()
+
+    failed = {}
+    for j, href in enumerate(pending):
+        if href is None:
+            continue
+        if isinstance(resolved[j], BaseException):
+            print(f"第 {j + 1} 名 {href} 解析失敗: {resolved[j]}")
+            if not progress.record_failure(project_index, j + 1, href, resolved[j]):
+                failed[j + 1] = resolved[j]
+            continue
+        location[j] = resolved[j]
+        if cache is not None:
+            cache.put(href, resolved[j])
+        if progress is not None:
+            progress.record(project_index, j + 1, href, resolved[j])
+    if progress is not None:
+        progress.raise_if_incomplete(project_index, failed, [])
+    return location
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resolve Kickstarter location hrefs concurrently")
+    parser.add_argument("hrefs", nargs="+", help="/discover/places/... hrefs")
+    parser.add_argument("--concurrency", type=int, default=5, help="同時開啟的頁面上限")
+    args = parser.parse_args()
+
+    print(resolve_locations(args.hrefs, args.concurrency))
@@ -0,0 +1,292 @@
+import argparse
+import json
+import os
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Dict, List
+import pandas as pd
+from playwright.sync_api import sync_playwright
+from metrics import metrics
+from request_blocking import BlockingProfile
+from rate_limiter import AdaptiveRateLimiter
+from http_fetch import LocationFetcher
+from browser_pool import BrowserPool
+from storage_state import StorageStateManager
+from wait_strategy import WAIT_MODES, WaitStrategy
+from fixture_server import FixtureConfig, FixtureServer, community_rows
+from get_backer_city_state import CrawlConfig, crawl_csv, run, run2
+from process_tree import tree_rss
+from done_index import community_url
+
+MODES = ("run", "run2", "loop")
+COMPARED_FIELDS = ("projects_per_sec", "pages_per_sec", "peak_rss_mb", "browser_launches", "driver_launches")
+
+
+class RssSampler:
+    """
+    在背景 thread 中定期量測目前 process 與所有子 process 的 RSS 總和，記錄最大值。
+    無法量測的平台上 peak_bytes 為 None。
+    """
+    def __init__(self, interval: float = 0.2):
+        self.interval = interval
+        self.peak_bytes: int | None = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+
+    def _sample(self):
+        current = tree_rss(os.getpid())
+        if current is not None and (self.peak_bytes is None or current > self.peak_bytes):
+            self.peak_bytes = current
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._sample()
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_run(server: FixtureServer, projects: int, blocking, limiter, headless: bool,
+              storage: StorageStateManager | None, wait: WaitStrategy) -> int:
+    """
+    只跑 run (community 頁面 -> href 列表)，回傳成功的專案數。
+    """
+    done = 0
+    with sync_playwright() as playwright:
+        for n in range(projects):
+            try:
+                run(playwright, community_url(server.project_url(n)), blocking, limiter, headless, storage, wait)
+                done += 1
+            except Exception as e:
+                print(f"[benchmark] run 專案 {n} 失敗: {e}")
+    return done
+
+
+def bench_run2(server: FixtureServer, projects: int, blocking, limiter, headless: bool,
+               use_http_fetch: bool, storage: StorageStateManager | None, wait: WaitStrategy) -> int:
+    """
+    只跑 run2 (地點頁面 -> 城市)，href 列表直接由 fixture 的內容產生，不經過 run。
+    """
+    done = 0
+    with sync_playwright() as playwright:
+        fetcher = LocationFetcher(playwright, limiter, base_url=server.base_url) if use_http_fetch else None
+        try:
+            with BrowserPool(playwright, headless=headless, storage_state=storage) as pool:
+                for n in range(projects):
+                    href_list: List[str | None] = [
+                        href if country == "United States" else None
+                        for href, _, country in community_rows(f"project-{n}", server.config)
+                    ]
+                    try:
+                        run2(playwright, href_list, pool=pool, blocking=blocking, limiter=limiter,
+                             fetcher=fetcher, base_url=server.base_url, wait=wait)
+                        done += 1
+                    except Exception as e:
+                        print(f"[benchmark] run2 專案 {n} 失敗: {e}")
+        finally:
+            if fetcher is not None:
+                fetcher.close()
+    return done
+
+
+def bench_loop(server: FixtureServer, projects: int, blocking, limiter, headless: bool,
+               use_http_fetch: bool, location_concurrency: int, use_storage_state: bool, pipeline_depth: int,
+               wait: WaitStrategy, work_dir: str) -> int:
+    """
+    產生一份指向 fixture server 的專案 CSV，跑完整的 crawl_csv，回傳寫入資料庫的專案數。
+    """
+    csv_path = os.path.join(work_dir, "projects.csv")
+    db_path = os.path.join(work_dir, "benchmark.db")
+    pd.DataFrame({
+        "id": range(1, projects + 1),
+        "row": range(projects),
+        "backers_count": [100] * projects,
+        "urls_web_project": [server.project_url(n) for n in range(projects)],
+    }).to_csv(csv_path, index=False)
+
+    config = CrawlConfig(location_concurrency=location_concurrency, blocking=blocking, limiter=limiter,
+                         use_http_fetch=use_http_fetch, export_metrics=False, headless=headless,
+                         base_url=server.base_url, use_storage_state=use_storage_state,
+                         pipeline_depth=pipeline_depth, wait=wait,
+                         retry_failed=False)  # 注入的失敗不等 retry_delay 重試，只量一輪的吞吐量
+    crawl_csv(csv_path, db_path, config=config)
+
+    with sqlite3.connect(db_path) as conn:
+        has_table = conn.execute("SELECT 1 FROM sqlite_master WHERE type IN ('table', 'view') "
+                                 "AND name = 'backer_location'").fetchone()
+        done = conn.execute("SELECT COUNT(*) FROM backer_location").fetchone()[0] if has_table else 0
+        if done == 0:
+            # 一個專案都沒有寫入代表流程本身壞了 (例如結果格式不符)，不是速度的問題，不能當成 0 專案/秒的結果
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM crawl_queue GROUP BY status").fetchall())
+            error = conn.execute("SELECT last_error FROM crawl_queue WHERE last_error IS NOT NULL "
+                                 "ORDER BY updated_at DESC LIMIT 1").fetchone()
+            raise RuntimeError(f"loop 模式沒有任何專案寫入資料庫，佇列狀態 {counts}，"
+                               f"最後的錯誤: {error[0] if error else None}")
+    return done
+
+
+def run_benchmark(mode: str, projects: int = 20, config: FixtureConfig | None = None, block_assets: bool = True,
+                  use_http_fetch: bool = False, location_concurrency: int = 1, rate: float = 50.0,
+                  backoff: float = 1.0, headless: bool = True, use_storage_state: bool = False,
+                  pipeline_depth: int = 0, wait_mode: str = "load") -> Dict:
+    """
+    啟動 fixture server 並以指定模式跑 benchmark，回傳結果 (專案/秒、頁面/秒、最大 RSS、browser 啟動次數)。
+
+    Args:
+        mode (str): "run" / "run2" / "loop" (完整的 crawl_csv)。
+        projects (int): 假專案數量。
+        config (FixtureConfig): fixture server 的延遲與失敗注入設定。
+        block_assets (bool): 是否套用 BlockingProfile。
+        use_http_fetch (bool): 地點頁面先用 HTTP 請求解析 (run2 / loop)。
+        location_concurrency (int): loop 模式傳給 crawl_csv 的 location_concurrency。
+        rate (float): limiter 的速率 (每秒導覽次數)，本機測試時設高一點才量得到爬蟲本身的速度。
+        backoff (float): 被擋 (注入的 429 / 驗證頁) 時第一次暫停的秒數。
+        headless (bool): 傳給 chromium.launch 的 headless 參數。
+        use_storage_state (bool): context 是否從同一份 storage state 建立 (和全新的 context 比較)。
+        pipeline_depth (int): loop 模式傳給 crawl_csv 的 pipeline_depth，0 代表逐一處理。
+        wait_mode (str): 導覽的等待策略 (見 WaitStrategy)。
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}, got {mode!r}")
+    config = config or FixtureConfig()
+    blocking = BlockingProfile(allowed_domains=None, verbose=False) if block_assets else None
+    wait = WaitStrategy(wait_mode)
+    limiter = AdaptiveRateLimiter(rate=rate, burst=max(1, int(rate)), max_rate=rate, backoff_base=backoff,
+                                  backoff_max=backoff * 8, report_every=0)
+
+    metrics.reset()
+    with FixtureServer(config) as server, RssSampler() as sampler, tempfile.TemporaryDirectory() as work_dir:
+        storage = StorageStateManager(os.path.join(work_dir, "storage_state.json"), server.base_url + "/discover",
+                                      limiter=limiter) if use_storage_state else None
+        started = time.perf_counter()
+        if mode == "run":
+            done = bench_run(server, projects, blocking, limiter, headless, storage, wait)
+        elif mode == "run2":
+            done = bench_run2(server, projects, blocking, limiter, headless, use_http_fetch, storage, wait)
+        else:
+            done = bench_loop(server, projects, blocking, limiter, headless, use_http_fetch,
+                              location_concurrency, use_storage_state, pipeline_depth, wait, work_dir)
+        elapsed = time.perf_counter() - started
+        requests = dict(server.requests)
+        injected = dict(server.injected)
+
+    summary = metrics.summary()
+    pages = summary["counters"].get("pages", 0)
+    stages = summary["stages"]
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": _git_commit(),
+        "mode": mode,
+        "options": {
+            "projects": projects, "block_assets": block_assets, "use_http_fetch": use_http_fetch,
+            "location_concurrency": location_concurrency, "rate": rate, "backoff": backoff,
+            "headless": headless, "use_storage_state": use_storage_state,
+            "pipeline_depth": pipeline_depth, "wait": wait_mode, "fixture": config.to_dict(),
+        },
+        "elapsed_sec": round(elapsed, 3),
+        "projects_done": done,
+        "projects_per_sec": round(done / elapsed, 3) if elapsed else 0.0,
+        "pages": pages,
+        "pages_per_sec": round(pages / elapsed, 3) if elapsed else 0.0,
+        "peak_rss_mb": round(sampler.peak_bytes / 2**20, 1) if sampler.peak_bytes is not None else None,
+        "browser_launches": stages.get("browser_launch", {}).get("count", 0),
+        "driver_launches": stages.get("driver_launch", {}).get("count", 0),
+        "server_requests": requests,
+        "injected": injected,
+        "blocked": {k: v for k, v in summary["counters"].items() if k.startswith("blocked_")},
+        "stages": {name: {"p50": s["p50"], "p95": s["p95"], "count": s["count"]} for name, s in stages.items()},
+        "errors": summary["errors"],
+    }
+
+
+def load_previous(results_path: str, result: Dict) -> Dict | None:
+    """
+    找出 results_path 中最後一筆模式與設定都相同的結果，用來比較。
+    """
+    if not os.path.exists(results_path):
+        return None
+    previous = None
+    with open(results_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("mode") == result["mode"] and record.get("options") == result["options"]:
+                previous = record
+    return previous
+
+
+def save_result(results_path: str, result: Dict):
+    with open(results_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+
+def report(result: Dict, previous: Dict | None = None):
+    print(f"[benchmark] {result['mode']}: {result['projects_done']}/{result['options']['projects']} 個專案，"
+          f"{result['elapsed_sec']:.1f} 秒，{result['projects_per_sec']} 專案/秒，{result['pages_per_sec']} 頁/秒，"
+          f"最大 RSS {result['peak_rss_mb']} MB，啟動 browser {result['browser_launches']} 次，"
+          f"啟動 driver {result['driver_launches']} 次")
+    print(f"[benchmark] 伺服器請求 {result['server_requests']}，注入失敗 {result['injected']}，封鎖 {result['blocked']}")
+    for name, stats in result["stages"].items():
+        print(f"[benchmark]   {name:<16} 次數 {stats['count']:>6}  p50 {stats['p50']:.3f}s  p95 {stats['p95']:.3f}s")
+    if previous is None:
+        return
+    print(f"[benchmark] 和 {previous['timestamp']} ({previous.get('commit')}) 比較:")
+    for field in COMPARED_FIELDS:
+        old, new = previous.get(field), result.get(field)
+        if old is None or new is None:
+            continue
+        change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+        print(f"[benchmark]   {field:<18} {old} -> {new} ({change})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the scraper against a local Kickstarter fixture server")
+    parser.add_argument("--mode", choices=MODES + ("all",), default="all", help="要測的部分，all 代表三種都跑")
+    parser.add_argument("--projects", type=int, default=20, help="假專案數量")
+    parser.add_argument("--latency", type=float, default=0.05, help="fixture server 每個回應的延遲秒數")
+    parser.add_argument("--jitter", type=float, default=0.0, help="額外隨機延遲的上限秒數")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="回傳 429 的機率")
+    parser.add_argument("--challenge-rate", type=float, default=0.0, help="回傳驗證頁面的機率")
+    parser.add_argument("--fixtures-dir", default=None, help="錄下來的 HTML 所在資料夾，沒有對應檔案時使用合成頁面")
+    parser.add_argument("--seed", type=int, default=0, help="延遲與失敗注入的亂數種子")
+    parser.add_argument("--no-block-assets", action="store_true", help="不擋圖片 / 字型 / 影音請求")
+    parser.add_argument("--http-fetch", action="store_true", help="地點頁面先用 HTTP 請求解析")
+    parser.add_argument("--concurrency", type=int, default=1, help="loop 模式的 location_concurrency")
+    parser.add_argument("--rate", type=float, default=50.0, help="limiter 速率 (每秒導覽次數)")
+    parser.add_argument("--storage-state", action="store_true", help="context 從同一份 storage state 建立")
+    parser.add_argument("--pipeline-depth", type=int, default=0, help="loop 模式中 run / run2 之間 queue 的容量")
+    parser.add_argument("--wait", choices=WAIT_MODES, default="load", help="導覽的等待策略")
+    parser.add_argument("--headed", action="store_true", help="顯示瀏覽器視窗")
+    parser.add_argument("--output", default="benchmark_results.jsonl", help="結果附加寫入的 JSONL 檔案")
+    args = parser.parse_args()
+
+    fixture_config = FixtureConfig(latency=args.latency, jitter=args.jitter, failure_rate=args.failure_rate,
+                                   challenge_rate=args.challenge_rate, fixtures_dir=args.fixtures_dir, seed=args.seed)
+    for mode in (MODES if args.mode == "all" else (args.mode,)):
+        result = run_benchmark(mode, args.projects, fixture_config, block_assets=not args.no_block_assets,
+                               use_http_fetch=args.http_fetch, location_concurrency=args.concurrency,
+                               rate=args.rate, headless=not args.headed,
+                               use_storage_state=args.storage_state, pipeline_depth=args.pipeline_depth,
+                               wait_mode=args.wait)
+        report(result, load_previous(args.output, result))
+        save_result(args.output, result)
@@ -0,0 +1,153 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import List
+from playwright.sync_api import Browser, BrowserContext, Playwright
+from metrics import metrics
+from playwright_session import connection_lost
+from process_tree import chromium_processes, process_tree
+from storage_state import StorageStateManager
+
+
+class _PooledBrowser:
+    """
+    記錄一個 browser 以及它已經服務過的頁面數。
+    """
+    def __init__(self, browser: Browser):
+        self.browser = browser
+        self.pages_served = 0
+
+
+class BrowserPool:
+    """
+    保留幾個已啟動的 browser，每次借出時都建立一個全新的 context。
+    context 用完即關閉，所以 cookies / storage 不會沿用，仍然能避開驗證；
+    但不用每個 href 都重新啟動 Chromium。
+
+    browser 服務超過 max_pages_per_browser 個頁面，或使用中發生錯誤時，會被關閉並在下次需要時重新啟動。
+    有指定 max_rss_mb 時，這個 process 底下所有 Chromium 的 RSS 總和超過上限，歸還的 browser 也會被回收，
+    不用等到整個 worker 因為記憶體過大被 supervisor 重新啟動。
+
+    Args:
+        playwright (Playwright): 已啟動的 sync_playwright 物件。
+        size (int): 同時保留的 browser 數量。
+        max_pages_per_browser (int): 每個 browser 最多服務幾個頁面後回收。
+        headless (bool): 傳給 chromium.launch 的 headless 參數。
+        storage_state (StorageStateManager): 有指定時每個 context 都從同一份 storage state 建立，
+                                             None 代表完全空白的 context。
+        max_rss_mb (float): Chromium RSS 總和上限 (MB)，None 代表不檢查。
+        rss_check_interval (float): 最少隔幾秒量測一次 RSS。
+    """
+    def __init__(self, playwright: Playwright, size: int = 1, max_pages_per_browser: int = 20,
+                 headless: bool = False, storage_state: StorageStateManager | None = None,
+                 max_rss_mb: float | None = None, rss_check_interval: float = 5):
+        self.playwright = playwright
+        self.size = size
+        self.max_pages_per_browser = max_pages_per_browser
+        self.headless = headless
+        self.storage_state = storage_state
+        self.max_rss_mb = max_rss_mb
+        self.rss_check_interval = rss_check_interval
+        self.launch_count = 0
+        self.recycle_count = 0
+        self.rss_recycle_count = 0
+        self._next_rss_check = 0.0
+        self._idle: List[_PooledBrowser] = []
+        self._lock = threading.Lock()
+
+    def _launch(self) -> _PooledBrowser:
+        with metrics.stage("browser_launch"):
+            browser = self.playwright.chromium.launch(headless=self.headless)
+        self.launch_count += 1
+        return _PooledBrowser(browser)
+
+    def _acquire(self) -> _PooledBrowser:
+        with self._lock:
+            while self._idle:
+                pooled = self._idle.pop()
+                if pooled.browser.is_connected():
+                    return pooled
+        return self._launch()
+
+    def _over_memory(self) -> bool:
+        if self.max_rss_mb is None or time.monotonic() < self._next_rss_check:
+            return False
+        self._next_rss_check = time.monotonic() + self.rss_check_interval
+        tree = process_tree(os.getpid())
+        if not tree:
+            return False
+        rss_mb = sum(p.rss for p in chromium_processes(tree)) / 1024 / 1024
+        if rss_mb <= self.max_rss_mb:
+            return False
+        print(f"[browser_pool] Chromium RSS {rss_mb:.0f} MB 超過上限 {self.max_rss_mb} MB，回收 browser")
+        self.rss_recycle_count += 1
+        metrics.count("browser_recycle_rss")
+        return True
+
+    def _release(self, pooled: _PooledBrowser, failed: bool):
+        pooled.pages_served += 1
+        if failed or pooled.pages_served >= self.max_pages_per_browser or not pooled.browser.is_connected() \
+                or self._over_memory():
+            self._retire(pooled)
+            return
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(pooled)
+                return
+        self._retire(pooled)
+
+    def _retire(self, pooled: _PooledBrowser):
+        self.recycle_count += 1
+        if connection_lost(self.playwright):
+            # driver 已經失效，browser 會隨舊的 driver 一起結束，呼叫 close() 只會永遠等待
+            return
+        if not pooled.browser.is_connected():
+            # browser 已經自己結束 (crash 或被關閉)，不用再關閉
+            return
+        try:
+            pooled.browser.close()
+        except Exception as e:
+            print(f"關閉 browser 時發生錯誤: {e}")
+
+    @contextmanager
+    def new_context(self, **context_options):
+        """
+        借出一個全新的 BrowserContext，離開 with 區塊時自動關閉 context 並歸還 browser。
+        區塊內拋出例外，或建立 context 本身失敗時，該 browser 會被回收。
+        """
+        pooled = self._acquire()
+        context: BrowserContext | None = None
+        failed = False
+        try:
+            if self.storage_state is not None:
+                context_options = {**self.storage_state.context_options(pooled.browser), **context_options}
+            context = pooled.browser.new_context(**context_options)
+            yield context
+        except Exception as e:
+            failed = True
+            connection_lost(self.playwright, e)
+            if self.storage_state is not None:
+                self.storage_state.watch(e)
+            raise
+        finally:
+            try:
+                if connection_lost(self.playwright):
+                    failed = True
+                elif context is not None:
+                    context.close()
+            except Exception:
+                failed = True
+            self._release(pooled, failed)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for pooled in idle:
+            self._retire(pooled)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
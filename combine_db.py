@@ -1,8 +1,254 @@
 import sqlite3
 import os
+import time
 import pandas as pd
 
-def merge_sqlite_databases(source_db_paths, target_db_path, table_name):
+def _table_columns(conn, schema, table_name):
+    """
+    回傳 schema.table_name 的 [(欄位名稱, 型別), ...]，表格不存在時回傳空列表。
+    """
+    return [(col[1], col[2]) for col in conn.execute(f'PRAGMA "{schema}".table_info("{table_name}");')]
+
+def _check_source_schemas(sources, table_name):
+    """
+    檢查每個來源的 table_name 結構，以第一個有該表格的來源為準。
+    回傳 (目標欄位 [(名稱, 型別), ...] 或 None, {來源路徑: [欄位名稱, ...]})。
+    """
+    target_columns = None
+    source_columns = {}
+    conn = sqlite3.connect(":memory:")
+    try:
+        for source_db_path in sources:
+            conn.execute("ATTACH DATABASE ? AS src;", (source_db_path,))
+            try:
+                columns = _table_columns(conn, "src", table_name)
+            finally:
+                conn.execute("DETACH DATABASE src;")
+            if not columns:
+                print(f"警告：來源資料庫 '{source_db_path}' 中不存在表格 '{table_name}'，跳過。")
+                continue
+            if target_columns is None:
+                target_columns = columns
+                print(f"使用 '{source_db_path}' 的 '{table_name}' 表格結構來初始化目標資料庫。")
+            target_types = {name.lower(): col_type.upper() for name, col_type in target_columns}
+            for name, col_type in columns:
+                if name.lower() not in target_types:
+                    raise ValueError(f"來源 '{source_db_path}' 的欄位 '{name}' 不存在於目標表格結構中。")
+                if col_type.upper() != target_types[name.lower()]:
+                    raise ValueError(f"來源 '{source_db_path}' 的欄位 '{name}' 型別 {col_type} "
+                                     f"與目標的 {target_types[name.lower()]} 不同。")
+            source_columns[source_db_path] = [name for name, _ in columns]
+    finally:
+        conn.close()
+    return target_columns, source_columns
+
+def merge_sqlite_databases_sql(source_db_paths, target_db_path, table_name):
+    """
+    用 SQLite 本身合併：ATTACH 每個來源後執行 INSERT INTO ... SELECT，資料不經過 pandas / Python，
+    記憶體用量固定，不會隨分片大小增加。
+
+    - 目標表格結構以第一個有該表格的來源為準，欄位依名稱對應 (不依位置)
+    - 寫入前先檢查所有來源：來源有目標沒有的欄位、或同名欄位型別不同時直接報錯，不寫入任何資料
+    - 所有來源在同一個 transaction 中寫入 (來源數超過 SQLite 的 ATTACH 上限時，每一組一個 transaction)
+    - 每個來源印出筆數與每秒筆數
+
+    Args:
+        source_db_paths (list): 包含所有要合併的來源 .db 檔案路徑的列表。
+        target_db_path (str): 合併後的目標 .db 檔案的路徑和名稱。
+        table_name (str): 要從每個來源資料庫中合併的表格名稱 (例如 'backer_location')。
+
+    Raises:
+        ValueError: 來源之間的表格結構不相容。
+    """
+    sources = []
+    for source_db_path in source_db_paths:
+        if not os.path.exists(source_db_path):
+            print(f"警告：來源資料庫檔案不存在，跳過：{source_db_path}")
+        else:
+            sources.append(source_db_path)
+    if not sources:
+        print("錯誤：沒有可合併的來源資料庫。")
+        return
+
+    # 1. 先檢查所有來源的表格結構，不相容時在動到目標檔案前就報錯
+    target_columns, source_columns = _check_source_schemas(sources, table_name)
+    if target_columns is None:
+        print(f"錯誤：所有來源資料庫中都沒有 '{table_name}' 表格。")
+        return
+
+    # 確保目標檔案是全新的，避免混淆
+    if os.path.exists(target_db_path):
+        os.remove(target_db_path)
+        print(f"已移除舊的目標資料庫檔案: {target_db_path}")
+
+    # isolation_level=None 讓我們自己控制 transaction (ATTACH 不能在 transaction 中執行)
+    conn_target = sqlite3.connect(target_db_path, isolation_level=None)
+    try:
+        columns_schema = ", ".join(f'"{name}" {col_type}' for name, col_type in target_columns)
+        conn_target.execute(f'CREATE TABLE "{table_name}" ({columns_schema});')
+        print(f"已在 '{target_db_path}' 中創建 '{table_name}' 表格。")
+
+        # 2. 每組最多 ATTACH 上限個來源，一組一個 transaction
+        max_attached = conn_target.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+        valid_sources = list(source_columns)
+        total_rows = 0
+        for start in range(0, len(valid_sources), max_attached):
+            group = valid_sources[start:start + max_attached]
+            aliases = [f"src{k}" for k in range(len(group))]
+            for alias, source_db_path in zip(aliases, group):
+                conn_target.execute(f"ATTACH DATABASE ? AS {alias};", (source_db_path,))
+            try:
+                conn_target.execute("BEGIN;")
+                for alias, source_db_path in zip(aliases, group):
+                    quoted = ", ".join(f'"{name}"' for name in source_columns[source_db_path])
+                    started = time.perf_counter()
+                    cursor = conn_target.execute(
+                        f'INSERT INTO main."{table_name}" ({quoted}) SELECT {quoted} FROM {alias}."{table_name}";'
+                    )
+                    elapsed = time.perf_counter() - started
+                    total_rows += cursor.rowcount
+                    print(f"已從 '{source_db_path}' 合併 {cursor.rowcount} 筆資料 "
+                          f"({cursor.rowcount / max(elapsed, 1e-9):,.0f} 筆/秒)。")
+                conn_target.execute("COMMIT;")
+            except Exception:
+                conn_target.execute("ROLLBACK;")
+                raise
+            finally:
+                for alias in aliases:
+                    conn_target.execute(f"DETACH DATABASE {alias};")
+    finally:
+        conn_target.close()
+
+    print(f"所有指定資料庫的 '{table_name}' 表格已合併到 '{target_db_path}'，共 {total_rows} 筆。")
+
+def merge_sqlite_databases_incremental(source_db_paths, target_db_path, table_name, key_column="id",
+                                       watermark_column="scraped_at", exclude_columns=()):
+    """
+    增量合併：不刪除目標資料庫，只把每個來源在上次合併之後新增的資料附加進去。
+
+    - 每個來源的高水位記錄在目標資料庫的 merge_watermarks 表格中
+    - 來源有 watermark_column (BackerLocationWriter 寫入的 scraped_at) 時以它為高水位，否則使用 rowid；
+      scraped_at 是在 commit 時於寫入鎖內蓋上、且大於已 commit 的最大值，之後 commit 的資料不會落在高水位之下
+    - 以 key_column (專案 id) 去除重複：同一個專案再次出現時以較新的資料覆蓋
+    - 每個來源的資料與它的高水位在同一個 transaction 中更新
+
+    Args:
+        source_db_paths (list): 包含所有要合併的來源 .db 檔案路徑的列表。
+        target_db_path (str): 合併後的目標 .db 檔案，不存在時會建立。
+        table_name (str): 要合併的表格名稱 (例如 'backer_location')。
+        key_column (str): 用來去除重複的專案主鍵欄位。
+        watermark_column (str): 高水位欄位，來源沒有這個欄位時改用 rowid。
+        exclude_columns (iterable): 不複製到目標的欄位 (例如 "index")。
+
+    Raises:
+        ValueError: 來源之間的表格結構不相容，或 key_column 被排除。
+    """
+    excluded = {c.lower() for c in exclude_columns}
+    if key_column.lower() in excluded:
+        raise ValueError(f"去除重複用的欄位 '{key_column}' 不能被排除。")
+
+    sources = [p for p in source_db_paths if os.path.exists(p)]
+    for missing in set(source_db_paths) - set(sources):
+        print(f"警告：來源資料庫檔案不存在，跳過：{missing}")
+    target_columns, source_columns = _check_source_schemas(sources, table_name)
+    if target_columns is None:
+        print(f"錯誤：所有來源資料庫中都沒有 '{table_name}' 表格。")
+        return
+
+    conn_target = sqlite3.connect(target_db_path, isolation_level=None)
+    try:
+        conn_target.execute("""
+            CREATE TABLE IF NOT EXISTS merge_watermarks (
+                source TEXT NOT NULL,
+                table_name TEXT NOT NULL,
+                watermark_column TEXT NOT NULL,
+                high_water NUMERIC,
+                rows_merged INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL,
+                PRIMARY KEY (source, table_name)
+            );
+        """)
+
+        existing = [name for name, _ in _table_columns(conn_target, "main", table_name)]
+        if not existing:
+            columns_schema = ", ".join(f'"{name}" {col_type}' for name, col_type in target_columns
+                                       if name.lower() not in excluded)
+            conn_target.execute(f'CREATE TABLE "{table_name}" ({columns_schema});')
+            existing = [name for name, _ in target_columns if name.lower() not in excluded]
+            print(f"已在 '{target_db_path}' 中創建 '{table_name}' 表格。")
+        if key_column not in existing:
+            raise ValueError(f"目標表格 '{table_name}' 中沒有去除重複用的欄位 '{key_column}'。")
+
+        # 目標表格需要 key_column 的唯一索引才能 upsert；舊的完整合併結果可能有重複，先去除
+        index_name = f"idx_{table_name}_{key_column}_unique"
+        if conn_target.execute("SELECT 1 FROM sqlite_master WHERE type='index' AND name=?", (index_name,)).fetchone() is None:
+            conn_target.execute("BEGIN;")
+            conn_target.execute(f'DELETE FROM "{table_name}" WHERE rowid NOT IN '
+                                f'(SELECT MAX(rowid) FROM "{table_name}" GROUP BY "{key_column}")')
+            conn_target.execute(f'CREATE UNIQUE INDEX "{index_name}" ON "{table_name}" ("{key_column}");')
+            conn_target.execute("COMMIT;")
+
+        total_rows = 0
+        for source_db_path, columns in source_columns.items():
+            columns = [c for c in columns if c.lower() not in excluded]
+            unknown = [c for c in columns if c not in existing]
+            if unknown:
+                raise ValueError(f"來源 '{source_db_path}' 的欄位 {unknown} 不存在於目標表格 '{table_name}' 中。")
+
+            source_key = os.path.abspath(source_db_path)
+            wm_column = watermark_column if watermark_column in source_columns[source_db_path] else "rowid"
+            conn_target.execute("ATTACH DATABASE ? AS src;", (source_db_path,))
+            try:
+                conn_target.execute("BEGIN;")
+                row = conn_target.execute(
+                    "SELECT watermark_column, high_water FROM merge_watermarks WHERE source = ? AND table_name = ?",
+                    (source_key, table_name)
+                ).fetchone()
+                # 高水位欄位改變 (例如來源新增了 scraped_at) 時從頭比對，重複的資料會被 upsert 覆蓋
+                low = row[1] if row is not None and row[0] == wm_column and row[1] is not None else None
+                high = conn_target.execute(f'SELECT MAX({wm_column}) FROM src."{table_name}"').fetchone()[0]
+
+                rowcount = 0
+                if high is not None and (low is None or high > low):
+                    quoted = ", ".join(f'"{c}"' for c in columns)
+                    updates = ", ".join(f'"{c}" = excluded."{c}"' for c in columns if c != key_column)
+                    where = f"{wm_column} <= ?" if low is None else f"{wm_column} > ? AND {wm_column} <= ?"
+                    params = (high,) if low is None else (low, high)
+                    started = time.perf_counter()
+                    cursor = conn_target.execute(
+                        f'INSERT INTO main."{table_name}" ({quoted}) SELECT {quoted} FROM src."{table_name}" '
+                        f'WHERE {where} ORDER BY {wm_column} '
+                        f'ON CONFLICT("{key_column}") DO UPDATE SET {updates};',
+                        params
+                    )
+                    rowcount = cursor.rowcount
+                    elapsed = time.perf_counter() - started
+                    print(f"已從 '{source_db_path}' 增量合併 {rowcount} 筆資料 "
+                          f"({rowcount / max(elapsed, 1e-9):,.0f} 筆/秒，{wm_column} > {low})。")
+                else:
+                    print(f"'{source_db_path}' 沒有新資料 ({wm_column} <= {low})。")
+
+                conn_target.execute(
+                    "INSERT INTO merge_watermarks (source, table_name, watermark_column, high_water, rows_merged, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(source, table_name) DO UPDATE SET watermark_column = excluded.watermark_column, "
+                    "high_water = excluded.high_water, rows_merged = rows_merged + excluded.rows_merged, "
+                    "updated_at = excluded.updated_at",
+                    (source_key, table_name, wm_column, high if high is not None else low, rowcount, time.time())
+                )
+                conn_target.execute("COMMIT;")
+                total_rows += rowcount
+            except Exception:
+                conn_target.execute("ROLLBACK;")
+                raise
+            finally:
+                conn_target.execute("DETACH DATABASE src;")
+    finally:
+        conn_target.close()
+
+    print(f"增量合併完成，共附加 / 更新 {total_rows} 筆到 '{target_db_path}' 的 '{table_name}'。")
+
+def merge_sqlite_databases(source_db_paths, target_db_path, table_name, engine="sql"):
     """
     將多個 SQLite 資料庫檔案中的特定表格合併到一個新的目標資料庫檔案中。
     會自動處理目標表格的創建（基於第一個來源的結構），並將後續資料附加。
@@ -11,7 +257,15 @@ def merge_sqlite_databases(source_db_paths, target_db_path, table_name):
         source_db_paths (list): 包含所有要合併的來源 .db 檔案路徑的列表。
         target_db_path (str): 合併後的目標 .db 檔案的路徑和名稱。
         table_name (str): 要從每個來源資料庫中合併的表格名稱 (例如 'backer_location')。
+        engine (str): "sql" 使用 merge_sqlite_databases_sql (ATTACH + INSERT ... SELECT)；
+                      "incremental" 使用 merge_sqlite_databases_incremental，只附加新資料，不重建目標；
+                      "pandas" 使用原本逐一讀入 DataFrame 再寫出的方式。
     """
+    if engine == "sql":
+        return merge_sqlite_databases_sql(source_db_paths, target_db_path, table_name)
+    if engine == "incremental":
+        return merge_sqlite_databases_incremental(source_db_paths, target_db_path, table_name)
+
     if not source_db_paths:
         print("錯誤：來源資料庫路徑列表不能為空。")
         return
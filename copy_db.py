@@ -1,9 +1,10 @@
 import pandas as pd
 import sqlite3
 import os
+from combine_db import merge_sqlite_databases_incremental
 
 def copy_db_table_exclude_specific_ids(source_db_path, target_db_path, table_name,
-                                        columns_to_exclude=["index", "id", "row"]):
+                                        columns_to_exclude=["index", "id", "row"], incremental=False, key_column="id"):
     """
     從來源資料庫的指定表格中讀取資料，排除指定的ID/索引欄位，
     並將剩餘資料寫入目標資料庫的相同表格中，不包含 Pandas 自動生成的 'index' 欄位。
@@ -15,11 +16,24 @@ def copy_db_table_exclude_specific_ids(source_db_path, target_db_path, table_nam
         table_name (str): 要操作的表格名稱 (例如 'backer_location')。
         columns_to_exclude (list): 一個字串列表，包含在複製時要從來源表格中排除的欄位名稱。
                                    預設排除 "index", "id", "row"。
+        incremental (bool): True 時不重建目標，只附加上次複製後的新資料
+                            (見 combine_db.merge_sqlite_databases_incremental)。
+                            目標需要 key_column 才能去除重複，所以即使它在 columns_to_exclude 中 (預設的 "id") 也會保留，
+                            只排除其他欄位；高水位欄位 (scraped_at) 只從來源讀取，不需要複製到目標。
+        key_column (str): incremental 時用來去除重複的專案主鍵欄位。
     """
     if not os.path.exists(source_db_path):
         print(f"錯誤：來源資料庫檔案不存在：{source_db_path}")
         return
 
+    if incremental:
+        exclude = [c for c in columns_to_exclude if c.lower() != key_column.lower()]
+        if len(exclude) != len(columns_to_exclude):
+            print(f"增量複製需要以 '{key_column}' 去除重複，目標表格保留這個欄位。")
+        merge_sqlite_databases_incremental([source_db_path], target_db_path, table_name,
+                                           key_column=key_column, exclude_columns=exclude)
+        return
+
     # 刪除目標檔案（如果存在），以確保每次都是全新的建立
     if os.path.exists(target_db_path):
         os.remove(target_db_path)
@@ -0,0 +1,32 @@
+import pandas as pd
+from typing import Collection, Iterable, Iterator
+
+# 爬蟲只需要這幾個欄位，其他欄位不讀進記憶體
+NEEDED_COLUMNS = ("id", "backers_count", "urls_web_project", "row")
+
+
+def iter_project_chunks(file_link: str, chunksize: int = 10000, columns: Iterable[str] = NEEDED_COLUMNS,
+                        min_backers: int = 10) -> Iterator[pd.DataFrame]:
+    """
+    分塊讀取專案 CSV，只讀需要的欄位，並去掉 backers_count 低於 min_backers 的列。
+    回傳的 DataFrame 索引是該列在整份 CSV 中的位置 (和一次讀完時的索引相同)，
+    所以記憶體用量只和 chunksize 有關，和 CSV 大小無關。
+
+    Args:
+        file_link (str): 專案 CSV 檔案路徑。
+        chunksize (int): 每塊的列數。
+        columns (iterable): 要讀取的欄位，CSV 中不存在的欄位會被略過。
+        min_backers (int): backers_count 至少要多少才需要爬取。
+    """
+    wanted = set(columns)
+    for chunk in pd.read_csv(file_link, usecols=lambda c: c in wanted, chunksize=chunksize):
+        yield chunk[chunk['backers_count'] >= min_backers]
+
+
+def read_projects(file_link: str, indices: Collection[int], chunksize: int = 10000,
+                  columns: Iterable[str] = NEEDED_COLUMNS) -> pd.DataFrame:
+    """
+    分塊讀取專案 CSV，只留下 indices 中的列 (例如要重試的失敗索引)，索引和 iter_project_chunks 相同。
+    """
+    chunks = [chunk[chunk.index.isin(indices)] for chunk in iter_project_chunks(file_link, chunksize, columns)]
+    return pd.concat(chunks) if chunks else pd.DataFrame(columns=list(columns))
@@ -0,0 +1,304 @@
+import math
+import queue
+import signal
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List
+from metrics import metrics
+from normalized_schema import (PROJECT_TABLE, LocationIds, ensure_normalized_schema, is_location_column,
+                               write_backer_locations)
+
+# backer_location 已知欄位的型別，其他 CSV 欄位依第一筆資料的值推斷
+KNOWN_COLUMN_TYPES = {
+    "index": "INTEGER",
+    "id": "INTEGER",
+    "backers_count": "INTEGER",
+    "urls_web_project": "TEXT",
+    "row": "INTEGER",
+    "scraped_at": "REAL",
+    **{f"backer_detail_city{j+1}": "TEXT" for j in range(10)},
+}
+
+_STOP = object()
+
+
+def _sql_type(value) -> str:
+    if isinstance(value, bool) or isinstance(value, int):
+        return "INTEGER"
+    if isinstance(value, float):
+        return "REAL"
+    return "TEXT"
+
+
+def _to_sql_value(value):
+    # pandas 的 numpy 型別 sqlite3 無法直接寫入，NaN 則存成 NULL
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+class BackerLocationWriter:
+    """
+    在背景 thread 中批次寫入 backer_location，爬蟲只負責把資料放進佇列，不用等硬碟。
+
+    - 第一次寫入時建立有主鍵的表格 (key_column 為 INTEGER PRIMARY KEY)，之後不再做 schema 推斷
+    - 每 batch_size 筆或每 flush_interval 秒在同一個 transaction 內寫入
+    - 使用 WAL 模式，並以 key_column upsert，重跑同一筆不會重複
+    - close() 或收到 SIGINT / SIGTERM (Windows 為 SIGBREAK) 時會把佇列中剩下的資料寫完
+    - 某一批寫入失敗時 (rollback，WorkQueue 的狀態也一起還原) 之後的批次照常寫入，
+      第一個錯誤保存在 error，write() / flush() / close() 會拋出它；after_commit 的錯誤另外保存在
+      callback_error，資料已經 commit，不影響之後的寫入，只在 close() 時拋出
+    - schema="normalized" 時專案欄位寫入 backer_project，地點寫入 locations / project_backer_location，
+      table_name 則是一個和寬表格欄位相同的 view (見 normalized_schema)
+
+    Args:
+        db_path (str): 輸出的 .db 檔案路徑。
+        table_name (str): 表格名稱。
+        key_column (str): 專案的主鍵欄位，預設為 CSV 的索引 "index"。WorkQueue、正規化的 fact 表格與
+                          DoneIndex 都以它對應同一筆專案；不同 CSV 間的重複專案由 DoneIndex (project_key)
+                          與 combine_db 的 key_column="id" 去除。
+        batch_size (int): 每批寫入的筆數。
+        flush_interval (float): 佇列沒滿時最多等幾秒就寫入。
+        after_write (callable): 每批寫入後、commit 前呼叫 after_write(conn, keys)，
+                                可以在同一個 transaction 中更新其他表格 (例如 WorkQueue 的狀態)。
+        after_commit (callable): 每批 commit 之後呼叫 after_commit(rows)，用來更新其他資料庫
+                                 (例如 DoneIndex)；資料確定寫入後才執行，當掉時最多只會重爬，不會漏掉。
+        schema (str): "wide" (每筆一列，backer_detail_city1..10 十個欄位) 或 "normalized"。
+    """
+    def __init__(self, db_path: str, table_name: str = "backer_location", key_column: str = "index",
+                 batch_size: int = 50, flush_interval: float = 5.0,
+                 after_write: Callable[[sqlite3.Connection, List], None] | None = None, schema: str = "wide",
+                 after_commit: Callable[[List[Dict]], None] | None = None):
+        if schema not in ("wide", "normalized"):
+            raise ValueError(f"schema must be 'wide' or 'normalized', got {schema!r}")
+        self.db_path = db_path
+        self.table_name = table_name
+        self.key_column = key_column
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.after_write = after_write
+        self.after_commit = after_commit
+        self.schema = schema
+        # 實際寫入專案欄位的表格；正規化時 table_name 是 view
+        self._data_table = PROJECT_TABLE if schema == "normalized" else table_name
+        self._location_ids = LocationIds()
+        self.rows_written = 0
+        self.error: Exception | None = None
+        self.callback_error: Exception | None = None
+        self.rows_failed = 0
+        self._closed = False
+        self._columns: List[str] = []
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._worker, name="BackerLocationWriter", daemon=True)
+        self._thread.start()
+
+    # --- 給爬蟲呼叫的介面 ---
+    def write(self, row: Dict):
+        """
+        把一筆資料放進寫入佇列。若背景寫入曾經失敗，會在這裡拋出該錯誤。
+        scraped_at 在 commit 時才蓋上 (見 _commit_stamp)，combine_db 的增量合併以它作為高水位。
+        """
+        if self.error is not None:
+            raise self.error
+        if not self._thread.is_alive():
+            raise RuntimeError(f"'{self.db_path}' 的寫入 thread 已經結束，無法再寫入。")
+        row = dict(row)
+        row["scraped_at"] = None
+        self._queue.put(row)
+
+    def flush(self):
+        """
+        等到目前佇列中的資料都寫入資料庫為止。
+        """
+        flushed = threading.Event()
+        self._queue.put(flushed)
+        flushed.wait()
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        print(f"[db_writer] 共寫入 {self.rows_written} 筆資料到 '{self.db_path}' 的 '{self.table_name}'"
+              + (f"，{self.rows_failed} 筆寫入失敗。" if self.rows_failed else "。"))
+        if self.error is not None:
+            raise self.error
+        if self.callback_error is not None:
+            raise self.callback_error
+
+    def install_signal_handlers(self):
+        """
+        收到 SIGINT / SIGTERM 時以 KeyboardInterrupt 中斷主 thread (只能在主 thread 呼叫)，
+        Windows 上 supervisor 送的是 CTRL_BREAK_EVENT，以 SIGBREAK 接收，
+        剩下的資料由呼叫端的 finally (例如 crawl_csv) 呼叫 close() 寫完。
+        不在 handler 中 close()：訊號可能在主 thread 持有 metrics / DoneIndex 的 lock 時抵達，
+        這時等待背景 thread 結束，而背景 thread 又在等同一個 lock，會互相卡住。
+        """
+        def handler(signum, frame):
+            print(f"收到訊號 {signum}，中斷爬取並寫入剩下的資料...")
+            raise KeyboardInterrupt
+
+        signal.signal(signal.SIGINT, handler)
+        if hasattr(signal, "SIGTERM"):
+            signal.signal(signal.SIGTERM, handler)
+        if hasattr(signal, "SIGBREAK"):
+            signal.signal(signal.SIGBREAK, handler)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.close()
+        except Exception:
+            # 已經有例外在往外傳時不要蓋掉它，寫入錯誤已經印出
+            if exc_type is None:
+                raise
+
+    # --- 背景 thread ---
+    def _worker(self):
+        conn = None
+        batch = []
+        try:
+            try:
+                conn = sqlite3.connect(self.db_path, timeout=30)
+                conn.execute("PRAGMA journal_mode=WAL;")
+                conn.execute("PRAGMA synchronous=NORMAL;")
+            except Exception as e:
+                # 連不上資料庫時讓 write() / flush() / close() 拋出錯誤，而不是一直放進沒人處理的佇列
+                print(f"無法開啟資料庫 '{self.db_path}': {e}")
+                self.error = e
+                return
+            while True:
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    item = None
+
+                # 逾時、flush() 或 close() 都把目前累積的資料寫入
+                if item is None or item is _STOP or isinstance(item, threading.Event):
+                    self._write_batch(conn, batch)
+                    batch = []
+                    if isinstance(item, threading.Event):
+                        item.set()
+                    if item is _STOP:
+                        break
+                    continue
+
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    self._write_batch(conn, batch)
+                    batch = []
+        finally:
+            if conn is not None:
+                conn.close()
+            # 背景 thread 結束後，還在等待的 flush() 也要放行；沒寫入的資料計入 rows_failed
+            while not self._queue.empty():
+                item = self._queue.get_nowait()
+                if isinstance(item, threading.Event):
+                    item.set()
+                elif isinstance(item, dict):
+                    self.rows_failed += 1
+            self.rows_failed += len(batch)
+
+    def _write_batch(self, conn: sqlite3.Connection, batch: List[Dict]):
+        if not batch:
+            return
+        try:
+            with metrics.stage("db_write"), conn:
+                # 一開始就取得寫入鎖，其他 worker 的 commit 不會插在蓋 scraped_at 和寫入之間
+                conn.execute("BEGIN IMMEDIATE")
+                rows = batch
+                if self.schema == "normalized":
+                    rows = [{c: v for c, v in row.items() if not is_location_column(c)} for row in batch]
+                self._ensure_schema(conn, rows)
+                stamp = self._commit_stamp(conn)
+                for row in rows:
+                    row["scraped_at"] = stamp
+                quoted = ", ".join(f'"{c}"' for c in self._columns)
+                placeholders = ", ".join("?" for _ in self._columns)
+                updates = ", ".join(f'"{c}" = excluded."{c}"' for c in self._columns if c != self.key_column)
+                sql = (f'INSERT INTO {self._data_table} ({quoted}) VALUES ({placeholders}) '
+                       f'ON CONFLICT("{self.key_column}") DO UPDATE SET {updates}')
+                conn.executemany(sql, [[_to_sql_value(row.get(c)) for c in self._columns] for row in rows])
+                if self.schema == "normalized":
+                    write_backer_locations(conn, batch, self._location_ids, self.key_column)
+                if self.after_write is not None:
+                    self.after_write(conn, [row.get(self.key_column) for row in batch])
+        except Exception as e:
+            # 這一批已經 rollback，保留第一個錯誤；之後的批次繼續寫入，不會被默默丟掉
+            print(f"寫入資料庫時發生錯誤 ({len(batch)} 筆未寫入): {e}")
+            self.rows_failed += len(batch)
+            # CREATE TABLE / ALTER TABLE 與新的 locations 也一起 rollback 了，下一批重新讀取
+            self._columns = []
+            self._location_ids = LocationIds()
+            if self.error is None:
+                self.error = e
+            return
+        self.rows_written += len(batch)
+        print(f'---- 已將 {len(batch)} 筆資料寫入資料庫 (最後一筆 {self.key_column} = {batch[-1].get(self.key_column)}) ----')
+        if self.after_commit is not None:
+            try:
+                self.after_commit(batch)
+            except Exception as e:
+                print(f"寫入後的 after_commit 發生錯誤 (資料已寫入): {e}")
+                if self.callback_error is None:
+                    self.callback_error = e
+
+    def _commit_stamp(self, conn: sqlite3.Connection) -> float:
+        """
+        這一批的 scraped_at：現在時間，但一定大於 .db 中已經 commit 的最大值。
+        在 enqueue 時蓋的時間會比其他 worker 較晚 commit 的資料還小 (時鐘往回調整時也是)，
+        增量合併記下高水位之後，這些資料就永遠不會被合併；在寫入鎖內取 MAX 再往上加就不會發生。
+        """
+        (latest,) = conn.execute(f'SELECT MAX("scraped_at") FROM {self._data_table}').fetchone()
+        now = time.time()
+        if latest is None or now > latest:
+            return now
+        return math.nextafter(latest, math.inf)
+
+    def _ensure_schema(self, conn: sqlite3.Connection, batch: List[Dict]):
+        if not self._columns:
+            existing = [col[1] for col in conn.execute(f"PRAGMA table_info({self._data_table});")]
+            if not existing:
+                first = batch[0]
+                columns = [self.key_column] + [c for c in first if c != self.key_column]
+                schema = []
+                for c in columns:
+                    col_type = KNOWN_COLUMN_TYPES.get(c) or _sql_type(_to_sql_value(first.get(c)))
+                    schema.append(f'"{c}" {col_type} PRIMARY KEY' if c == self.key_column else f'"{c}" {col_type}')
+                conn.execute(f"CREATE TABLE {self._data_table} ({', '.join(schema)});")
+                print(f"已建立 '{self._data_table}' 表格，主鍵為 '{self.key_column}'。")
+                existing = columns
+            elif not self._has_unique_key(conn):
+                # 舊版 pandas.to_sql 建立的表格沒有主鍵，去除重複後補一個唯一索引才能 upsert
+                conn.execute(f'DELETE FROM {self._data_table} WHERE rowid NOT IN '
+                             f'(SELECT MAX(rowid) FROM {self._data_table} GROUP BY "{self.key_column}")')
+                conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS idx_{self._data_table}_{self.key_column} '
+                             f'ON {self._data_table} ("{self.key_column}")')
+            self._columns = existing
+            if self.schema == "normalized":
+                ensure_normalized_schema(conn, self.table_name, self.key_column)
+
+        for row in batch:
+            for c in row:
+                if c not in self._columns:
+                    col_type = KNOWN_COLUMN_TYPES.get(c) or _sql_type(_to_sql_value(row[c]))
+                    conn.execute(f'ALTER TABLE {self._data_table} ADD COLUMN "{c}" {col_type}')
+                    self._columns.append(c)
+
+    def _has_unique_key(self, conn: sqlite3.Connection) -> bool:
+        for index in conn.execute(f"PRAGMA index_list({self._data_table});").fetchall():
+            # index_list: (seq, name, unique, origin, partial)
+            if index[2]:
+                columns = [col[2] for col in conn.execute(f'PRAGMA index_info("{index[1]}");')]
+                if columns == [self.key_column]:
+                    return True
+        return any(col[1] == self.key_column and col[5] for col in conn.execute(f"PRAGMA table_info({self._data_table});"))
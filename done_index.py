@@ -0,0 +1,196 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List
+from urllib.parse import urlsplit, urlunsplit
+
+# DoneIndex.check 的結果
+DONE = "done"            # 已經寫入某個分片的 .db，可以永久略過
+IN_FLIGHT = "in_flight"  # 這次執行中由其他索引處理中，還不知道會不會成功
+
+
+def canonical_project_url(url: str) -> str | None:
+    """
+    專案網址的標準形式：scheme / host 小寫，去掉 query (?ref=...)、fragment 與 /community、/description 等子頁面，
+    只保留 /projects/<creator>/<slug>。不是專案網址時回傳 None。
+
+    "https://www.kickstarter.com/projects/foo/bar?ref=discovery_category_newest"
+    -> "https://www.kickstarter.com/projects/foo/bar"
+    """
+    if not isinstance(url, str):
+        return None
+    parts = urlsplit(url.strip())
+    segments = [s for s in parts.path.split("/") if s]
+    if len(segments) < 3 or segments[0] != "projects" or not parts.netloc:
+        return None
+    return urlunsplit((parts.scheme.lower() or "https", parts.netloc.lower(), "/".join([""] + segments[:3]), "", ""))
+
+
+def community_url(url: str) -> str | None:
+    """
+    專案網址 -> community 頁面網址，取代 .replace('?ref=discovery_category_newest', '/community') 的寫法，
+    任何 ref 參數或結尾都適用。無法辨識的網址去掉 query 後直接加上 /community；
+    不是字串 (CSV 中空白的 urls_web_project 讀成 NaN) 或空字串時回傳 None。
+    """
+    if not isinstance(url, str) or not url.strip():
+        return None
+    canonical = canonical_project_url(url)
+    if canonical is None:
+        canonical = url.split("?", 1)[0].split("#", 1)[0].rstrip("/")
+    return canonical + "/community"
+
+
+def project_key(url: str) -> str | None:
+    """
+    去除重複用的鍵：標準網址不含 scheme、去掉 www.，路徑不分大小寫。
+    同一個專案出現在不同匯出檔 (http / https、有沒有 www、不同 ref) 時得到相同的鍵。
+    """
+    canonical = canonical_project_url(url)
+    if canonical is None:
+        return None
+    parts = urlsplit(canonical)
+    host = parts.netloc[4:] if parts.netloc.startswith("www.") else parts.netloc
+    return host + parts.path.lower()
+
+
+def done_index_path(db_path: str) -> str:
+    """
+    done index 放在輸出 .db 的同一個資料夾，所有分片共用同一份。
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), "done_index.db")
+
+
+class DoneIndex:
+    """
+    所有分片 / 每次執行共用的「已完成專案」索引，在開啟 browser 之前先檢查，重複的專案直接略過。
+
+    - 以 SQLite 檔案保存 (project_key -> 哪個 .db 的哪個索引)，啟動時全部讀進記憶體的 set，
+      之後每個專案先查 set，沒有時再查一次 SQLite (其他分片在這段期間完成的專案)
+    - 專案的結果 commit 到分片的 .db 之後才加入 (BackerLocationWriter 的 after_commit)，當掉時只會重爬不會漏掉
+    - 同一次執行中已經交給 browser、還沒寫入的專案 (IN_FLIGHT) 只是延後，不算永久重複：
+      處理中的索引失敗時 release()，延後的索引重試時再檢查一次，那時才知道要略過還是自己爬取
+
+    Args:
+        path (str): done index 的 SQLite 檔案路徑。
+        table_name (str): 表格名稱。
+    """
+    def __init__(self, path: str, table_name: str = "done_projects"):
+        self.path = path
+        self.table_name = table_name
+        self.duplicates = 0
+        self.deferred = 0
+        self.added = 0
+        self._in_flight: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        # 由 BackerLocationWriter 的背景 thread 呼叫 add_rows
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL;")
+        self._conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table_name} (
+                project_key TEXT PRIMARY KEY,
+                db_path TEXT,
+                project_index INTEGER,
+                done_at REAL
+            ) WITHOUT ROWID;
+        ''')
+        self._conn.commit()
+        self._conn.create_function("project_key", 1, project_key, deterministic=True)
+        self._done = {key for (key,) in self._conn.execute(f"SELECT project_key FROM {table_name}")}
+        print(f"[done_index] 已載入 {len(self._done)} 個已完成的專案 ({path})")
+
+    def import_db(self, db_path: str, table_name: str = "backer_location", key_column: str = "index"):
+        """
+        把分片 .db 中已經有結果的專案加入索引 (done index 建立之前寫入的，或 commit 後來不及加入就當掉的)。
+        """
+        with self._lock:
+            self._conn.execute("ATTACH DATABASE ? AS shard", (db_path,))
+            try:
+                exists = self._conn.execute("SELECT 1 FROM shard.sqlite_master WHERE name = ?",
+                                            (table_name,)).fetchone()
+                if exists is None:
+                    return
+                before = self._conn.total_changes
+                self._conn.execute(
+                    f'INSERT OR IGNORE INTO {self.table_name} (project_key, db_path, project_index, done_at) '
+                    f'SELECT project_key(urls_web_project), ?, "{key_column}", ? FROM shard.{table_name} '
+                    f'WHERE project_key(urls_web_project) IS NOT NULL',
+                    (os.path.abspath(db_path), time.time())
+                )
+                self._conn.commit()
+                imported = self._conn.total_changes - before
+            finally:
+                self._conn.execute("DETACH DATABASE shard")
+            if imported:
+                self._done.update(key for (key,) in self._conn.execute(f"SELECT project_key FROM {self.table_name}"))
+                print(f"[done_index] 從 {db_path} 補上 {imported} 個已完成的專案")
+
+    def check(self, url: str, owner: tuple) -> str | None:
+        """
+        url 的專案已經完成時回傳 DONE (並計入重複數)；這次執行中已經由其他索引處理、還沒寫入時回傳 IN_FLIGHT，
+        呼叫端應該稍後再檢查，不能當成永久重複 (那個索引可能失敗)；
+        否則把它記為由 owner (db_path, 索引) 處理中並回傳 None。無法辨識的網址一律回傳 None。
+        """
+        key = project_key(url)
+        if key is None:
+            return None
+        with self._lock:
+            done = key in self._done
+            if not done:
+                # 記憶體中沒有時再查一次，其他分片可能在啟動之後才完成這個專案
+                done = self._conn.execute(f"SELECT 1 FROM {self.table_name} WHERE project_key = ?",
+                                          (key,)).fetchone() is not None
+                if done:
+                    self._done.add(key)
+            if done:
+                self.duplicates += 1
+                return DONE
+            if self._in_flight.setdefault(key, owner) == owner:
+                return None
+            self.deferred += 1
+            return IN_FLIGHT
+
+    def release(self, url: str, owner: tuple):
+        """
+        owner 處理 url 失敗時呼叫：不再佔用這個專案，等待中的重複索引之後可以自己爬取。
+        """
+        key = project_key(url)
+        if key is None:
+            return
+        with self._lock:
+            if self._in_flight.get(key) == owner:
+                del self._in_flight[key]
+
+    def add_rows(self, rows: List[Dict], db_path: str, key_column: str = "index"):
+        """
+        給 BackerLocationWriter 的 after_commit 使用：已經寫入分片 .db 的專案加入索引。
+        這裡失敗只代表之後可能重爬，不中斷寫入。
+        """
+        entries = []
+        for row in rows:
+            key = project_key(row.get("urls_web_project"))
+            if key is not None:
+                entries.append((key, os.path.abspath(db_path), int(row[key_column]), time.time()))
+        if not entries:
+            return
+        with self._lock:
+            try:
+                self._conn.executemany(
+                    f"INSERT OR IGNORE INTO {self.table_name} (project_key, db_path, project_index, done_at) "
+                    f"VALUES (?, ?, ?, ?)", entries
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"[done_index] 寫入 done index 時發生錯誤: {e}")
+                return
+            for key, *_ in entries:
+                self._done.add(key)
+                self._in_flight.pop(key, None)
+            self.added += len(entries)
+
+    def report(self):
+        print(f"[done_index] 略過重複的專案 {self.duplicates} 個，延後處理中的重複 {self.deferred} 次，"
+              f"新增 {self.added} 個，目前共 {len(self._done)} 個")
+
+    def close(self):
+        self._conn.close()
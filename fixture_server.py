@@ -0,0 +1,258 @@
+import argparse
+import os
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+from done_index import community_url
+
+US_STATES = ("CA", "NY", "TX", "WA", "IL", "MA", "OR", "CO", "FL", "GA")
+OTHER_COUNTRIES = ("Canada", "United Kingdom", "Germany", "Japan", "Australia", "Taiwan")
+# 1x1 透明 GIF，讓頁面上的圖片請求有東西可以回 (也讓 BlockingProfile 有東西可以擋)
+_PIXEL = bytes.fromhex("47494638396101000100800000000000ffffff21f90401000000002c00000000010001000002024401003b")
+
+_COMMUNITY_TEMPLATE = """<!DOCTYPE html>
+<html><head><title>Community - {slug}</title></head>
+<body>
+<img src="/static/banner.gif">
+<div class="community-section__locations">
+{rows}
+</div>
+</body></html>"""
+
+_ROW_TEMPLATE = """<div class="location-list__item">
+  <div class="primary-text js-location-primary-text"><a href="{href}">{name}</a></div>
+  <div class="location-list__meta"><div class="secondary-text js-location-secondary-text">{country}</div></div>
+</div>"""
+
+_PLACE_TEMPLATE = """<!DOCTYPE html>
+<html><head><title>Projects in {title}</title></head>
+<body>
+<img src="/static/map.gif">
+<div id="location_filter"><span class="js-title">{title}</span></div>
+</body></html>"""
+
+_CHALLENGE_HTML = """<!DOCTYPE html>
+<html><head><title>Just a moment...</title></head>
+<body><div id="challenge-form"></div></body></html>"""
+
+
+class FixtureConfig:
+    """
+    fixture server 的行為設定。
+
+    Args:
+        latency (float): 每個回應前固定延遲的秒數。
+        jitter (float): 額外加上 0 ~ jitter 秒的隨機延遲。
+        failure_rate (float): 回傳 failure_status 的機率 (模擬 429 / 5xx)。
+        failure_status (int): 注入失敗時回傳的 HTTP 狀態碼。
+        challenge_rate (float): 回傳驗證頁面 (HTTP 200 但內容是 challenge) 的機率。
+        rows_per_project (int): 每個 community 頁面的地點列數，預設和實際頁面一樣是前 10 名。
+        us_ratio (float): 地點為 United States 的比例。
+        place_count (int): 不同地點的數量，數量越少 location_cache 命中率越高。
+        fixtures_dir (str): 錄下來的 HTML 所在資料夾；請求路徑對應的檔案存在時直接回傳檔案內容。
+        seed (int): 隨機延遲與失敗注入的亂數種子，讓同樣設定的兩次 benchmark 可以比較。
+    """
+    def __init__(self, latency: float = 0.05, jitter: float = 0.0, failure_rate: float = 0.0,
+                 failure_status: int = 429, challenge_rate: float = 0.0, rows_per_project: int = 10,
+                 us_ratio: float = 0.7, place_count: int = 200, fixtures_dir: str | None = None, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.challenge_rate = challenge_rate
+        self.rows_per_project = rows_per_project
+        self.us_ratio = us_ratio
+        self.place_count = place_count
+        self.fixtures_dir = fixtures_dir
+        self.seed = seed
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+def community_rows(slug: str, config: FixtureConfig):
+    """
+    依專案 slug 產生固定的 (href, name, country) 列表，同一個 slug 每次都相同。
+    """
+    rng = random.Random(zlib.crc32(slug.encode("utf-8")))
+    rows = []
+    for _ in range(config.rows_per_project):
+        place = rng.randrange(config.place_count)
+        if rng.random() < config.us_ratio:
+            rows.append((f"/discover/places/us-city-{place}", f"City {place}", "United States"))
+        else:
+            rows.append((f"/discover/places/intl-city-{place}", f"Town {place}", rng.choice(OTHER_COUNTRIES)))
+    return rows
+
+
+def place_title(slug: str) -> str:
+    suffix = slug.rsplit("-", 1)[-1]
+    place = int(suffix) if suffix.isdigit() else zlib.crc32(slug.encode("utf-8"))
+    if slug.startswith("us-city-"):
+        return f"City {place}, {US_STATES[place % len(US_STATES)]}"
+    return f"Town {place}"
+
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    server_version = "KickstarterFixture/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server: FixtureServer = self.server.fixture
+        config = server.config
+        path = urlparse(self.path).path
+        server.count_request(path)
+
+        delay = config.latency + (server.random() * config.jitter if config.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+        if path.startswith("/static/"):
+            self._send(200, _PIXEL, "image/gif")
+            return
+
+        if server.random() < config.failure_rate:
+            server.count_injected("failure")
+            self._send(config.failure_status, b"Too Many Requests", "text/plain")
+            return
+        if server.random() < config.challenge_rate:
+            server.count_injected("challenge")
+            self._send(200, _CHALLENGE_HTML.encode("utf-8"))
+            return
+
+        body = self._recorded(path, config.fixtures_dir)
+        if body is None:
+            body = self._synthetic(path, config)
+        if body is None:
+            self._send(404, b"Not Found", "text/plain")
+            return
+        self._send(200, body.encode("utf-8"))
+
+    @staticmethod
+    def _recorded(path: str, fixtures_dir: str | None) -> str | None:
+        # /projects/a/b/community -> <fixtures_dir>/projects/a/b/community.html
+        if fixtures_dir is None:
+            return None
+        root = os.path.abspath(fixtures_dir)
+        file_path = os.path.abspath(os.path.join(root, path.strip("/") + ".html"))
+        if not file_path.startswith(root + os.sep) or not os.path.isfile(file_path):
+            return None
+        with open(file_path, encoding="utf-8") as f:
+            return f.read()
+
+    @staticmethod
+    def _synthetic(path: str, config: FixtureConfig) -> str | None:
+        parts = path.strip("/").split("/")
+        if len(parts) == 4 and parts[0] == "projects" and parts[3] == "community":
+            rows = "\n".join(_ROW_TEMPLATE.format(href=href, name=name, country=country)
+                             for href, name, country in community_rows(parts[2], config))
+            return _COMMUNITY_TEMPLATE.format(slug=parts[2], rows=rows)
+        if len(parts) == 3 and parts[0] == "discover" and parts[1] == "places":
+            return _PLACE_TEMPLATE.format(title=place_title(parts[2]))
+        return None
+
+    def _send(self, status: int, body: bytes, content_type: str = "text/html; charset=utf-8"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FixtureServer:
+    """
+    在本機模擬 Kickstarter 的 /projects/.../community 與 /discover/places/... 頁面，
+    可以設定延遲與注入失敗，benchmark 不需要連網。在背景 thread 中執行。
+
+    with FixtureServer(FixtureConfig(latency=0.1)) as server:
+        server.base_url  # http://127.0.0.1:<port>
+
+    Args:
+        config (FixtureConfig): 延遲、失敗注入與頁面內容的設定。
+        host (str): 綁定的位址。
+        port (int): 綁定的 port，0 代表自動選一個空的 port。
+    """
+    def __init__(self, config: FixtureConfig | None = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or FixtureConfig()
+        self.requests = {"community": 0, "place": 0, "static": 0, "other": 0}
+        self.injected = {"failure": 0, "challenge": 0}
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _FixtureHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.fixture = self
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def project_url(self, n: int) -> str:
+        """
+        第 n 個假專案的網址，格式和 CSV 中的 urls_web_project 相同。
+        """
+        return f"{self.base_url}/projects/creator-{n}/project-{n}?ref=discovery_category_newest"
+
+    def random(self) -> float:
+        with self._lock:
+            return self._random.random()
+
+    def count_request(self, path: str):
+        if path.startswith("/projects/"):
+            kind = "community"
+        elif path.startswith("/discover/places/"):
+            kind = "place"
+        elif path.startswith("/static/"):
+            kind = "static"
+        else:
+            kind = "other"
+        with self._lock:
+            self.requests[kind] += 1
+
+    def count_injected(self, kind: str):
+        with self._lock:
+            self.injected[kind] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve synthetic Kickstarter community / place pages locally")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="每個回應的延遲秒數")
+    parser.add_argument("--jitter", type=float, default=0.0, help="額外隨機延遲的上限秒數")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="回傳 429 的機率")
+    parser.add_argument("--challenge-rate", type=float, default=0.0, help="回傳驗證頁面的機率")
+    parser.add_argument("--fixtures-dir", default=None, help="錄下來的 HTML 所在資料夾")
+    args = parser.parse_args()
+
+    config = FixtureConfig(latency=args.latency, jitter=args.jitter, failure_rate=args.failure_rate,
+                           challenge_rate=args.challenge_rate, fixtures_dir=args.fixtures_dir)
+    with FixtureServer(config, port=args.port) as server:
+        print(f"fixture server: {community_url(server.project_url(1))}")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
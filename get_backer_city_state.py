@@ -1,182 +1,537 @@
-import pandas as pd
-import sqlite3
+import os
+import sys
+import threading
 import time
-from typing import List
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+from typing import Iterable, List, Tuple
 from playwright.sync_api import Playwright, sync_playwright
+from browser_pool import BrowserPool
+from metrics import metrics
+from request_blocking import BlockingProfile
+from rate_limiter import AdaptiveRateLimiter, BlockedError, guarded_goto
+from wait_strategy import WaitStrategy
+from storage_state import StorageStateManager, storage_state_path
+from http_fetch import BASE_URL, LocationFetcher
+from location_cache import LocationCache, location_cache_path
+from href_progress import HrefProgress
+from csv_stream import iter_project_chunks, read_projects
+from db_writer import BackerLocationWriter
+from work_queue import WorkQueue
+from location_extract import LOCATION_SECONDARY_SELECTOR, extract_us_location_hrefs
+from async_resolver import resolve_locations
+from pipeline import ProjectPipeline, ProjectTask
+from playwright_session import PlaywrightSession, connection_lost
+from done_index import DONE, DoneIndex, community_url, done_index_path
 # from playwright_stealth import stealth_sync, StealthConfig
 
-def run(playwright: Playwright, initial_url: str) -> List[str|None]:
-    browser = playwright.chromium.launch(headless=False)
-    context = browser.new_context()
-    # context = browser.new_context(user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36")
-    page = context.new_page()
-
-    page.goto(initial_url)
-    # 先判斷是不是US再決定要不要爬
-    # page.get_by_role("link", name="United States").first.click()
-
-    # elements = page.locator(".secondary-text.js-location-secondary-text a:has-text('United States')").all()
-    elements = page.locator(".secondary-text.js-location-secondary-text").all()
-    href_list = []
-    for element in elements:
-        # print(element.all_inner_texts())
-        if element.all_inner_texts()[0] != 'United States':
-            href_list.append(None)
-        else:
-            # 向上2層
-            parent = element.locator("xpath=../..")
-            # print(parent.all_inner_texts())
-            # 在同一層找 .primary-text.js-location-primary-text 並click第一個match項目
-            primary_text_element = parent.locator(".primary-text.js-location-primary-text").first
-            # print(primary_text_element.all_inner_texts())
-            ## 拿取 html a element
-            link_element = primary_text_element.locator("a").first
-            href = link_element.get_attribute("href")
-            href_list.append(href)
-    
+def run(playwright: Playwright, initial_url: str, blocking: BlockingProfile | None = None,
+        limiter: AdaptiveRateLimiter | None = None, headless: bool = False,
+        storage: StorageStateManager | None = None, wait: WaitStrategy | None = None) -> List[str|None]:
+    with metrics.stage("browser_launch"):
+        browser = playwright.chromium.launch(headless=headless)
+    # driver 在整個爬取過程中共用，失敗的專案也要關閉 browser，否則每個被擋的頁面都會留下一個 Chromium
+    try:
+        # 有 storage state 時從通過驗證後的 cookies 開始，沒有時和原本一樣是全新的 context
+        context = browser.new_context(**(storage.context_options(browser) if storage is not None else {}))
+        # context = browser.new_context(user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36")
+        page = context.new_page()
+        if blocking is not None:
+            blocking.apply(page, initial_url)
+
+        # 專案可能沒有任何 backer 地點，所以列表沒出現不算被擋
+        try:
+            guarded_goto(page, initial_url, limiter, LOCATION_SECONDARY_SELECTOR, required=False, timeout=10000,
+                         wait=wait, all_matches=True)
+        except Exception as e:
+            if storage is not None:
+                storage.watch(e)
+            raise
+        # 先判斷是不是US再決定要不要爬
+        # page.get_by_role("link", name="United States").first.click()
+
+        # elements = page.locator(".secondary-text.js-location-secondary-text a:has-text('United States')").all()
+        # 一次 eval_on_selector_all 取出所有列，不再逐個元素往返 driver
+        with metrics.stage("extract"):
+            href_list = extract_us_location_hrefs(page)
+    except Exception as e:
+        connection_lost(playwright, e)
+        raise
+    finally:
+        # driver 已經失效時 close() 會永遠等待，browser 會隨舊的 driver 一起結束
+        if not connection_lost(playwright):
+            try:
+                browser.close()
+            except Exception as e:
+                print(f"關閉 browser 時發生錯誤: {e}")
+
+    # 結果固定是前 10 名：列數超過時只取前 10 個，不足時補 None
+    href_list = href_list[:10]
     while len(href_list) < 10:  href_list.append(None)  
     # print(href_list)
     # ---------------------
-    context.close()
-    browser.close()
     return href_list
 
-# 驗證太煩了, 每次都重開一個新個browser
-def run2(playwright: Playwright, href_list: List) -> List[str|None]:
+# 驗證太煩了, 每次都用一個新的 context (cookies/storage 全新), browser 則由 BrowserPool 重複使用
+def run2(playwright: Playwright, href_list: List, pool: BrowserPool | None = None,
+         blocking: BlockingProfile | None = None, cache: LocationCache | None = None,
+         limiter: AdaptiveRateLimiter | None = None, fetcher: LocationFetcher | None = None,
+         headless: bool = False, base_url: str = BASE_URL,
+         storage: StorageStateManager | None = None, progress: HrefProgress | None = None,
+         project_index: int | None = None, wait: WaitStrategy | None = None) -> List[str|None]:
+    # 有 progress 時每個名次解析完就存起來，單一 href 失敗不會讓整個專案重來 (見 href_progress)
+    own_pool = pool is None
+    if own_pool:
+        pool = BrowserPool(playwright, headless=headless, storage_state=storage)
+
+    known = progress.known(project_index) if progress is not None else {}
+    failed = {}
+    untried = []
+    blocked = False
     location = []
-    for href in href_list:
-        if href is None:
-            location.append(None)
-        else:
-            browser = playwright.chromium.launch(headless=False)
-            context = browser.new_context()
-            page = context.new_page()
+    try:
+        for rank, href in enumerate(href_list, start=1):
+            if href is None:
+                location.append(None)
+                continue
+
+            if progress is not None:
+                done, city = progress.resolved(project_index, rank, href, known)
+                if done:
+                    location.append(city)
+                    continue
+
+            # 同一個地點在很多專案都會出現，先查快取，命中就不用開頁面
+            cached = cache.get(href) if cache is not None else None
+            if cached is not None:
+                location.append(cached)
+                continue
 
-            full_url = "https://www.kickstarter.com" + href
+            if blocked:
+                # 被擋之後剩下的 href 也很可能失敗，先不嘗試 (不計次數)，等專案重試
+                untried.append(rank)
+                location.append(None)
+                continue
 
-            page.goto(full_url)
-            # 因為重開browser所以不用等了
-            # time.sleep(random.uniform(1, 5)) # 等1~5秒
+            try:
+                # 先用 HTTP 直接抓 HTML，解析失敗或遇到驗證才開瀏覽器
+                location_text = fetcher.fetch(href) if fetcher is not None else None
+                if location_text is None:
+                    with pool.new_context() as context:
+                        if blocking is not None:
+                            blocking.apply(context, href)
+                        page = context.new_page()
+
+                        full_url = base_url + href
+
+                        guarded_goto(page, full_url, limiter, "#location_filter .js-title", wait=wait)
+                        # 因為每次都是新的context所以不用等了
+                        # time.sleep(random.uniform(1, 5)) # 等1~5秒
+
+                        with metrics.stage("extract"):
+                            location_span = page.locator("#location_filter .js-title").first
+                            location_text = location_span.inner_text()
+                        # print(f"当前选择的地点是: {location_text}")
+                    if fetcher is not None:
+                        fetcher.record(href, "browser")
+            except Exception as e:
+                # driver 失效時繼續下一個 href 會永遠等待，往上拋讓 PlaywrightSession.recover 重新啟動
+                if progress is None or connection_lost(playwright, e):
+                    raise
+                print(f"第 {rank} 名 {href} 解析失敗: {e}")
+                blocked = blocked or (isinstance(e, BlockedError) and e.blocked)
+                if not progress.record_failure(project_index, rank, href, e):
+                    failed[rank] = e
+                location.append(None)
+                continue
 
-            location_span = page.locator("#location_filter .js-title").first
-            location_text = location_span.inner_text()
             location.append(location_text)
-            # print(f"当前选择的地点是: {location_text}")
-            context.close()
-            browser.close()
-    
+            if cache is not None:
+                cache.put(href, location_text)
+            if progress is not None:
+                progress.record(project_index, rank, href, location_text)
+    finally:
+        if own_pool:
+            pool.close()
+
+    if progress is not None:
+        progress.raise_if_incomplete(project_index, failed, untried)
     return location
 
-# --- 自動偵測起始索引的函式 ---
-def get_start_index(connection, table_name):
+def scrape_project(url: str, location_concurrency: int = 1, blocking: BlockingProfile | None = None,
+                   cache: LocationCache | None = None, limiter: AdaptiveRateLimiter | None = None,
+                   use_http_fetch: bool = False, headless: bool = False,
+                   base_url: str = BASE_URL,
+                   storage: StorageStateManager | None = None, progress: HrefProgress | None = None,
+                   project_index: int | None = None,
+                   wait: WaitStrategy | None = None,
+                   playwright: Playwright | None = None,
+                   fetcher: LocationFetcher | None = None) -> Tuple[List[str|None], List[str|None]]:
     """
-    檢查資料庫，返回下一個要處理的索引值。
+    爬取一個專案的 community 頁面 (run) 並解析前 10 名 backer 的地點 (run2 / async_resolver)。
+    回傳 (href_list, location_text_list)，兩個列表的順序相同。
+    base_url 是地點頁面 href 前面要加上的網站位址 (benchmark 時指向本機的 fixture server)。
+    storage 有指定時 run / run2 的 context 都從同一份 storage state 建立 (async_resolver 不使用)。
+    progress 有指定時每個名次解析完就記錄在 project_index 底下，重試時只重新解析失敗的 href。
+    wait 是所有導覽使用的 WaitStrategy，None 代表等 load。
+    playwright 是呼叫端已經啟動的 Playwright (見 PlaywrightSession)，None 代表這次另外啟動一個 driver。
+    fetcher 是呼叫端長時間共用的 LocationFetcher (必須建立在同一個 playwright 上)，
+    None 時 use_http_fetch 為 True 才為這個專案建立一個。
     """
-    try:
-        # 讀取已儲存資料中的最大索引值
-        # "index" 是 pandas.to_sql 預設建立的索引欄位名稱
-        last_idx_df = pd.read_sql(f'SELECT MAX("index") FROM {table_name}', connection)
-        last_idx = last_idx_df.iloc[0, 0]
-
-        if pd.notna(last_idx):
-            # 如果找到了，就從下一筆開始
-            start_from = int(last_idx) + 1
-            print(f"資料庫中最後一筆已處理的索引為: {last_idx}。將從索引 {start_from} 開始執行。")
-            return start_from
+    with nullcontext(playwright) if playwright is not None else sync_playwright() as playwright:
+        print(url)
+        href_list = run(playwright, url, blocking, limiter, headless, storage, wait)
+        if location_concurrency > 1:
+            location_text_list = resolve_locations(href_list, location_concurrency, headless, blocking=blocking,
+                                                   cache=cache, limiter=limiter, base_url=base_url,
+                                                   progress=progress, project_index=project_index, wait=wait)
         else:
-            # 如果表格是空的，從頭開始
-            print(f"資料表 '{table_name}' 為空，將從頭開始執行。")
-            return 0
-    except (sqlite3.OperationalError, pd.io.sql.DatabaseError):
-        # 如果資料表不存在，也是從頭開始
-        print(f"找不到資料表 '{table_name}'，將建立新表並從頭開始執行。")
-        return 0
+            own_fetcher = fetcher is None and use_http_fetch
+            if own_fetcher:
+                fetcher = LocationFetcher(playwright, limiter, base_url=base_url)
+            try:
+                location_text_list = run2(playwright, href_list, blocking=blocking, cache=cache,
+                                          limiter=limiter, fetcher=fetcher, headless=headless, base_url=base_url,
+                                          storage=storage, progress=progress, project_index=project_index,
+                                          wait=wait)
+            finally:
+                if own_fetcher:
+                    fetcher.report()
+                    fetcher.close()
+        print(location_text_list)
+    return href_list, location_text_list
 
-if __name__ == "__main__":
-    file_link = "filepath.csv"
-    df = pd.read_csv(file_link)
-
-    # Construct new variable
-    df = df.assign(backer_detail_city1 = None
-                , backer_detail_city2 = None
-                , backer_detail_city3 = None
-                , backer_detail_city4 = None
-                , backer_detail_city5 = None
-                , backer_detail_city6 = None
-                , backer_detail_city7 = None
-                , backer_detail_city8 = None
-                , backer_detail_city9 = None
-                , backer_detail_city10 = None)
-
-    con_out = sqlite3.connect("filepath.db")   
-    c = con_out.cursor()
-
-    # --- MODIFIED: 自動設定起始點，不再需要手動的 hand_type ---
-    start_index = get_start_index(con_out, "backer_location")
-    is_first_write = (start_index == 0) # 判斷是否為首次寫入
-
-    # Set batch processing parameters
-    threshold = 1  # number of rows per batch
-    # hand_type = 228  # resume point if interrupted (set to None or 0 to start from beginning)
-
-    # start_index = hand_type if hand_type else 0
-    total_rows = len(df)
-    
-    # 加入sleep防止被ban IP
-    count = 30
-
-    for i in range(start_index, total_rows):
-        count = count - 1
-        if count == 0:
-            count = 30
-            time.sleep(1*60)
-        
-        BackerCount = int(df.at[i, 'backers_count'])
-        url = df.at[i, 'urls_web_project'].replace('?ref=discovery_category_newest', '/community')\
-                                          .replace('?ref=category_newest', '/community')
-
-        if BackerCount >= 10:
-            print(f'Index {i}, Backer_count = {BackerCount}')
-            with sync_playwright() as playwright:
-                print(url)
-                href_list = run(playwright, url)
-                location_text_list = run2(playwright, href_list)
-                print(location_text_list)
-
-            if location_text_list and len(location_text_list) == 10:
-                for j in range(10):
-                    df.at[i, f'backer_detail_city{j+1}'] = location_text_list[j]
-            else:
-                print(f"Empty or invalid list at index {i}")
-                for j in range(10):
-                    df.at[i, f'backer_detail_city{j+1}'] = ""
+@contextmanager
+def _discovery_stage(playwright: Playwright, blocking: BlockingProfile | None, limiter: AdaptiveRateLimiter | None,
+                     headless: bool, storage: StorageStateManager | None, wait: WaitStrategy | None):
+    # pipeline 的 discovery stage：community 頁面 -> href_list
+    def discover(task: ProjectTask):
+        print(task.url)
+        task.href_list = run(playwright, task.url, blocking, limiter, headless, storage, wait)
+    yield discover
+
+@contextmanager
+def _resolution_stage(playwright: Playwright, location_concurrency: int, blocking: BlockingProfile | None,
+                      cache: LocationCache | None, limiter: AdaptiveRateLimiter | None, use_http_fetch: bool,
+                      headless: bool, base_url: str, storage: StorageStateManager | None,
+                      progress: HrefProgress | None, wait: WaitStrategy | None, max_browser_rss_mb: float | None):
+    # pipeline 的 resolution stage：href_list -> 城市，整個 stage 共用一個 BrowserPool
+    fetcher = LocationFetcher(playwright, limiter, base_url=base_url) if use_http_fetch else None
+    pool = BrowserPool(playwright, headless=headless, storage_state=storage, max_rss_mb=max_browser_rss_mb)
+
+    def resolve(task: ProjectTask):
+        if location_concurrency > 1:
+            task.location_text_list = resolve_locations(task.href_list, location_concurrency, headless,
+                                                        blocking=blocking, cache=cache, limiter=limiter,
+                                                        base_url=base_url, progress=progress, project_index=task.index,
+                                                        wait=wait)
         else:
-            for j in range(10):
-                df.at[i, f'backer_detail_city{j+1}'] = ""
-
-        # --- MODIFIED: 批次寫入資料庫的邏輯 ---
-        if ((i + 1) % threshold == 0) or (i == total_rows - 1):
-            # 因為 threshold=1，所以每次只選取當前這一行
-            output = df.loc[i:i] 
-            
-            # 決定寫入模式
-            write_mode = 'replace' if is_first_write else 'append'
-            
-            try:
-                # --- IMPORTANT: index=True 是實現自動續爬的關鍵 ---
-                # 它會將 DataFrame 的索引 (0, 1, 2...) 作為一欄存入資料庫
-                output.to_sql("backer_location", con=con_out, if_exists=write_mode, index=True)
-                # 從 output 這個單行 DataFrame 中，取得 'row' 欄位的值
-                row_value = output['row'].iloc[0] 
-                
-                print(f'---- 已將row {row_value} 的資料寫入資料庫 (模式: {write_mode}) ----')
-                
-                # 第一次成功寫入後，之後的模式都必須是 'append'
-                if is_first_write:
-                    is_first_write = False
-            except Exception as e:
-                print(f"索引 {i} 寫入資料庫時發生錯誤: {e}")
-                # 這裡可以加入更詳細的錯誤處理，例如重試或記錄 log
-                break # 發生嚴重錯誤時可以選擇中斷迴圈
+            task.location_text_list = run2(playwright, task.href_list, pool=pool, blocking=blocking, cache=cache,
+                                           limiter=limiter, fetcher=fetcher, base_url=base_url, progress=progress,
+                                           project_index=task.index, wait=wait)
+        print(task.location_text_list)
+
+    try:
+        yield resolve
+    finally:
+        pool.close()
+        if fetcher is not None:
+            fetcher.report()
+            fetcher.close()
+
+def _record_result(task: ProjectTask, work_queue: WorkQueue, writer: BackerLocationWriter, schema: str,
+                   done_index: DoneIndex | None = None):
+    """
+    把一個專案的結果交給 writer，失敗的專案標記在佇列中稍後重試，並在 done_index 中釋放這個專案。
+    """
+    i = task.index
+    metrics.record("project", task.elapsed, type(task.error).__name__ if task.error is not None else None)
+    if task.error is not None:
+        print(f"索引 {i} 爬取時發生錯誤，稍後重試: {task.error}")
+        work_queue.mark_failed(i, f"{type(task.error).__name__}: {task.error}")
+        if done_index is not None:
+            done_index.release(task.project['urls_web_project'], (writer.db_path, i))
+        return
+    metrics.count("projects")
+
+    location_text_list = task.location_text_list
+    if not location_text_list or len(location_text_list) != 10:
+        # 不再寫入空字串，標記失敗稍後重試
+        print(f"Empty or invalid list at index {i}")
+        work_queue.mark_failed(i, f"invalid location list: {location_text_list}")
+        if done_index is not None:
+            done_index.release(task.project['urls_web_project'], (writer.db_path, i))
+        return
 
-    con_out.close()
\ No newline at end of file
+    # --- 結果不寫回輸入的 DataFrame，直接組成一筆交給背景 thread 批次寫入 ---
+    result = {"index": i, **task.project}
+    for j in range(10):
+        result[f'backer_detail_city{j+1}'] = location_text_list[j]
+        if schema == "normalized":
+            result[f'backer_detail_href{j+1}'] = task.href_list[j]
+    try:
+        writer.write(result)
+    except Exception as e:
+        print(f"索引 {i} 寫入資料庫時發生錯誤: {e}")
+        raise # 資料庫無法寫入時中斷，未完成的索引會重新排入佇列
+
+@dataclass
+class CrawlConfig:
+    """
+    crawl_csv 的爬取設定，分片 (shard_crawler)、benchmark 與 __main__ 共用同一組欄位，
+    只需要指定和預設不同的欄位，例如 CrawlConfig(use_http_fetch=True, wait=WaitStrategy("selector"))。
+
+    Args:
+        location_concurrency (int): 大於 1 時改用 async_resolver 同時解析地點頁面 (同時開啟的頁面上限)。
+        blocking (BlockingProfile): 套用到每個 page / context 的請求攔截設定，None 代表不攔截。
+        use_location_cache (bool): 是否使用 db_path 旁的 location_cache.db 快取 href -> 城市。
+        batch_size (int): 背景寫入每批的筆數。
+        claim_size (int): 每次從佇列取出的索引數。
+        max_attempts (int): 每個索引最多嘗試幾次。
+        retry_delay (float): 失敗的索引至少等幾秒才重試。
+        limiter (AdaptiveRateLimiter): run / run2 所有導覽共用的速率限制，None 代表使用預設設定。
+        use_http_fetch (bool): 地點頁面先用 HTTP 請求解析，失敗才開瀏覽器 (location_concurrency 為 1 時有效)。
+        chunksize (int): 每次讀入記憶體的 CSV 列數。
+        export_metrics (bool): 是否把各階段耗時輸出到 db_path 旁的 <db>_metrics.jsonl 與 <db>_metrics.prom。
+        headless (bool): 傳給 chromium.launch 的 headless 參數。
+        base_url (str): 地點頁面 href 前面要加上的網站位址。
+        use_storage_state (bool): 先通過一次驗證並把 cookies 存到 db_path 旁的 storage_state.json，
+                                  之後的 context 都從這份 state 建立 (過期、用太多次或被擋時重新取得)。
+        schema (str): "wide" 為原本的寬表格；"normalized" 改寫入 locations / project_backer_location，
+                      backer_location 變成欄位相同的 view (見 normalized_schema)。
+        pipeline_depth (int): 大於 0 時 run 和 run2 分成兩個 thread 同時進行 (見 pipeline.ProjectPipeline)，
+                              這是兩個 stage 之間 queue 的容量；0 代表一個專案做完再做下一個。
+        use_href_progress (bool): 每個名次的地點解析完就寫入 db_path 的 backer_href_progress，
+                                  單一 href 失敗時專案稍後重試，但只重新解析失敗的 href (每個最多 max_attempts 次)。
+        wait (WaitStrategy): 導覽等到什麼程度才開始讀取元素 (load / domcontentloaded / commit / selector)，
+                             None 代表等 load。各策略的耗時記錄在 metrics 的 page_ready_<mode>。
+        max_browser_rss_mb (float): pipeline 模式下 resolution stage 長時間共用的 BrowserPool，
+                                    Chromium RSS 總和超過這個值 (MB) 時回收 browser；None 代表不檢查。
+        use_done_index (bool): 使用 db_path 旁所有分片共用的 done_index.db，已經在任何一個分片 / 匯出檔完成的專案
+                               (以標準化後的專案網址比對) 不再開啟 browser，佇列中標記為 skipped。
+        retry_failed (bool): 所有索引處理完之後，等待並重試失敗的索引，直到成功或用完 max_attempts 次才結束；
+                             False 代表失敗的索引留到下次執行。
+    """
+    location_concurrency: int = 1
+    blocking: BlockingProfile | None = None
+    use_location_cache: bool = True
+    batch_size: int = 50
+    claim_size: int = 10
+    max_attempts: int = 3
+    retry_delay: float = 300
+    limiter: AdaptiveRateLimiter | None = None
+    use_http_fetch: bool = False
+    chunksize: int = 10000
+    export_metrics: bool = True
+    headless: bool = False
+    base_url: str = BASE_URL
+    use_storage_state: bool = False
+    schema: str = "wide"
+    pipeline_depth: int = 0
+    use_href_progress: bool = True
+    wait: WaitStrategy | None = None
+    max_browser_rss_mb: float | None = None
+    use_done_index: bool = True
+    retry_failed: bool = True
+
+
+def crawl_csv(file_link: str, db_path: str, row_indices: Iterable[int] | None = None,
+              config: CrawlConfig | None = None):
+    """
+    分塊讀取 CSV 中的專案，把前 10 名 backer 的城市寫入 db_path 的 backer_location 表格。
+    只讀取需要的欄位，backers_count 低於 10 的專案直接略過 (不寫入)。
+    要處理的索引放在 db_path 的 crawl_queue 表格中，依每筆的狀態續爬；
+    失敗的索引不寫入結果，記錄錯誤後稍後重試。
+
+    Args:
+        file_link (str): 專案 CSV 檔案路徑。
+        db_path (str): 輸出的 .db 檔案路徑。
+        row_indices (iterable): 只處理這些索引 (分片用)，None 代表整份 CSV。
+        config (CrawlConfig): 爬取設定，None 代表全部使用預設值。
+
+    Returns:
+        int: 結束時還可以重試 (失敗但還沒用完 max_attempts 次) 的索引數，0 代表這個 .db 已經爬完。
+    """
+    config = config or CrawlConfig()
+    if row_indices is not None:
+        row_indices = set(row_indices)
+
+    if config.export_metrics:
+        metrics_prefix = os.path.splitext(db_path)[0] + "_metrics"
+        metrics.configure(metrics_prefix + ".jsonl", metrics_prefix + ".prom")
+
+    # --- 以工作佇列取代 MAX("index") 續爬，已完成的索引不會重做 ---
+    work_queue = WorkQueue(db_path, max_attempts=config.max_attempts, retry_delay=config.retry_delay)
+
+    cache = LocationCache(location_cache_path(db_path)) if config.use_location_cache else None
+
+    done_index = None
+    if config.use_done_index:
+        done_index = DoneIndex(done_index_path(db_path))
+        done_index.import_db(db_path)
+
+    # 結果寫入和佇列標記 done 在同一個 transaction；commit 之後才加入 done index
+    writer = BackerLocationWriter(db_path, "backer_location", batch_size=config.batch_size,
+                                  after_write=work_queue.mark_done_in_transaction, schema=config.schema,
+                                  after_commit=(lambda rows: done_index.add_rows(rows, db_path))
+                                  if done_index is not None else None)
+    if threading.current_thread() is threading.main_thread():
+        writer.install_signal_handlers()
+
+    # 防止被ban IP：所有導覽共用一個會依封鎖情況調整速率的 limiter，取代每 30 筆睡 1 分鐘
+    limiter = config.limiter if config.limiter is not None else AdaptiveRateLimiter()
+
+    storage = StorageStateManager(storage_state_path(db_path), warmup_url=config.base_url + "/discover",
+                                  limiter=limiter) if config.use_storage_state else None
+
+    progress = HrefProgress(db_path, max_attempts=config.max_attempts) if config.use_href_progress else None
+
+    # 不使用 pipeline 時整個迴圈共用一個 driver 和同一個 LocationFetcher (連線池)，只在 driver 失效時重新建立
+    session = None
+    fetcher = None
+    pipeline = None
+    if config.pipeline_depth > 0:
+        pipeline = ProjectPipeline(
+            lambda playwright: _discovery_stage(playwright, config.blocking, limiter, config.headless, storage,
+                                                config.wait),
+            lambda playwright: _resolution_stage(playwright, config.location_concurrency, config.blocking, cache,
+                                                 limiter, config.use_http_fetch, config.headless, config.base_url,
+                                                 storage, progress, config.wait, config.max_browser_rss_mb),
+            depth=config.pipeline_depth,
+        )
+    else:
+        session = PlaywrightSession()
+
+    def process_claims(chunk, min_idx: int | None, max_idx: int | None):
+        # 從佇列取出 chunk 範圍內可以處理的索引，直到沒有為止
+        nonlocal fetcher
+        while True:
+            claimed = work_queue.claim(config.claim_size, min_idx, max_idx)
+            if not claimed:
+                break
+
+            for i in claimed:
+                if i not in chunk.index:
+                    # 舊版佇列中 backer 數不足 (不需要爬) 的索引
+                    work_queue.mark_done(i)
+                    continue
+
+                project = chunk.loc[i]
+                url = community_url(project['urls_web_project'])
+                if url is None:
+                    # 沒有專案網址，重試也不會成功
+                    print(f"Index {i} 沒有可用的專案網址，略過: {project['urls_web_project']!r}")
+                    work_queue.mark_skipped(i, "missing project url")
+                    continue
+                duplicate = None
+                if done_index is not None:
+                    duplicate = done_index.check(project['urls_web_project'], (db_path, i))
+                if duplicate == DONE:
+                    # 其他分片或之前的匯出檔已經爬過同一個專案，不開啟 browser
+                    print(f"Index {i} 和已完成的專案重複，略過: {project['urls_web_project']}")
+                    work_queue.mark_skipped(i, "duplicate")
+                    continue
+                if duplicate is not None:
+                    # 同一個專案正由其他索引處理中，它可能失敗，所以稍後再檢查一次 (不消耗嘗試次數)
+                    print(f"Index {i} 的專案正由其他索引處理中，稍後再檢查: {project['urls_web_project']}")
+                    work_queue.mark_deferred(i, "duplicate in flight")
+                    continue
+
+                BackerCount = int(project['backers_count'])
+                print(f'Index {i}, Backer_count = {BackerCount}')
+
+                task = ProjectTask(i, project.to_dict(), url)
+                if pipeline is not None:
+                    # queue 滿時在這裡等待；已完成的專案依加入的順序寫入
+                    pipeline.submit(task)
+                    finished = pipeline.completed()
+                else:
+                    try:
+                        if fetcher is None and config.use_http_fetch and config.location_concurrency == 1:
+                            fetcher = LocationFetcher(session.playwright, limiter, base_url=config.base_url)
+                        task.href_list, task.location_text_list = scrape_project(
+                            url, config.location_concurrency, config.blocking, cache, limiter, config.use_http_fetch,
+                            config.headless, config.base_url, storage, progress, i, config.wait, session.playwright,
+                            fetcher)
+                    except Exception as e:
+                        task.error = e
+                        if session.recover(e) and fetcher is not None:
+                            # 舊的 APIRequestContext 跟著舊的 driver 失效，下一個專案在新的 driver 上重新建立
+                            fetcher.report()
+                            fetcher.close()
+                            fetcher = None
+                    task.elapsed = time.perf_counter() - task.started
+                    finished = [task]
+                for task in finished:
+                    _record_result(task, work_queue, writer, config.schema, done_index)
+
+    try:
+        for chunk in iter_project_chunks(file_link, config.chunksize):
+            if row_indices is not None:
+                chunk = chunk[chunk.index.isin(row_indices)]
+            if chunk.empty:
+                continue
+            work_queue.seed(chunk.index)
+            process_claims(chunk, chunk.index[0], chunk.index[-1])
+
+        # 失敗的索引要等 retry_delay 之後才能 claim，而上面每一塊只 claim 自己範圍內的索引，
+        # 所以最後等到可以重試時再處理一次，直到每個失敗的索引都成功或用完 max_attempts 次
+        while config.retry_failed:
+            if pipeline is not None:
+                for task in pipeline.drain():
+                    _record_result(task, work_queue, writer, config.schema, done_index)
+            retry_at = work_queue.next_retry_at()
+            if retry_at is None:
+                break
+            delay = retry_at - time.time() + 1
+            if delay > 0:
+                print(f"{len(work_queue.retryable())} 個失敗的索引 {delay:.0f} 秒後重試")
+                time.sleep(delay)
+            # 不限範圍 claim，所以只讀入要重試的列
+            process_claims(read_projects(file_link, work_queue.retryable(), config.chunksize), None, None)
+
+        if pipeline is not None:
+            for task in pipeline.finish():
+                _record_result(task, work_queue, writer, config.schema, done_index)
+        retryable = len(work_queue.retryable())
+        # 有批次寫入失敗時在這裡拋出，不能當作完成
+        writer.close()
+    finally:
+        if pipeline is not None:
+            pipeline.close()
+        if fetcher is not None:
+            fetcher.report()
+            fetcher.close()
+        if session is not None:
+            session.stop()
+            session.report()
+        # 中途發生例外也要把佇列中的資料寫完；寫入錯誤已經印出，不蓋掉原本的例外
+        try:
+            writer.close()
+        except Exception:
+            pass
+        limiter.report()
+        if storage is not None:
+            storage.report()
+        if progress is not None:
+            progress.report()
+            progress.close()
+        work_queue.release()
+        work_queue.report()
+        work_queue.close()
+        if cache is not None:
+            cache.report()
+            cache.close()
+        if done_index is not None:
+            done_index.report()
+            done_index.close()
+        metrics.report()
+        metrics.close()
+    return retryable
+
+if __name__ == "__main__":
+    remaining = crawl_csv("filepath.csv", "filepath.db",
+                          config=CrawlConfig(blocking=BlockingProfile(), use_http_fetch=True,
+                                             wait=WaitStrategy("selector")))
+    # supervisor 以 exit code 0 判斷爬取完成，還有可以重試的索引時以非 0 結束，讓它重新啟動 worker
+    sys.exit(1 if remaining else 0)
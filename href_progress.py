@@ -0,0 +1,134 @@
+import sqlite3
+import threading
+import time
+from typing import Dict, List
+
+DONE = "done"
+FAILED = "failed"
+GAVE_UP = "gave_up"
+
+
+class PartialResultError(Exception):
+    """
+    專案中有 href 解析失敗 (或因為被擋而還沒嘗試)，已經解析的部分已存起來，下次只重試失敗的 href。
+    """
+    def __init__(self, project_index: int, failed: Dict[int, Exception], untried: List[int]):
+        super().__init__(f"project {project_index}: failed ranks {sorted(failed)}, untried ranks {untried}")
+        self.project_index = project_index
+        self.failed = failed
+        self.untried = untried
+
+
+class HrefProgress:
+    """
+    把每個專案每個名次 (project_index, rank) 的 href 解析結果一得到就寫入輸出 .db，
+    專案中途失敗或程式當掉時，已經解析的地點不會遺失，重試時只需要重新開啟失敗的 href。
+
+    - 成功：status = done，記錄城市
+    - 失敗：status = failed，attempts + 1；達到 max_attempts 後改為 gave_up，該名次以 NULL 寫入結果
+    - href 和上次不同 (community 頁面名次變動) 時，舊的紀錄不使用
+
+    Args:
+        db_path (str): 輸出的 .db 檔案路徑。
+        max_attempts (int): 每個 href 最多嘗試幾次，建議和 WorkQueue 的 max_attempts 相同。
+        table_name (str): 表格名稱。
+    """
+    def __init__(self, db_path: str, max_attempts: int = 3, table_name: str = "backer_href_progress"):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.table_name = table_name
+        self.resumed = 0
+        self.recorded = 0
+        self.failures = 0
+        self.gave_up = 0
+        self._lock = threading.Lock()
+        # pipeline 模式下由解析 stage 的 thread 使用
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL;")
+        self._conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table_name} (
+                project_index INTEGER NOT NULL,
+                rank INTEGER NOT NULL,
+                href TEXT NOT NULL,
+                city TEXT,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                updated_at REAL,
+                PRIMARY KEY (project_index, rank)
+            );
+        ''')
+        self._conn.commit()
+
+    def known(self, project_index: int) -> Dict[int, tuple]:
+        """
+        回傳這個專案已經有紀錄的名次 {rank: (href, city, status, attempts)}。
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT rank, href, city, status, attempts FROM {self.table_name} WHERE project_index = ?",
+                (int(project_index),)
+            ).fetchall()
+        return {rank: (href, city, status, attempts) for rank, href, city, status, attempts in rows}
+
+    def resolved(self, project_index: int, rank: int, href: str, known: Dict) -> tuple[bool, str | None]:
+        """
+        這個名次是否已經有結果 (done 或已放棄)，有的話一併回傳城市 (放棄時為 None)。
+        """
+        entry = known.get(rank)
+        if entry is None or entry[0] != href or entry[2] not in (DONE, GAVE_UP):
+            return False, None
+        self.resumed += 1
+        return True, entry[1]
+
+    def record(self, project_index: int, rank: int, href: str, city: str | None):
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO {self.table_name} (project_index, rank, href, city, status, attempts, updated_at) "
+                f"VALUES (?, ?, ?, ?, '{DONE}', 1, ?) "
+                f"ON CONFLICT(project_index, rank) DO UPDATE SET href = excluded.href, city = excluded.city, "
+                f"status = '{DONE}', attempts = {self.table_name}.attempts + 1, last_error = NULL, "
+                f"updated_at = excluded.updated_at",
+                (int(project_index), rank, href, city, time.time())
+            )
+            self._conn.commit()
+            self.recorded += 1
+
+    def record_failure(self, project_index: int, rank: int, href: str, error: Exception) -> bool:
+        """
+        記錄一次失敗，回傳這個名次是否已經達到次數上限 (之後不再重試)。
+        href 和上次不同時重新計算次數。
+        """
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT href, attempts FROM {self.table_name} WHERE project_index = ? AND rank = ?",
+                (int(project_index), rank)
+            ).fetchone()
+            attempts = (row[1] if row is not None and row[0] == href else 0) + 1
+            status = GAVE_UP if attempts >= self.max_attempts else FAILED
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table_name} "
+                f"(project_index, rank, href, city, status, attempts, last_error, updated_at) "
+                f"VALUES (?, ?, ?, NULL, ?, ?, ?, ?)",
+                (int(project_index), rank, href, status, attempts, f"{type(error).__name__}: {error}", time.time())
+            )
+            self._conn.commit()
+            self.failures += 1
+            if status == GAVE_UP:
+                self.gave_up += 1
+                print(f"[href_progress] 專案 {project_index} 第 {rank} 名 {href} 已失敗 {attempts} 次，不再重試")
+            return status == GAVE_UP
+
+    def raise_if_incomplete(self, project_index: int, failed: Dict[int, Exception], untried: List[int]):
+        """
+        還有可以重試的失敗名次或還沒嘗試的名次時拋出 PartialResultError，讓專案稍後重試。
+        """
+        if failed or untried:
+            raise PartialResultError(project_index, failed, untried)
+
+    def report(self):
+        print(f"[href_progress] 沿用已解析的名次 {self.resumed} 個，新記錄 {self.recorded} 個，"
+              f"失敗 {self.failures} 次，放棄 {self.gave_up} 個")
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,137 @@
+from html.parser import HTMLParser
+from typing import Dict
+from playwright.sync_api import Playwright
+from metrics import metrics
+from playwright_session import connection_lost
+from rate_limiter import AdaptiveRateLimiter, BLOCK_STATUS_CODES, BLOCK_TITLE_MARKERS
+
+BASE_URL = "https://www.kickstarter.com"
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36"
+CHALLENGE_HTML_MARKERS = ("px-captcha", "challenge-form", "cf-challenge", "captcha-delivery")
+_VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+
+class _LocationTitleParser(HTMLParser):
+    """
+    從 HTML 中找出 #location_filter 底下第一個 .js-title 的文字。
+    """
+    def __init__(self):
+        super().__init__()
+        self.title = None
+        self._filter_depth = 0   # 在 #location_filter 內的層數
+        self._title_depth = 0    # 在 .js-title 內的層數
+        self._parts = []
+
+    def handle_starttag(self, tag, attrs):
+        if self.title is not None or tag in _VOID_TAGS:
+            return
+        attrs = dict(attrs)
+        if self._title_depth:
+            self._title_depth += 1
+        elif self._filter_depth:
+            self._filter_depth += 1
+            if "js-title" in (attrs.get("class") or "").split():
+                self._title_depth = 1
+        elif attrs.get("id") == "location_filter":
+            self._filter_depth = 1
+
+    def handle_endtag(self, tag):
+        if self.title is not None or tag in _VOID_TAGS:
+            return
+        if self._title_depth:
+            self._title_depth -= 1
+            if self._title_depth == 0:
+                self.title = " ".join("".join(self._parts).split())
+        if self._filter_depth:
+            self._filter_depth -= 1
+
+    def handle_data(self, data):
+        if self._title_depth and self.title is None:
+            self._parts.append(data)
+
+
+def parse_location_title(html: str) -> str | None:
+    parser = _LocationTitleParser()
+    parser.feed(html)
+    return parser.title or None
+
+
+def is_challenge_html(html: str) -> bool:
+    lowered = html.lower()
+    if any(marker in lowered for marker in CHALLENGE_HTML_MARKERS):
+        return True
+    start = lowered.find("<title")
+    title = lowered[start:lowered.find("</title>", start)] if start != -1 else ""
+    return any(marker in title for marker in BLOCK_TITLE_MARKERS)
+
+
+class LocationFetcher:
+    """
+    用 Playwright 的 APIRequestContext (共用連線池) 直接抓地點頁面的 HTML 並解析地點名稱，
+    不用開整個 Chromium 頁面。解析失敗或遇到驗證時回傳 None，由呼叫端改用瀏覽器。
+    served_by 記錄每個 href 最後是由 "http" 還是 "browser" 取得。
+
+    Args:
+        playwright (Playwright): 已啟動的 sync_playwright 物件。
+        limiter (AdaptiveRateLimiter): 和瀏覽器導覽共用的速率限制。
+        timeout (float): 每個請求的逾時 (毫秒)。
+        base_url (str): href 前面要加上的網站位址 (benchmark 時指向本機的 fixture server)。
+    """
+    def __init__(self, playwright: Playwright, limiter: AdaptiveRateLimiter | None = None, timeout: float = 15000,
+                 base_url: str = BASE_URL):
+        self.limiter = limiter
+        self.timeout = timeout
+        self.served_by: Dict[str, str] = {}
+        self.http_count = 0
+        self.browser_count = 0
+        self._playwright = playwright
+        self._request = playwright.request.new_context(
+            base_url=base_url,
+            extra_http_headers={"User-Agent": USER_AGENT, "Accept-Language": "en-US,en;q=0.9"},
+        )
+
+    def fetch(self, href: str) -> str | None:
+        if self.limiter is not None:
+            self.limiter.acquire()
+        try:
+            with metrics.stage("http_fetch"):
+                response = self._request.get(href, timeout=self.timeout)
+        except Exception as e:
+            if connection_lost(self._playwright, e):
+                # driver 已經失效，改用瀏覽器也會卡住，往上拋讓呼叫端重新啟動 driver
+                raise
+            print(f"[http_fetch] {href} 請求失敗，改用瀏覽器: {e}")
+            return None
+
+        if response.status in BLOCK_STATUS_CODES:
+            if self.limiter is not None:
+                self.limiter.report_block(f"http_{response.status}")
+            return None
+        html = response.text()
+        if is_challenge_html(html):
+            if self.limiter is not None:
+                self.limiter.report_block("verification")
+            return None
+
+        title = parse_location_title(html)
+        if title is None:
+            return None
+        if self.limiter is not None:
+            self.limiter.report_success()
+        self.record(href, "http")
+        metrics.count("pages")
+        return title
+
+    def record(self, href: str, path: str):
+        self.served_by[href] = path
+        if path == "http":
+            self.http_count += 1
+        else:
+            self.browser_count += 1
+
+    def report(self):
+        print(f"[http_fetch] HTTP 取得 {self.http_count} 個，改用瀏覽器 {self.browser_count} 個")
+
+    def close(self):
+        if not connection_lost(self._playwright):
+            self._request.dispose()
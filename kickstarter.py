@@ -3,13 +3,29 @@ import random
 import time
 from typing import List
 from playwright.sync_api import Playwright, sync_playwright
+from browser_pool import BrowserPool
+from metrics import metrics
+from request_blocking import BlockingProfile
+from rate_limiter import AdaptiveRateLimiter, guarded_goto
+from wait_strategy import WAIT_MODES, WaitStrategy
+from storage_state import StorageStateManager
+from http_fetch import LocationFetcher
+from location_cache import LocationCache
+from location_extract import LOCATION_SECONDARY_SELECTOR, extract_us_location_hrefs
+from async_resolver import resolve_locations
 # from playwright_stealth import stealth_sync, StealthConfig
 
-def run(playwright: Playwright, initial_url: str) -> List[str|None]:
-    browser = playwright.chromium.launch(headless=False)
-    context = browser.new_context()
+def run(playwright: Playwright, initial_url: str, blocking: BlockingProfile | None = None,
+        limiter: AdaptiveRateLimiter | None = None, storage: StorageStateManager | None = None,
+        wait: WaitStrategy | None = None) -> List[str|None]:
+    with metrics.stage("browser_launch"):
+        browser = playwright.chromium.launch(headless=False)
+    # 有 storage state 時從通過驗證後的 cookies 開始，沒有時和原本一樣是全新的 context
+    context = browser.new_context(**(storage.context_options(browser) if storage is not None else {}))
     # context = browser.new_context(user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36")
     page = context.new_page()
+    if blocking is not None:
+        blocking.apply(page, initial_url)
 
     ## 太多驗證啦
     # 因為重開browser所以不用了
@@ -42,30 +58,23 @@ def run(playwright: Playwright, initial_url: str) -> List[str|None]:
 
     # stealth_sync(page, config=stealth_config)
 
-    page.goto(initial_url)
+    # 專案可能沒有任何 backer 地點，所以列表沒出現不算被擋
+    try:
+        guarded_goto(page, initial_url, limiter, LOCATION_SECONDARY_SELECTOR, required=False, timeout=10000,
+                     wait=wait, all_matches=True)
+    except Exception as e:
+        if storage is not None:
+            storage.watch(e)
+        raise
 
     # time.sleep(random.uniform(1, 5)) # 等1~5秒
     # 先判斷是不是US再決定要不要爬
     # page.get_by_role("link", name="United States").first.click()
 
     # elements = page.locator(".secondary-text.js-location-secondary-text a:has-text('United States')").all()
-    elements = page.locator(".secondary-text.js-location-secondary-text").all()
-    href_list = []
-    for element in elements:
-        # print(element.all_inner_texts())
-        if element.all_inner_texts()[0] != 'United States':
-            href_list.append(None)
-        else:
-            # 向上2層
-            parent = element.locator("xpath=../..")
-            # print(parent.all_inner_texts())
-            # 在同一層找 .primary-text.js-location-primary-text 並click第一個match項目
-            primary_text_element = parent.locator(".primary-text.js-location-primary-text").first
-            # print(primary_text_element.all_inner_texts())
-            ## 拿取 html a element
-            link_element = primary_text_element.locator("a").first
-            href = link_element.get_attribute("href")
-            href_list.append(href)
+    # 一次 eval_on_selector_all 取出所有列，不再逐個元素往返 driver
+    with metrics.stage("extract"):
+        href_list = extract_us_location_hrefs(page)
     
     # print(href_list)
     # ---------------------
@@ -73,43 +82,100 @@ def run(playwright: Playwright, initial_url: str) -> List[str|None]:
     browser.close()
     return href_list
 
-# 驗證太煩了, 每次都重開一個新個browser
-def run2(playwright: Playwright, href_list: List) -> List[str|None]:
+# 驗證太煩了, 每次都用一個新的 context (cookies/storage 全新), browser 則由 BrowserPool 重複使用
+def run2(playwright: Playwright, href_list: List, pool: BrowserPool | None = None,
+         blocking: BlockingProfile | None = None, cache: LocationCache | None = None,
+         limiter: AdaptiveRateLimiter | None = None, fetcher: LocationFetcher | None = None,
+         storage: StorageStateManager | None = None, wait: WaitStrategy | None = None) -> List[str|None]:
+    own_pool = pool is None
+    if own_pool:
+        pool = BrowserPool(playwright, storage_state=storage)
+
     location = []
-    for href in href_list:
-        if href is None:
-            location.append(None)
-        else:
-            browser = playwright.chromium.launch(headless=False)
-            context = browser.new_context()
-            page = context.new_page()
-
-            full_url = "https://www.kickstarter.com" + href
-
-            page.goto(full_url)
-            # 因為重開browser所以不用等了
-            # time.sleep(random.uniform(1, 5)) # 等1~5秒
-
-            location_span = page.locator("#location_filter .js-title").first
-            location_text = location_span.inner_text()
+    try:
+        for href in href_list:
+            if href is None:
+                location.append(None)
+                continue
+
+            # 同一個地點在很多專案都會出現，先查快取，命中就不用開頁面
+            cached = cache.get(href) if cache is not None else None
+            if cached is not None:
+                location.append(cached)
+                continue
+
+            # 先用 HTTP 直接抓 HTML，解析失敗或遇到驗證才開瀏覽器
+            location_text = fetcher.fetch(href) if fetcher is not None else None
+            if location_text is None:
+                with pool.new_context() as context:
+                    if blocking is not None:
+                        blocking.apply(context, href)
+                    page = context.new_page()
+
+                    full_url = "https://www.kickstarter.com" + href
+
+                    guarded_goto(page, full_url, limiter, "#location_filter .js-title", wait=wait)
+                    # 因為每次都是新的context所以不用等了
+                    # time.sleep(random.uniform(1, 5)) # 等1~5秒
+
+                    with metrics.stage("extract"):
+                        location_span = page.locator("#location_filter .js-title").first
+                        location_text = location_span.inner_text()
+                    # print(f"当前选择的地点是: {location_text}")
+                if fetcher is not None:
+                    fetcher.record(href, "browser")
+
             location.append(location_text)
-            # print(f"当前选择的地点是: {location_text}")
-            context.close()
-            browser.close()
-    
+            if cache is not None:
+                cache.put(href, location_text)
+    finally:
+        if own_pool:
+            pool.close()
+
     return location
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Kickstarter Location Scraper")
     parser.add_argument("url", help="The initial URL to start with")
+    parser.add_argument("--block-assets", action="store_true", help="擋掉圖片、字型、影音與第三方請求")
+    parser.add_argument("--cache-db", default=None, help="href -> 城市快取的 SQLite 檔案，不指定則不使用快取")
+    parser.add_argument("--http-fetch", action="store_true", help="地點頁面先用 HTTP 請求解析，失敗才開瀏覽器")
+    parser.add_argument("--concurrency", type=int, default=1, help="大於 1 時同時解析地點頁面")
+    parser.add_argument("--storage-state", default=None,
+                        help="storage state JSON 檔案，context 從通過驗證後的 cookies 開始，不指定則每次都是全新的 context")
+    parser.add_argument("--wait", choices=WAIT_MODES, default="load",
+                        help="導覽等到什麼程度才讀取元素，selector 代表目標元素一出現就讀取")
     args = parser.parse_args()
 
-    with sync_playwright() as playwright:
-        href_list = run(playwright, args.url)
-        print(href_list)
-        location_text_list = run2(playwright, href_list)
-        print(location_text_list)
+    blocking = BlockingProfile() if args.block_assets else None
+    cache = LocationCache(args.cache_db) if args.cache_db else None
+    limiter = AdaptiveRateLimiter()
+    storage = StorageStateManager(args.storage_state, limiter=limiter) if args.storage_state else None
+    wait = WaitStrategy(args.wait)
+
+    try:
+        with sync_playwright() as playwright:
+            href_list = run(playwright, args.url, blocking, limiter, storage, wait)
+            print(href_list)
+            if args.concurrency > 1:
+                location_text_list = resolve_locations(href_list, args.concurrency, blocking=blocking, cache=cache,
+                                                       limiter=limiter, wait=wait)
+            else:
+                fetcher = LocationFetcher(playwright, limiter) if args.http_fetch else None
+                try:
+                    location_text_list = run2(playwright, href_list, blocking=blocking, cache=cache, limiter=limiter,
+                                              fetcher=fetcher, storage=storage, wait=wait)
+                finally:
+                    if fetcher is not None:
+                        print(fetcher.served_by)
+                        fetcher.close()
+            print(location_text_list)
+    finally:
+        # 中途發生例外也要關閉快取，和 get_backer_city_state.crawl_csv 一樣印出命中率
+        if cache is not None:
+            cache.report()
+            cache.close()
     
 
 
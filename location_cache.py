@@ -0,0 +1,91 @@
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+
+
+def location_cache_path(db_path: str) -> str:
+    """
+    快取檔案放在輸出 .db 的同一個資料夾，分片的 .db 會共用同一份快取。
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), "location_cache.db")
+
+
+class LocationCache:
+    """
+    以 href 為 key 的地點快取 (href -> #location_filter .js-title 的文字)。
+    前面有一層有上限的記憶體 LRU，後面是 SQLite 持久化，重新執行或其他 process 也能共用。
+
+    Args:
+        db_path (str): 快取 SQLite 檔案路徑。
+        ttl_seconds (float): 快取有效秒數，None 代表永不過期。
+        max_memory_entries (int): 記憶體 LRU 最多保留幾筆。
+    """
+    def __init__(self, db_path: str, ttl_seconds: float | None = None, max_memory_entries: int = 1000):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_entries = max_memory_entries
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+        self._memory: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        # 多個分片 process 可能同時寫入，所以等久一點再放棄；
+        # pipeline 模式下由解析 stage 的 thread 使用 (同一時間只有一個 thread 使用)
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS location_cache (
+                href TEXT PRIMARY KEY,
+                city TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            );
+        ''')
+        self._conn.commit()
+
+    def _is_fresh(self, fetched_at: float) -> bool:
+        return self.ttl_seconds is None or time.time() - fetched_at < self.ttl_seconds
+
+    def _remember(self, href: str, city: str, fetched_at: float):
+        self._memory[href] = (city, fetched_at)
+        self._memory.move_to_end(href)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, href: str) -> str | None:
+        entry = self._memory.get(href)
+        if entry is not None and self._is_fresh(entry[1]):
+            self._memory.move_to_end(href)
+            self.hits += 1
+            self.memory_hits += 1
+            return entry[0]
+
+        row = self._conn.execute("SELECT city, fetched_at FROM location_cache WHERE href = ?", (href,)).fetchone()
+        if row is not None and self._is_fresh(row[1]):
+            self._remember(href, row[0], row[1])
+            self.hits += 1
+            return row[0]
+
+        self.misses += 1
+        return None
+
+    def put(self, href: str, city: str | None):
+        # 沒拿到地點就不快取，下次再重新抓
+        if not city:
+            return
+        fetched_at = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO location_cache (href, city, fetched_at) VALUES (?, ?, ?)",
+            (href, city, fetched_at)
+        )
+        self._conn.commit()
+        self._remember(href, city, fetched_at)
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def report(self):
+        print(f"[location_cache] 命中 {self.hits} 次 (記憶體 {self.memory_hits} 次)，未命中 {self.misses} 次，"
+              f"命中率 {self.hit_rate():.1%}")
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,39 @@
+from typing import Dict, List
+from playwright.sync_api import Page
+
+LOCATION_SECONDARY_SELECTOR = ".secondary-text.js-location-secondary-text"
+
+# 和 run 原本的 locator 邏輯相同：
+# secondary text -> 向上2層 -> 第一個 .primary-text.js-location-primary-text -> 第一個 a 的 href
+_EXTRACT_JS = """
+elements => elements.map(element => {
+    const parent = element.parentElement && element.parentElement.parentElement;
+    const primary = parent ? parent.querySelector(".primary-text.js-location-primary-text") : null;
+    const link = primary ? primary.querySelector("a") : null;
+    return {
+        secondary_text: element.innerText,
+        href: link ? link.getAttribute("href") : null,
+    };
+})
+"""
+
+
+def extract_location_rows(page: Page) -> List[Dict[str, str|None]]:
+    """
+    用一次 eval_on_selector_all 取出 community 頁面上每一列地點的 (secondary text, primary href)，
+    取代逐個元素呼叫 all_inner_texts / locator / get_attribute 的多次往返。
+
+    Returns:
+        list: 每一列為 {"secondary_text": str, "href": str | None}，順序和頁面相同。
+    """
+    return page.eval_on_selector_all(LOCATION_SECONDARY_SELECTOR, _EXTRACT_JS)
+
+
+def extract_us_location_hrefs(page: Page) -> List[str|None]:
+    """
+    回傳和 run 相同格式的 href_list：secondary text 為 United States 的列回傳 href，其他列回傳 None。
+    """
+    return [
+        row["href"] if row["secondary_text"] == 'United States' else None
+        for row in extract_location_rows(page)
+    ]
@@ -1,64 +1,324 @@
+import argparse
+import functools
+import json
+import os
 import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
 from playwright.sync_api import sync_playwright, Page, expect
+from metrics import percentile
+from request_blocking import BlockingProfile
+from wait_strategy import WAIT_MODES, WaitStrategy
 
-def run_playwright_test(page: Page):
+BROWSERS = ("chromium", "firefox", "webkit")
+# 每一輪收集的指標；CDP 指標只有 chromium 有
+METRICS = ("ttfb_ms", "dcl_ms", "load_ms", "docs_ms", "flow_ms", "js_heap_mb", "layout_count", "recalc_style_count",
+           "script_ms")
+
+# 離線執行時使用的最小鏡像：首頁標題含 "Playwright"，導覽列有 "Docs" 連結，Docs 頁有 Installation 標題
+_MIRROR_PAGES = {
+    "index.html": """<!DOCTYPE html>
+<html><head><title>Fast and reliable end-to-end testing for modern web apps | Playwright</title>
+<link rel="stylesheet" href="/style.css"></head>
+<body><nav><a href="/">Playwright</a> <a href="/docs/intro/">Docs</a> <a href="/community/">Community</a></nav>
+<main><h1>Playwright enables reliable end-to-end testing for modern web apps.</h1>
+<p>Any browser &bull; Any platform &bull; One API</p></main></body></html>""",
+    "docs/intro/index.html": """<!DOCTYPE html>
+<html><head><title>Installation | Playwright</title><link rel="stylesheet" href="/style.css"></head>
+<body><nav><a href="/">Playwright</a> <a href="/docs/intro/">Docs</a></nav>
+<main><h1>Installation</h1><p>Playwright Test was created specifically to accommodate the needs of end-to-end testing.</p>
+</main></body></html>""",
+    "style.css": "body { font-family: sans-serif; margin: 2em; } nav a { margin-right: 1em; }",
+}
+
+_NAVIGATION_TIMING_JS = """() => {
+    const n = performance.getEntriesByType('navigation')[0];
+    return n ? {ttfb: n.responseStart, dcl: n.domContentLoadedEventEnd, load: n.loadEventEnd} : null;
+}"""
+
+
+def run_playwright_test(page: Page, base_url: str = "https://playwright.dev/", screenshot_path: str | None = None,
+                        wait: WaitStrategy | None = None, timeout: float = 10000, verbose: bool = True) -> Dict:
     """
-    執行 Playwright 測試步驟。
+    執行 Playwright 測試步驟：開啟首頁 -> 檢查標題 -> 點擊 Docs -> 等待 Installation 標題。
+    回傳各步驟耗時 (毫秒) 與首頁的 Navigation Timing，效能測試 (run_perf_harness) 每一輪都執行這個流程。
+
+    Args:
+        page (Page): 要執行的頁面。
+        base_url (str): 首頁網址，離線時指向 StaticMirror。
+        screenshot_path (str): 完成後截圖的路徑，None 代表不截圖。
+        wait (WaitStrategy): page.goto 的 wait_until，None 代表等 load。
+        timeout (float): 等待 Installation 標題的逾時 (毫秒)。
+        verbose (bool): 是否印出每個步驟。
     """
-    print("開始 Playwright 測試...")
+    log = print if verbose else (lambda *args: None)
+    wait = wait or WaitStrategy("load")
+    log("開始 Playwright 測試...")
+    started = time.perf_counter()
 
-    # 1. 打開 Playwright 官方網站
-    print("正在導覽至 https://playwright.dev/ ...")
-    page.goto("https://playwright.dev/")
+    # 1. 打開 Playwright 官方網站 (或本機鏡像)
+    log(f"正在導覽至 {base_url} ...")
+    page.goto(base_url, wait_until=wait.wait_until, timeout=wait.goto_timeout)
 
     # 2. 檢查頁面標題是否包含 "Playwright"
-    print("正在檢查頁面標題...")
+    log("正在檢查頁面標題...")
     expect(page).to_have_title(re.compile("Playwright"))
-    print(f"頁面標題 '{page.title()}' 符合預期。")
+    log(f"頁面標題 '{page.title()}' 符合預期。")
+    navigation = page.evaluate(_NAVIGATION_TIMING_JS)
 
     # 3. 點擊導覽列中的 "Docs" 連結
-    print("正在點擊 'Docs' 連結...")
-    # 使用 get_by_role 來定位連結
-    docs_link = page.get_by_role("link", name="Docs")
-    docs_link.click()
-    print("'Docs' 連結已點擊。")
+    log("正在點擊 'Docs' 連結...")
+    clicked = time.perf_counter()
+    page.get_by_role("link", name="Docs").click()
+    log("'Docs' 連結已點擊。")
 
     # 4. 等待 "Installation" 文字出現在頁面上
-    print("正在等待 'Installation' 文字出現...")
-    # locator 方法可以用來定位元素，並使用 expect 等待其可見
-    installation_text = page.locator("h1:has-text('Installation')") # 更精確的定位到 h1 標籤中的 Installation
-    expect(installation_text).to_be_visible(timeout=10000) # 設定等待超時時間為 10 秒
-    print("'Installation' 文字已找到。")
+    log("正在等待 'Installation' 文字出現...")
+    expect(page.locator("h1:has-text('Installation')")).to_be_visible(timeout=timeout)
+    log("'Installation' 文字已找到。")
+    finished = time.perf_counter()
 
     # 5. 截取目前頁面的螢幕截圖並儲存
-    screenshot_path = "playwright_direct_run_example.png"
-    print(f"正在截取螢幕截圖並儲存至 {screenshot_path} ...")
-    page.screenshot(path=screenshot_path)
-    print(f"螢幕截圖已儲存至 {screenshot_path}")
+    if screenshot_path:
+        log(f"正在截取螢幕截圖並儲存至 {screenshot_path} ...")
+        page.screenshot(path=screenshot_path)
+        log(f"螢幕截圖已儲存至 {screenshot_path}")
+
+    log("Playwright 測試完成！")
+    return {"docs_ms": (finished - clicked) * 1000, "flow_ms": (finished - started) * 1000, "navigation": navigation}
+
+
+class StaticMirror:
+    """
+    在本機提供一個靜態網站鏡像，讓效能測試不用連網、每次的網路條件相同。
+    directory 為 None 時使用內建的最小鏡像 (_MIRROR_PAGES)；也可以指向用 wget --mirror 存下來的資料夾。
+
+    Args:
+        directory (str): 鏡像資料夾，None 代表使用內建頁面。
+        host (str): 綁定的位址。
+        port (int): 綁定的 port，0 代表自動選擇。
+    """
+    def __init__(self, directory: str | None = None, host: str = "127.0.0.1", port: int = 0):
+        self._tmp = None
+        if directory is None:
+            self._tmp = tempfile.TemporaryDirectory()
+            directory = self._tmp.name
+            for name, content in _MIRROR_PAGES.items():
+                path = os.path.join(directory, name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(content)
+        handler = functools.partial(_QuietHandler, directory=directory)
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._tmp is not None:
+            self._tmp.cleanup()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def _cdp_metrics(page: Page) -> Dict:
+    # Chrome DevTools Protocol 的 Performance.getMetrics (只有 chromium 支援)
+    cdp = page.context.new_cdp_session(page)
+    try:
+        cdp.send("Performance.enable")
+        values = {m["name"]: m["value"] for m in cdp.send("Performance.getMetrics")["metrics"]}
+    finally:
+        cdp.detach()
+    return {"js_heap_mb": values.get("JSHeapUsedSize", 0) / 1024 / 1024, "layout_count": values.get("LayoutCount"),
+            "recalc_style_count": values.get("RecalcStyleCount"), "script_ms": values.get("ScriptDuration", 0) * 1000}
+
+
+def measure_browser(browser_name: str, base_url: str, iterations: int = 10, warmup: int = 1, headless: bool = True,
+                    block_assets: bool = False, wait_mode: str = "load") -> Dict:
+    """
+    在一個 worker process 中啟動 browser_name，執行 warmup + iterations 輪測試流程 (每輪一個全新的 context，
+    和爬蟲相同)，回傳每個指標的所有樣本。warmup 的結果不計入。
+    """
+    samples: Dict[str, List[float]] = {name: [] for name in METRICS}
+    errors: List[str] = []
+    wait = WaitStrategy(wait_mode)
+    blocking = BlockingProfile(allowed_domains=None, verbose=False) if block_assets else None
+    try:
+        with sync_playwright() as playwright:
+            browser = getattr(playwright, browser_name).launch(headless=headless)
+            try:
+                for i in range(warmup + iterations):
+                    context = browser.new_context()
+                    try:
+                        if blocking is not None:
+                            blocking.apply(context)
+                        page = context.new_page()
+                        result = run_playwright_test(page, base_url, wait=wait, verbose=False)
+                        if browser_name == "chromium":
+                            result.update(_cdp_metrics(page))
+                    except Exception as e:
+                        errors.append(f"{type(e).__name__}: {e}")
+                        continue
+                    finally:
+                        context.close()
+                    if i < warmup:
+                        continue
+                    navigation = result.pop("navigation") or {}
+                    result.update({"ttfb_ms": navigation.get("ttfb"), "dcl_ms": navigation.get("dcl"),
+                                   "load_ms": navigation.get("load")})
+                    for name in METRICS:
+                        if result.get(name) is not None:
+                            samples[name].append(float(result[name]))
+            finally:
+                browser.close()
+    except Exception as e:
+        # browser 沒有安裝或無法啟動
+        errors.append(f"{type(e).__name__}: {e}")
+    return {"browser": browser_name, "samples": samples, "errors": errors}
+
+
+def summarize(samples: Dict[str, List[float]]) -> Dict[str, Dict]:
+    return {name: {"count": len(values), "p50": round(percentile(values, 0.5), 2),
+                   "p95": round(percentile(values, 0.95), 2), "max": round(max(values), 2)}
+            for name, values in samples.items() if values}
+
+
+def parse_budgets(specs: List[str]) -> Dict[str, Dict[str, float]]:
+    """
+    "dcl_ms=800" 套用到所有 browser，"firefox:dcl_ms=900" 只套用到 firefox (優先於前者)。
+    回傳 {browser 或 "*": {指標: 上限}}。
+    """
+    budgets: Dict[str, Dict[str, float]] = {}
+    for spec in specs:
+        target, _, assignment = spec.rpartition(":")
+        name, sep, value = assignment.partition("=")
+        if not sep or name not in METRICS:
+            raise ValueError(f"無法解析 budget '{spec}'，格式為 [browser:]指標=上限，指標為 {METRICS}")
+        budgets.setdefault(target or "*", {})[name] = float(value)
+    return budgets
+
+
+def check_budgets(browser_name: str, summary: Dict[str, Dict], budgets: Dict[str, Dict[str, float]]) -> List[str]:
+    """
+    回傳 p95 超過上限的指標說明，沒有超過時回傳空列表。沒有樣本的指標 (例如 firefox 的 CDP 指標) 不檢查。
+    """
+    limits = {**budgets.get("*", {}), **budgets.get(browser_name, {})}
+    return [f"{browser_name} {name} p95 {summary[name]['p95']} > {limit}"
+            for name, limit in limits.items() if name in summary and summary[name]["p95"] > limit]
+
+
+def run_perf_harness(browsers: List[str], iterations: int = 10, warmup: int = 1, base_url: str | None = None,
+                     mirror_dir: str | None = None, budgets: Dict[str, Dict[str, float]] | None = None,
+                     headless: bool = True, block_assets: bool = False, wait_mode: str = "load") -> Dict:
+    """
+    每個 browser 一個 worker process 同時執行測試流程，彙整每個指標的 p50 / p95 / max 並檢查 budget。
+    base_url 為 None 時啟動 StaticMirror (mirror_dir 或內建頁面)，不需要連網。
+
+    Returns:
+        dict: {"passed": bool, "complete": bool, "browsers": {名稱: {"summary", "errors", "violations"}}, "options": ...}
+    """
+    budgets = budgets or {}
+    mirror = StaticMirror(mirror_dir).start() if base_url is None else None
+    url = base_url or mirror.base_url
+    try:
+        with ProcessPoolExecutor(max_workers=len(browsers)) as executor:
+            futures = [executor.submit(measure_browser, name, url, iterations, warmup, headless, block_assets,
+                                       wait_mode) for name in browsers]
+            results = [future.result() for future in futures]
+    finally:
+        if mirror is not None:
+            mirror.close()
+
+    report = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "passed": True, "complete": True, "browsers": {},
+              "options": {"url": base_url or "mirror", "iterations": iterations, "warmup": warmup,
+                          "headless": headless, "block_assets": block_assets, "wait": wait_mode, "budgets": budgets}}
+    for result in results:
+        summary = summarize(result["samples"])
+        violations = check_budgets(result["browser"], summary, budgets)
+        # 完全沒有成功的輪次 (例如 browser 沒有安裝) 代表無法量測，和超過 budget 分開回報
+        if not summary:
+            report["complete"] = False
+        if violations or not summary:
+            report["passed"] = False
+        report["browsers"][result["browser"]] = {"summary": summary, "errors": result["errors"],
+                                                 "violations": violations}
+    return report
+
+
+def print_report(report: Dict):
+    for browser_name, result in report["browsers"].items():
+        print(f"[perf] {browser_name}:")
+        for name, stats in result["summary"].items():
+            print(f"[perf]   {name:<20} n={stats['count']:<4} p50 {stats['p50']:>10}  p95 {stats['p95']:>10}  "
+                  f"max {stats['max']:>10}")
+        if result["errors"]:
+            print(f"[perf]   失敗 {len(result['errors'])} 次，第一個錯誤: {result['errors'][0].splitlines()[0]}")
+        for violation in result["violations"]:
+            print(f"[perf]   超過 budget: {violation}")
+    print(f"[perf] {'通過' if report['passed'] else '未通過'}")
 
-    print("Playwright 測試完成！")
 
 # 主執行區塊
 if __name__ == "__main__":
-    with sync_playwright() as p:
-        # 啟動瀏覽器，可以選擇 chromium, firefox, or webkit
-        # headless=False 會顯示瀏覽器操作過程，方便調試
-        # headless=True (預設) 會在背景執行，不顯示 UI
-        print("正在啟動瀏覽器...")
-        browser = p.chromium.launch(headless=False)
-        # browser = p.firefox.launch(headless=False)
-        # browser = p.webkit.launch(headless=False)
-
-        # 建立一個新的瀏覽器分頁
-        page = browser.new_page()
-
-        try:
-            # 執行測試函數
-            run_playwright_test(page)
-        except Exception as e:
-            print(f"測試過程中發生錯誤: {e}")
-        finally:
-            # 確保瀏覽器最後一定會關閉
-            print("正在關閉瀏覽器...")
-            browser.close()
-            print("瀏覽器已關閉。")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="以 run_playwright_test 的流程量測各 browser 的頁面效能並檢查 budget")
+    parser.add_argument("--browsers", nargs="+", choices=BROWSERS, default=list(BROWSERS), help="要測試的 browser")
+    parser.add_argument("--iterations", type=int, default=10, help="每個 browser 量測幾輪")
+    parser.add_argument("--warmup", type=int, default=1, help="不計入結果的暖身輪數")
+    parser.add_argument("--url", default=None, help="測試的首頁網址，不指定則使用本機鏡像 (離線)")
+    parser.add_argument("--mirror", default=None, help="鏡像資料夾 (例如 wget --mirror 的結果)，不指定則使用內建頁面")
+    parser.add_argument("--budget", action="append", default=[],
+                        help="p95 上限，格式為 [browser:]指標=上限，例如 dcl_ms=800 或 firefox:ttfb_ms=200，可重複指定")
+    parser.add_argument("--block-assets", action="store_true", help="套用爬蟲的 BlockingProfile (擋圖片、字型、影音)")
+    parser.add_argument("--wait", choices=WAIT_MODES, default="load", help="page.goto 的等待策略")
+    parser.add_argument("--headed", action="store_true", help="顯示瀏覽器畫面")
+    parser.add_argument("--output", default="perf_results.jsonl", help="結果附加寫入的 JSONL 檔案")
+    parser.add_argument("--smoke", action="store_true", help="只以 chromium 執行一次原本的測試流程並截圖")
+    args = parser.parse_args()
+
+    if args.smoke:
+        with sync_playwright() as p:
+            print("正在啟動瀏覽器...")
+            browser = p.chromium.launch(headless=not args.headed)
+            page = browser.new_page()
+            try:
+                run_playwright_test(page, args.url or "https://playwright.dev/",
+                                    screenshot_path="playwright_direct_run_example.png")
+            except Exception as e:
+                print(f"測試過程中發生錯誤: {e}")
+            finally:
+                # 確保瀏覽器最後一定會關閉
+                print("正在關閉瀏覽器...")
+                browser.close()
+                print("瀏覽器已關閉。")
+        raise SystemExit(0)
+
+    report = run_perf_harness(args.browsers, args.iterations, args.warmup, args.url, args.mirror,
+                              parse_budgets(args.budget), not args.headed, args.block_assets, args.wait)
+    print_report(report)
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write(json.dumps(report, ensure_ascii=False) + "\n")
+    # 0 = 通過，1 = 超過 budget，2 = 有 browser 無法量測
+    raise SystemExit(0 if report["passed"] else 1 if report["complete"] else 2)
@@ -0,0 +1,170 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict
+
+
+def percentile(samples, q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+class ScraperMetrics:
+    """
+    記錄爬蟲各階段 (browser_launch / goto / wait_selector / extract / throttle_sleep / db_write ...) 的
+    耗時、次數與錯誤類型，並輸出成 JSONL (每個事件一行) 以及 Prometheus 文字格式 (目前的摘要)。
+    沒有呼叫 configure() 之前只在記憶體中統計，不寫檔。
+
+    Args:
+        max_samples (int): 每個階段保留最近幾筆耗時來計算 p50 / p95。
+        export_interval (float): 每隔幾秒自動輸出一次 Prometheus 檔案。
+    """
+    def __init__(self, max_samples: int = 10000, export_interval: float = 30):
+        self.max_samples = max_samples
+        self.export_interval = export_interval
+        self.jsonl_path = None
+        self.prom_path = None
+        self._jsonl = None
+        self._durations: Dict[str, Deque[float]] = {}
+        self._counts: Dict[str, int] = {}
+        self._totals: Dict[str, float] = {}
+        self._errors: Dict[str, int] = {}
+        self._started = time.time()
+        self._last_export = time.monotonic()
+        self._lock = threading.Lock()
+
+    def configure(self, jsonl_path: str | None = None, prom_path: str | None = None):
+        with self._lock:
+            if self._jsonl is not None:
+                self._jsonl.close()
+            self.jsonl_path = jsonl_path
+            self.prom_path = prom_path
+            self._jsonl = open(jsonl_path, "a", encoding="utf-8") if jsonl_path else None
+            self._started = time.time()
+
+    def record(self, stage: str, duration: float, error: str | None = None, **labels):
+        with self._lock:
+            self._durations.setdefault(stage, deque(maxlen=self.max_samples)).append(duration)
+            self._counts[stage] = self._counts.get(stage, 0) + 1
+            self._totals[stage] = self._totals.get(stage, 0.0) + duration
+            if error is not None:
+                key = f"{stage}:{error}"
+                self._errors[key] = self._errors.get(key, 0) + 1
+            if self._jsonl is not None:
+                event = {"ts": time.time(), "stage": stage, "duration": round(duration, 6), "error": error, **labels}
+                self._jsonl.write(json.dumps(event, ensure_ascii=False) + "\n")
+            due = self.prom_path is not None and time.monotonic() - self._last_export >= self.export_interval
+        if due:
+            self.export()
+
+    @contextmanager
+    def stage(self, name: str, **labels):
+        """
+        with metrics.stage("goto"): ... 記錄區塊耗時；區塊拋出例外時依例外類型記錄錯誤後再拋出。
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            self.record(name, time.perf_counter() - started, type(e).__name__, **labels)
+            raise
+        self.record(name, time.perf_counter() - started, **labels)
+
+    def reset(self):
+        """
+        清空目前的統計 (benchmark 在同一個 process 中跑多個情境時使用)，不影響輸出檔案設定。
+        """
+        with self._lock:
+            self._durations.clear()
+            self._counts.clear()
+            self._totals.clear()
+            self._errors.clear()
+            self._started = time.time()
+
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + n
+
+    def summary(self) -> Dict:
+        with self._lock:
+            elapsed_min = max(time.time() - self._started, 1e-9) / 60
+            stages = {
+                name: {
+                    "count": self._counts.get(name, 0),
+                    "total": round(self._totals.get(name, 0.0), 3),
+                    "p50": round(percentile(samples, 0.5), 3),
+                    "p95": round(percentile(samples, 0.95), 3),
+                }
+                for name, samples in self._durations.items()
+            }
+            return {
+                "elapsed_min": round(elapsed_min, 2),
+                "pages_per_min": round(self._counts.get("pages", 0) / elapsed_min, 2),
+                "projects_per_min": round(self._counts.get("projects", 0) / elapsed_min, 2),
+                "counters": {k: v for k, v in self._counts.items() if k not in self._durations},
+                "stages": stages,
+                "errors": dict(self._errors),
+            }
+
+    def export(self):
+        """
+        寫出 Prometheus 文字格式檔案 (先寫暫存檔再取代，讀取端不會讀到一半的內容)。
+        """
+        summary = self.summary()
+        with self._lock:
+            self._last_export = time.monotonic()
+            if self._jsonl is not None:
+                self._jsonl.flush()
+            prom_path = self.prom_path
+        if prom_path is None:
+            return
+
+        lines = [
+            "# TYPE scraper_pages_per_minute gauge",
+            f"scraper_pages_per_minute {summary['pages_per_min']}",
+            "# TYPE scraper_projects_per_minute gauge",
+            f"scraper_projects_per_minute {summary['projects_per_min']}",
+            "# TYPE scraper_stage_duration_seconds summary",
+        ]
+        for name, stats in summary["stages"].items():
+            lines.append(f'scraper_stage_duration_seconds{{stage="{name}",quantile="0.5"}} {stats["p50"]}')
+            lines.append(f'scraper_stage_duration_seconds{{stage="{name}",quantile="0.95"}} {stats["p95"]}')
+            lines.append(f'scraper_stage_duration_seconds_sum{{stage="{name}"}} {stats["total"]}')
+            lines.append(f'scraper_stage_duration_seconds_count{{stage="{name}"}} {stats["count"]}')
+        lines.append("# TYPE scraper_events_total counter")
+        for name, value in summary["counters"].items():
+            lines.append(f'scraper_events_total{{event="{name}"}} {value}')
+        lines.append("# TYPE scraper_errors_total counter")
+        for key, value in summary["errors"].items():
+            stage, error = key.split(":", 1)
+            lines.append(f'scraper_errors_total{{stage="{stage}",type="{error}"}} {value}')
+
+        tmp_path = prom_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, prom_path)
+
+    def report(self):
+        summary = self.summary()
+        print(f"[metrics] {summary['pages_per_min']} 頁/分，{summary['projects_per_min']} 專案/分")
+        for name, stats in sorted(summary["stages"].items(), key=lambda item: -item[1]["total"]):
+            print(f"[metrics]   {name:<16} 次數 {stats['count']:>6}  合計 {stats['total']:>9.1f}s  "
+                  f"p50 {stats['p50']:.3f}s  p95 {stats['p95']:.3f}s")
+        if summary["errors"]:
+            print(f"[metrics] 錯誤: {summary['errors']}")
+
+    def close(self):
+        self.export()
+        with self._lock:
+            if self._jsonl is not None:
+                self._jsonl.close()
+                self._jsonl = None
+
+
+# 整個 process 共用一個，各模組用 metrics.stage(...) / metrics.count(...) 記錄
+metrics = ScraperMetrics()
@@ -0,0 +1,135 @@
+import sqlite3
+from typing import Dict, List, Tuple
+
+# 正規化輸出：專案欄位只存一次 (PROJECT_TABLE)，地點字串只存一次 (locations)，
+# 前 10 名 backer 的地點存成 (專案, 名次, 地點 id) 的長表格，另外建立和原本寬表格相同欄位的 view。
+PROJECT_TABLE = "backer_project"
+LOCATION_TABLE = "locations"
+FACT_TABLE = "project_backer_location"
+TOP_BACKERS = 10
+
+
+def parse_city_state(title: str | None) -> Tuple[str | None, str | None]:
+    """
+    "Austin, TX" -> ("Austin", "TX")；沒有逗號時整段當作城市，state 為 None。
+    """
+    if title is None:
+        return None, None
+    city, sep, state = title.rpartition(",")
+    if not sep:
+        return title.strip() or None, None
+    return city.strip() or None, state.strip() or None
+
+
+def _view_exists(conn: sqlite3.Connection, name: str) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'view' AND name = ?", (name,)).fetchone() is not None
+
+
+def ensure_normalized_schema(conn: sqlite3.Connection, view_name: str = "backer_location",
+                             key_column: str = "index"):
+    """
+    建立 locations / project_backer_location 表格與索引，以及名為 view_name 的相容 view。
+    view 的欄位和原本的寬表格相同 (專案欄位 + backer_detail_city1..10)，
+    所以 WorkQueue.seed、combine_db 等讀取 backer_location 的程式不用修改。
+
+    Raises:
+        ValueError: view_name 已經是一般表格 (這個資料庫是用寬表格格式寫入的)。
+    """
+    existing = conn.execute("SELECT type FROM sqlite_master WHERE name = ?", (view_name,)).fetchone()
+    if existing is not None and existing[0] != "view":
+        raise ValueError(f"'{view_name}' 已經是寬表格格式的表格，不能再以正規化格式寫入同一個資料庫。")
+
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {LOCATION_TABLE} (
+            location_id INTEGER PRIMARY KEY,
+            href TEXT UNIQUE,
+            title TEXT NOT NULL,
+            city TEXT,
+            state TEXT
+        );
+    ''')
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {FACT_TABLE} (
+            project_index INTEGER NOT NULL,
+            rank INTEGER NOT NULL,
+            location_id INTEGER NOT NULL REFERENCES {LOCATION_TABLE} (location_id),
+            PRIMARY KEY (project_index, rank)
+        ) WITHOUT ROWID;
+    ''')
+    # 「有 backer 在某城市的專案」：locations(city, state) -> project_backer_location(location_id)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{LOCATION_TABLE}_city_state ON {LOCATION_TABLE} (city, state);")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{LOCATION_TABLE}_title ON {LOCATION_TABLE} (title);")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{FACT_TABLE}_location ON {FACT_TABLE} (location_id, project_index);")
+
+    if not _view_exists(conn, view_name):
+        cities = ",\n".join(
+            f"            MAX(CASE WHEN f.rank = {rank} THEN l.title END) AS backer_detail_city{rank}"
+            for rank in range(1, TOP_BACKERS + 1)
+        )
+        # p.* 在查詢時才展開，之後 ALTER TABLE 新增的專案欄位也會出現在 view 中
+        conn.execute(f'''
+            CREATE VIEW {view_name} AS
+            SELECT p.*,
+{cities}
+            FROM {PROJECT_TABLE} p
+            LEFT JOIN {FACT_TABLE} f ON f.project_index = p."{key_column}"
+            LEFT JOIN {LOCATION_TABLE} l ON l.location_id = f.location_id
+            GROUP BY p."{key_column}";
+        ''')
+        print(f"已建立正規化表格與相容 view '{view_name}'。")
+
+
+class LocationIds:
+    """
+    href -> location_id 的記憶體對照，同一個地點只在第一次出現時寫入 / 查詢 locations。
+    """
+    def __init__(self):
+        self._ids: Dict[Tuple[str | None, str], int] = {}
+
+    def get(self, conn: sqlite3.Connection, href: str | None, title: str) -> int:
+        key = (href, title) if href is None else (href, "")
+        location_id = self._ids.get(key)
+        if location_id is not None:
+            return location_id
+
+        city, state = parse_city_state(title)
+        if href is not None:
+            conn.execute(
+                f"INSERT INTO {LOCATION_TABLE} (href, title, city, state) VALUES (?, ?, ?, ?) "
+                f"ON CONFLICT(href) DO UPDATE SET title = excluded.title, city = excluded.city, state = excluded.state",
+                (href, title, city, state)
+            )
+            location_id = conn.execute(f"SELECT location_id FROM {LOCATION_TABLE} WHERE href = ?", (href,)).fetchone()[0]
+        else:
+            # 沒有 href (例如從舊的寬表格轉入) 時以地點文字對應
+            row = conn.execute(f"SELECT location_id FROM {LOCATION_TABLE} WHERE href IS NULL AND title = ?",
+                               (title,)).fetchone()
+            if row is None:
+                location_id = conn.execute(f"INSERT INTO {LOCATION_TABLE} (href, title, city, state) VALUES (NULL, ?, ?, ?)",
+                                           (title, city, state)).lastrowid
+            else:
+                location_id = row[0]
+        self._ids[key] = location_id
+        return location_id
+
+
+def write_backer_locations(conn: sqlite3.Connection, rows: List[Dict], location_ids: LocationIds,
+                           key_column: str = "index"):
+    """
+    把每筆的 backer_detail_city{n} / backer_detail_href{n} 寫入 project_backer_location，
+    同一個專案重寫時先刪掉舊的名次。需在呼叫端的 transaction 中執行。
+    """
+    for row in rows:
+        project_index = row[key_column]
+        conn.execute(f"DELETE FROM {FACT_TABLE} WHERE project_index = ?", (project_index,))
+        facts = []
+        for rank in range(1, TOP_BACKERS + 1):
+            title = row.get(f"backer_detail_city{rank}")
+            if title is None:
+                continue
+            facts.append((project_index, rank, location_ids.get(conn, row.get(f"backer_detail_href{rank}"), title)))
+        conn.executemany(f"INSERT INTO {FACT_TABLE} (project_index, rank, location_id) VALUES (?, ?, ?)", facts)
+
+
+def is_location_column(column: str) -> bool:
+    return column.startswith("backer_detail_city") or column.startswith("backer_detail_href")
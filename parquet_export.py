@@ -0,0 +1,208 @@
+import argparse
+import os
+import shutil
+import sqlite3
+import time
+from typing import Dict, List, Tuple
+from urllib.parse import quote
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # 只有匯出 / 讀取 Parquet 時需要
+    pa = None
+    ds = None
+    pq = None
+
+# 這些欄位的值重複度很高 (同一個城市出現在很多專案中)，以 dictionary 型別存放
+DICTIONARY_COLUMNS = tuple(f"backer_detail_city{n}" for n in range(1, 11))
+# 沒有指定 partition_by 時，依 key_column 每 BUCKET_SIZE 筆分成一個 partition (part=0, part=1, ...)
+BUCKET_SIZE = 1_000_000
+BUCKET_COLUMN = "part"
+HIVE_NULL = "__HIVE_DEFAULT_PARTITION__"
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("匯出 / 讀取 Parquet 需要 pyarrow，請先執行 pip install pyarrow")
+
+
+def _column_types(conn: sqlite3.Connection, table_name: str, columns: List[str]) -> Dict[str, object]:
+    """
+    SQLite 的欄位型別只是建議，實際存放的值可能混合 integer / real / text，
+    所以掃描一次每個欄位實際出現的型別 (typeof) 來決定 Arrow 型別：
+    只有 integer -> int64，integer / real -> float64，其他 (含 text / blob 混合) -> string。
+    """
+    # 每個欄位一個彙總：0 = 全部 NULL，1 = integer，2 = 有 real，3 = 有 text / blob
+    probed = [c for c in columns if c not in DICTIONARY_COLUMNS]
+    codes = {}
+    if probed:
+        probes = ", ".join(f'MAX(CASE typeof("{c}") WHEN \'null\' THEN 0 WHEN \'integer\' THEN 1 '
+                           f'WHEN \'real\' THEN 2 ELSE 3 END)' for c in probed)
+        codes = dict(zip(probed, conn.execute(f'SELECT {probes} FROM "{table_name}"').fetchone()))
+
+    types = {}
+    for c in columns:
+        if c in DICTIONARY_COLUMNS:
+            types[c] = pa.dictionary(pa.int32(), pa.string())
+        elif codes[c] == 1:
+            types[c] = pa.int64()
+        elif codes[c] == 2:
+            types[c] = pa.float64()
+        else:
+            types[c] = pa.string()
+    return types
+
+
+def _to_arrow(values: Tuple, arrow_type) -> "pa.Array":
+    if pa.types.is_string(arrow_type) or pa.types.is_dictionary(arrow_type):
+        try:
+            array = pa.array(values, type=pa.string())
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # 混合型別的欄位 (文字和數字) 統一轉成字串
+            array = pa.array([v if v is None or isinstance(v, str) else str(v) for v in values], type=pa.string())
+        return array.dictionary_encode() if pa.types.is_dictionary(arrow_type) else array
+    return pa.array(values, type=arrow_type)
+
+
+def _partition_dir(column: str, value) -> str:
+    # hive 格式 column=value，值以 URI 編碼 (pyarrow 讀取時會解碼)
+    return f"{column}={HIVE_NULL if value is None else quote(str(value), safe='')}"
+
+
+def export_parquet(db_path: str, output_dir: str, table_name: str = "backer_location", key_column: str = "index",
+                   partition_by: str | None = None, bucket_size: int = BUCKET_SIZE, row_group_size: int = 100_000,
+                   compression: str = "zstd") -> Dict:
+    """
+    把 db_path (通常是 combine_db 合併後的 merged_backer_data.db) 的 table_name 串流匯出成分區的 Parquet 資料夾，
+    不用先把整張表格讀進 pandas。
+
+    - 依分區、再依 key_column 排序讀取，每次只取 row_group_size 筆，一次只開一個 Parquet 檔案，記憶體用量固定
+    - 欄位型別依實際存放的值決定 (見 _column_types)，backer_detail_city1..10 使用 dictionary 型別
+    - 每個 row group 都寫入 min / max 統計，依 key_column 或城市過濾時可以跳過整個 row group
+    - partition_by 指定欄位時以 hive 格式 (欄位=值/) 分資料夾，該欄位不存放在檔案中；
+      沒有指定時依 key_column 每 bucket_size 筆分成一個 part=N 資料夾
+    - 先寫到 output_dir.tmp，完成後才取代 output_dir，匯出到一半失敗不會留下不完整的結果
+
+    Args:
+        db_path (str): 來源 .db 檔案路徑。
+        output_dir (str): 輸出的 Parquet 資料夾。
+        table_name (str): 要匯出的表格或 view (正規化格式的 backer_location view 也可以)。
+        key_column (str): 排序與分桶用的主鍵欄位 (增量合併時排除了 index 的話改用 id)。
+        partition_by (str): 分區欄位，None 代表依 key_column 分桶。
+        bucket_size (int): 沒有 partition_by 時每個分區的 key 範圍。
+        row_group_size (int): 每個 row group (也是每次從 SQLite 讀取) 的筆數。
+        compression (str): Parquet 壓縮方式。
+
+    Returns:
+        dict: 筆數、檔案數、輸出大小與耗時。
+    """
+    _require_pyarrow()
+    started = time.perf_counter()
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        columns = [col[1] for col in conn.execute(f'PRAGMA table_info("{table_name}");')]
+        if not columns:
+            raise ValueError(f"'{db_path}' 中沒有 '{table_name}' 表格。")
+        if partition_by is not None and partition_by not in columns:
+            raise ValueError(f"分區欄位 '{partition_by}' 不存在於 '{table_name}' 中。")
+        if key_column not in columns:
+            raise ValueError(f"主鍵欄位 '{key_column}' 不存在於 '{table_name}' 中，請以 key_column 指定。")
+        key = f'"{key_column}"'
+        data_columns = [c for c in columns if c != partition_by]
+        types = _column_types(conn, table_name, data_columns)
+        schema = pa.schema([pa.field(c, types[c]) for c in data_columns])
+
+        if partition_by is not None:
+            partition_column, partition_expr = partition_by, f'"{partition_by}"'
+        else:
+            partition_column, partition_expr = BUCKET_COLUMN, f"CAST({key} / {int(bucket_size)} AS INTEGER)"
+        quoted = ", ".join(f'"{c}"' for c in data_columns)
+        cursor = conn.execute(
+            f'SELECT {partition_expr}, {quoted} FROM "{table_name}" ORDER BY {partition_expr}, {key}'
+        )
+
+        tmp_dir = output_dir.rstrip("/\\") + ".tmp"
+        if os.path.exists(tmp_dir):
+            shutil.rmtree(tmp_dir)
+        os.makedirs(tmp_dir)
+
+        rows_written = 0
+        files = 0
+        writer = None
+        current = object()
+        try:
+            while True:
+                batch = cursor.fetchmany(row_group_size)
+                if not batch:
+                    break
+                # 一批中可能跨越分區，依分區值切開
+                start = 0
+                while start < len(batch):
+                    value = batch[start][0]
+                    end = start
+                    while end < len(batch) and batch[end][0] == value:
+                        end += 1
+                    if value != current:
+                        if writer is not None:
+                            writer.close()
+                        part_dir = os.path.join(tmp_dir, _partition_dir(partition_column, value))
+                        os.makedirs(part_dir, exist_ok=True)
+                        writer = pq.ParquetWriter(os.path.join(part_dir, f"part-{files}.parquet"), schema,
+                                                  compression=compression, write_statistics=True)
+                        current = value
+                        files += 1
+                    values = list(zip(*batch[start:end]))[1:]
+                    table = pa.Table.from_arrays([_to_arrow(v, types[c]) for c, v in zip(data_columns, values)],
+                                                 schema=schema)
+                    writer.write_table(table, row_group_size=row_group_size)
+                    rows_written += end - start
+                    start = end
+        finally:
+            if writer is not None:
+                writer.close()
+    finally:
+        conn.close()
+
+    if os.path.exists(output_dir):
+        shutil.rmtree(output_dir)
+    os.replace(tmp_dir, output_dir)
+
+    elapsed = time.perf_counter() - started
+    size = sum(os.path.getsize(os.path.join(root, f)) for root, _, names in os.walk(output_dir) for f in names)
+    result = {"rows": rows_written, "files": files, "bytes": size, "sqlite_bytes": os.path.getsize(db_path),
+              "elapsed_sec": round(elapsed, 2)}
+    print(f"[parquet_export] 已將 {rows_written} 筆匯出到 '{output_dir}' ({files} 個檔案，"
+          f"{size / 1024 / 1024:.1f} MB，SQLite {result['sqlite_bytes'] / 1024 / 1024:.1f} MB，"
+          f"{rows_written / max(elapsed, 1e-9):,.0f} 筆/秒)")
+    return result
+
+
+def read_backer_locations(path: str, columns: List[str] | None = None, filters: List | None = None,
+                          memory_map: bool = True):
+    """
+    讀取 export_parquet 的輸出成 DataFrame。只讀取 columns 中的欄位，
+    filters (例如 [("backer_detail_city1", "=", "Austin, TX")] 或 [("part", "=", 3)]) 會先用分區與 row group 統計
+    跳過不需要的檔案 / row group；memory_map 時以記憶體映射讀取檔案。
+    """
+    _require_pyarrow()
+    # 分區欄位以一般型別讀取 (dictionary 型別的分區欄位遇到 NULL 分區時無法合併)
+    partitioning = ds.HivePartitioning.discover(infer_dictionary=False)
+    table = pq.read_table(path, columns=columns, filters=filters, memory_map=memory_map, partitioning=partitioning)
+    return table.to_pandas()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="把合併後的 backer_location 匯出成分區的 Parquet")
+    parser.add_argument("db", nargs="?", default="merged_backer_data.db", help="來源 .db 檔案")
+    parser.add_argument("output", nargs="?", default="backer_location_parquet", help="輸出的 Parquet 資料夾")
+    parser.add_argument("--table", default="backer_location", help="要匯出的表格")
+    parser.add_argument("--key", default="index", help="排序與分桶用的主鍵欄位")
+    parser.add_argument("--partition-by", default=None, help="分區欄位 (例如 country)，不指定則依主鍵分桶")
+    parser.add_argument("--bucket-size", type=int, default=BUCKET_SIZE, help="依主鍵分桶時每個分區的範圍")
+    parser.add_argument("--row-group-size", type=int, default=100_000, help="每個 row group 的筆數")
+    args = parser.parse_args()
+
+    export_parquet(args.db, args.output, args.table, args.key, args.partition_by, args.bucket_size,
+                   args.row_group_size)
@@ -0,0 +1,185 @@
+import queue
+import threading
+import time
+from typing import Callable, ContextManager, Dict, Iterator, List
+from playwright.sync_api import Playwright
+from playwright_session import PlaywrightSession
+
+_STOP = object()
+
+
+class ProjectTask:
+    """
+    一個專案在 pipeline 中傳遞的資料。任何一個 stage 失敗時 error 會被設定，後面的 stage 直接略過。
+    """
+    def __init__(self, index: int, project: Dict, url: str):
+        self.index = index
+        self.project = project
+        self.url = url
+        self.href_list: List[str | None] | None = None
+        self.location_text_list: List[str | None] | None = None
+        self.error: Exception | None = None
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+
+# stage factory：收到該 thread 的 Playwright，回傳一個 context manager，進入後得到處理單一 task 的函式
+StageFactory = Callable[[Playwright], ContextManager[Callable[[ProjectTask], None]]]
+
+
+class ProjectPipeline:
+    """
+    把每個專案的 run (community 頁面 -> hrefs) 和 run2 (hrefs -> 城市) 拆成兩個 stage，
+    各自在自己的 thread 中以自己的 PlaywrightSession 執行，中間用有上限的 queue 連接：
+    解析目前專案的地點時，下一個專案的 community 頁面已經在載入。
+    每個 stage 的 driver 只在失效時重新啟動 (連同 stage 本身重新建立)，其他錯誤只讓該專案失敗。
+
+    - submit() 在 queue 滿時會等待 (backpressure)，同時在路上的專案最多約 2 * depth + 2 個
+    - 每個 stage 只有一個 thread 且 queue 是 FIFO，completed() / finish() 取回的順序和 submit() 相同，
+      寫入 (writer stage) 的順序因此不變
+    - close() 會中止還在處理的專案 (未完成的專案由 WorkQueue 的租約機制重新排入)
+
+    Args:
+        discover (StageFactory): discovery stage，設定 task.href_list。
+        resolve (StageFactory): resolution stage，設定 task.location_text_list。
+        depth (int): 每個 stage 前面 queue 的容量。
+    """
+    def __init__(self, discover: StageFactory, resolve: StageFactory, depth: int = 2):
+        self.depth = max(1, depth)
+        self._inbox: queue.Queue = queue.Queue(maxsize=self.depth)
+        self._resolve_queue: queue.Queue = queue.Queue(maxsize=self.depth)
+        self._done: queue.Queue = queue.Queue()
+        self._abort = threading.Event()
+        self._finished = False
+        self._in_flight = 0
+        self._threads = [
+            threading.Thread(target=self._stage_loop, args=("discovery", discover, self._inbox, self._resolve_queue),
+                             name="pipeline-discovery", daemon=True),
+            threading.Thread(target=self._stage_loop, args=("resolution", resolve, self._resolve_queue, self._done),
+                             name="pipeline-resolution", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    # --- 給主程式呼叫的介面 ---
+    def submit(self, task: ProjectTask):
+        """
+        把專案放進 discovery stage，queue 滿時等待。
+        """
+        if self._finished:
+            raise RuntimeError("pipeline 已經結束，不能再加入專案")
+        self._in_flight += 1
+        self._put(self._inbox, task)
+
+    def completed(self) -> List[ProjectTask]:
+        """
+        回傳目前已經完成的專案 (不等待)。
+        """
+        tasks = []
+        while True:
+            try:
+                task = self._done.get_nowait()
+            except queue.Empty:
+                return tasks
+            if task is not _STOP:
+                self._in_flight -= 1
+                tasks.append(task)
+
+    def drain(self) -> Iterator[ProjectTask]:
+        """
+        依序取回所有還在處理中的專案，但不結束 pipeline，之後還可以 submit() (例如重試失敗的專案)。
+        """
+        while self._in_flight > 0:
+            task = self._get(self._done)
+            if task is _STOP:
+                break
+            self._in_flight -= 1
+            yield task
+
+    def finish(self) -> Iterator[ProjectTask]:
+        """
+        不再加入新專案，依序取回所有還在處理中的專案。
+        """
+        if not self._finished:
+            self._finished = True
+            self._put(self._inbox, _STOP)
+        while self._in_flight > 0:
+            task = self._get(self._done)
+            if task is _STOP:
+                break
+            self._in_flight -= 1
+            yield task
+
+    def close(self):
+        self._abort.set()
+        for thread in self._threads:
+            thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # --- stage threads ---
+    def _put(self, q: queue.Queue, item) -> bool:
+        while not self._abort.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue):
+        while not self._abort.is_set():
+            try:
+                return q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        return _STOP
+
+    def _pump(self, inbox: queue.Queue, outbox: queue.Queue, handle, fatal: Exception | None = None,
+              session: PlaywrightSession | None = None) -> bool:
+        # 回傳 True 代表已經收到並轉送 _STOP，False 代表 driver 已重新啟動，stage 需要重新建立
+        while True:
+            task = self._get(inbox)
+            if task is _STOP:
+                self._put(outbox, _STOP)
+                return True
+            if fatal is not None:
+                task.error = task.error or fatal
+            elif task.error is None:
+                try:
+                    handle(task)
+                except Exception as e:
+                    task.error = e
+            task.elapsed = time.perf_counter() - task.started
+            if not self._put(outbox, task):
+                return True
+            if task.error is not None and session is not None and session.recover(task.error):
+                return False
+
+    def _stage_loop(self, name: str, factory: StageFactory, inbox: queue.Queue, outbox: queue.Queue):
+        stopped = False
+        session = PlaywrightSession(name)
+        try:
+            while not stopped:
+                restarted = False
+                try:
+                    with factory(session.playwright) as handle:
+                        stopped = self._pump(inbox, outbox, handle, session=session)
+                        restarted = not stopped
+                except Exception as e:
+                    if not restarted:
+                        raise
+                    # 舊 driver 上的 browser / request context 已經無法正常關閉
+                    print(f"[pipeline] {name} stage 關閉失效的 driver 上的資源時發生錯誤: {e}")
+        except Exception as e:
+            print(f"[pipeline] {name} stage 發生錯誤: {e}")
+            if not stopped:
+                # stage 無法繼續時，後面的專案都標記失敗並往下傳，主程式才能記錄並結束
+                self._pump(inbox, outbox, None, e)
+        finally:
+            session.stop()
+            session.report()
@@ -0,0 +1,122 @@
+import time
+import weakref
+from playwright.sync_api import Playwright, sync_playwright
+from metrics import metrics
+
+# driver (Node process) 結束後，第一個呼叫拋出的例外訊息
+DRIVER_CLOSED_MESSAGE = "Connection closed while reading from the driver"
+
+# 已經拋出過 DRIVER_CLOSED_MESSAGE 的 Playwright
+_lost_drivers: "weakref.WeakSet[Playwright]" = weakref.WeakSet()
+
+
+def _is_driver_closed(error: BaseException | None) -> bool:
+    # 例外可能被包裝過，沿著 __cause__ / __context__ 往回找
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if DRIVER_CLOSED_MESSAGE in str(error):
+            return True
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def connection_lost(playwright: Playwright | None, error: BaseException | None = None) -> bool:
+    """
+    driver 結束後第一個呼叫會拋出 "Connection closed while reading from the driver"，
+    之後的任何呼叫 (包括 browser.close()、context.close()、dispose()) 都會永遠等待。
+    browser.is_connected() 與 "disconnected" 事件只在 driver 回報 browser 關閉時才改變，driver 本身結束時
+    不會觸發，所以捕捉到例外時把它傳進來：是 driver 結束的例外就記下這個 Playwright。
+    回傳這個 Playwright 是否已經失效；失效時只能把例外往上拋，交給 PlaywrightSession.recover 重新啟動。
+    """
+    if playwright is None:
+        return False
+    if _is_driver_closed(error):
+        _lost_drivers.add(playwright)
+    return playwright in _lost_drivers
+
+
+class PlaywrightSession:
+    """
+    整個爬取過程只啟動一次 Playwright driver (Node process)，取代每個專案都進入一次 with sync_playwright()。
+    只有在 driver 本身失效 (被終止、連線中斷) 時才重新啟動；一般的頁面錯誤、逾時、被擋都繼續使用同一個 driver。
+
+    sync_playwright 只能在啟動它的 thread 中使用，所以每個 thread (例如 pipeline 的每個 stage) 各自擁有一個 session。
+
+    Args:
+        name (str): 印出訊息時使用的名稱。
+    """
+    def __init__(self, name: str = "main"):
+        self.name = name
+        self.launches = 0
+        self.teardowns = 0
+        self.restarts = 0
+        self._playwright: Playwright | None = None
+
+    @property
+    def playwright(self) -> Playwright:
+        """
+        目前的 Playwright，還沒啟動 (或已經因為失效而關閉) 時先啟動。
+        """
+        if self._playwright is None:
+            self.start()
+        return self._playwright
+
+    def start(self):
+        if self._playwright is not None:
+            return
+        with metrics.stage("driver_launch"):
+            self._playwright = sync_playwright().start()
+        self.launches += 1
+
+    def stop(self):
+        if self._playwright is None:
+            return
+        playwright, self._playwright = self._playwright, None
+        try:
+            playwright.stop()
+        except Exception as e:
+            # driver 已經結束時關閉也可能失敗，不影響重新啟動
+            print(f"[playwright_session] {self.name} 關閉 driver 時發生錯誤: {e}")
+        self.teardowns += 1
+
+    def is_alive(self) -> bool:
+        """
+        對 driver 做一次不需要 browser 的往返 (建立並丟棄一個 APIRequestContext)，約數十毫秒。
+        """
+        if self._playwright is None or connection_lost(self._playwright):
+            return False
+        try:
+            self._playwright.request.new_context().dispose()
+            return True
+        except Exception as e:
+            connection_lost(self._playwright, e)
+            return False
+
+    def recover(self, error: Exception | None = None) -> bool:
+        """
+        專案失敗後呼叫：driver 還能回應就什麼都不做，否則關閉並重新啟動。回傳是否重新啟動。
+        """
+        if self._playwright is None:
+            return False
+        # 專案失敗的例外就是 driver 結束的例外時，不再做一次往返 (會永遠等待)
+        connection_lost(self._playwright, error)
+        if self.is_alive():
+            return False
+        print(f"[playwright_session] {self.name} driver 已失效，重新啟動: {error}")
+        start = time.perf_counter()
+        self.stop()
+        self.start()
+        self.restarts += 1
+        metrics.record("driver_restart", time.perf_counter() - start, type(error).__name__ if error else None)
+        return True
+
+    def report(self):
+        print(f"[playwright_session] {self.name} 啟動 driver {self.launches} 次，關閉 {self.teardowns} 次，"
+              f"因失效重新啟動 {self.restarts} 次")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
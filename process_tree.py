@@ -0,0 +1,106 @@
+import os
+import signal
+from typing import Dict, List, NamedTuple
+
+try:
+    import psutil
+except ImportError:  # 沒有 psutil 時在 Linux 上改讀 /proc
+    psutil = None
+
+# Playwright 啟動的 Chromium (含 renderer / gpu 等子 process) 的執行檔名稱
+CHROMIUM_NAMES = ("chrome", "chromium", "headless_shell")
+
+# process 已經結束時拋出的例外
+_GONE = (OSError,) if psutil is None else (OSError, psutil.Error)
+
+
+class ProcessInfo(NamedTuple):
+    pid: int
+    name: str
+    rss: int
+
+
+def _proc_snapshot() -> Dict[int, tuple]:
+    # 讀取 /proc 中所有 process 的 (ppid, name, rss)
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    snapshot = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+            # comm 可能包含空白，以第一個 '(' 和最後一個 ')' 切開
+            name = stat[stat.index("(") + 1:stat.rindex(")")]
+            fields = stat.rsplit(")", 1)[1].split()
+            snapshot[int(entry)] = (int(fields[1]), name, int(fields[21]) * page_size)
+        except (OSError, IndexError, ValueError):
+            continue
+    return snapshot
+
+
+def process_tree(root_pid: int) -> List[ProcessInfo] | None:
+    """
+    回傳 root_pid 以及所有子孫 process (Playwright driver、Chromium) 的 (pid, 名稱, RSS bytes)，
+    第一個一定是 root_pid 本身 (supervisor 以它確認 pid 沒有被重複使用)。
+    root_pid 已經結束時回傳空列表；無法量測的平台 (沒有 psutil 也沒有 /proc) 回傳 None。
+    """
+    if psutil is not None:
+        try:
+            root = psutil.Process(root_pid)
+            processes = [root] + root.children(recursive=True)
+        except psutil.Error:
+            return []
+        tree = []
+        for process in processes:
+            try:
+                tree.append(ProcessInfo(process.pid, process.name(), process.memory_info().rss))
+            except psutil.Error:
+                # root 讀不到代表已經結束；子 process 在途中結束的略過
+                if process is root:
+                    return []
+        return tree
+
+    if not os.path.isdir("/proc"):
+        return None
+    snapshot = _proc_snapshot()
+    if root_pid not in snapshot:
+        return []
+    children: Dict[int, List[int]] = {}
+    for pid, (ppid, _, _) in snapshot.items():
+        children.setdefault(ppid, []).append(pid)
+    # 由 root 往下逐層加入，順序和 psutil 的 [root] + children(recursive=True) 一樣
+    pids = [root_pid]
+    seen = {root_pid}
+    for pid in pids:
+        for child in children.get(pid, ()):
+            if child not in seen:
+                seen.add(child)
+                pids.append(child)
+    return [ProcessInfo(pid, snapshot[pid][1], snapshot[pid][2]) for pid in pids]
+
+
+def tree_rss(root_pid: int) -> int | None:
+    """
+    root_pid 以及所有子孫 process 的 RSS 總和 (bytes)，無法量測時回傳 None。
+    """
+    tree = process_tree(root_pid)
+    return None if tree is None else sum(p.rss for p in tree)
+
+
+def chromium_processes(tree: List[ProcessInfo]) -> List[ProcessInfo]:
+    return [p for p in tree if any(name in p.name.lower() for name in CHROMIUM_NAMES)]
+
+
+def kill_processes(pids: List[int]):
+    """
+    強制結束還留著的 process (例如 worker 被終止後沒有被關掉的 Chromium)，已經結束的略過。
+    """
+    for pid in pids:
+        try:
+            if psutil is not None:
+                psutil.Process(pid).kill()
+            else:
+                os.kill(pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+        except _GONE:
+            pass
@@ -0,0 +1,298 @@
+import asyncio
+import contextlib
+import threading
+import time
+from typing import Dict, NamedTuple
+from metrics import metrics
+from wait_strategy import DEFAULT_WAIT, WaitStrategy
+
+# 出現在驗證 / 封鎖頁面標題的標記 (Cloudflare / PerimeterX 等)；只放完整的片語，
+# 單一個字 (例如 "verify") 會把一般頁面 (例如 "Verify your email") 誤判成封鎖
+BLOCK_TITLE_MARKERS = ("just a moment", "attention required", "access denied", "are you a robot",
+                       "verify you are human")
+BLOCK_SELECTORS = ("#px-captcha", "#challenge-form", "iframe[src*='captcha']", "#cf-challenge-running")
+BLOCK_STATUS_CODES = (403, 429)
+# 必要的元素沒出現：頁面結構改變或載入太慢，不是封鎖，不降速
+MISSING_SELECTOR = "missing_selector"
+
+# 標題與驗證元素在一次 page.evaluate 中檢查，不再為每個 selector 各往返 driver 一次
+_DETECT_BLOCK_JS = """
+([markers, selectors]) => {
+    const title = document.title.toLowerCase();
+    return markers.some(marker => title.includes(marker))
+        || selectors.some(selector => document.querySelector(selector) !== null);
+}
+"""
+
+
+class BlockedError(Exception):
+    """
+    偵測到驗證頁面、HTTP 429/403 或必要的元素沒出現。
+    blocked 只有前兩者為 True；元素沒出現 (reason 為 missing_selector) 時不降速，也不讓 storage state 失效。
+    """
+    def __init__(self, reason: str, url: str = ""):
+        super().__init__(f"{reason}: {url}")
+        self.reason = reason
+        self.url = url
+
+    @property
+    def blocked(self) -> bool:
+        return self.reason != MISSING_SELECTOR
+
+
+class AdaptiveRateLimiter:
+    """
+    所有導覽共用的 token bucket，取代固定每 30 筆睡 1 分鐘。
+
+    - 每次導覽前呼叫 acquire()，沒有 token 時等待
+    - report_block() 時速率減半，並依連續被擋的次數指數退避 (backoff_base * 2^n，最多 backoff_max 秒)
+    - 連續成功 ramp_after 次後速率乘以 ramp_factor，最多到 max_rate
+
+    Args:
+        rate (float): 初始速率 (每秒導覽次數)。
+        burst (int): bucket 容量，允許短時間連續導覽的次數。
+        min_rate (float): 速率下限。
+        max_rate (float): 速率上限。
+        ramp_after (int): 連續成功幾次後提高速率。
+        ramp_factor (float): 每次提高的倍數。
+        backoff_base (float): 第一次被擋時暫停的秒數。
+        backoff_max (float): 暫停秒數上限。
+        report_every (int): 每幾次導覽印出一次統計，0 代表不自動印出。
+    """
+    def __init__(self, rate: float = 0.5, burst: int = 5, min_rate: float = 0.05, max_rate: float = 2.0,
+                 ramp_after: int = 20, ramp_factor: float = 1.25, backoff_base: float = 30,
+                 backoff_max: float = 600, report_every: int = 50):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.ramp_after = ramp_after
+        self.ramp_factor = ramp_factor
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.report_every = report_every
+        self.navigations = 0
+        self.successes = 0
+        self.blocks: Dict[str, int] = {}
+        self.total_wait = 0.0
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._streak = 0
+        self._consecutive_blocks = 0
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        # 先扣 token (可以變成負數)，回傳需要等待的秒數，實際等待在鎖外進行
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            wait = max(wait, self._blocked_until - now)
+            self.navigations += 1
+            self.total_wait += wait
+            navigations = self.navigations
+        if self.report_every and navigations % self.report_every == 0:
+            self.report()
+        return wait
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            with metrics.stage("throttle_sleep"):
+                time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self._reserve()
+        if wait > 0:
+            with metrics.stage("throttle_sleep"):
+                await asyncio.sleep(wait)
+
+    def report_success(self):
+        with self._lock:
+            self.successes += 1
+            self._consecutive_blocks = 0
+            self._streak += 1
+            if self._streak >= self.ramp_after and self.rate < self.max_rate:
+                self._streak = 0
+                self.rate = min(self.max_rate, self.rate * self.ramp_factor)
+                print(f"[rate_limiter] 連續成功，速率提高為 {self.rate:.3f} 次/秒")
+
+    def report_block(self, reason: str):
+        with self._lock:
+            self.blocks[reason] = self.blocks.get(reason, 0) + 1
+            self._streak = 0
+            self._consecutive_blocks += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            backoff = min(self.backoff_max, self.backoff_base * 2 ** (self._consecutive_blocks - 1))
+            self._blocked_until = time.monotonic() + backoff
+            # 暫停期間不累積 token，恢復後從空的 bucket 開始
+            self._tokens = 0.0
+            self._updated = self._blocked_until
+        metrics.count(f"blocked_{reason}")
+        print(f"[rate_limiter] 偵測到封鎖 ({reason})，速率降為 {self.rate:.3f} 次/秒，暫停 {backoff:.0f} 秒")
+
+    def report(self):
+        elapsed_min = max(time.monotonic() - self._started, 1e-9) / 60
+        print(f"[rate_limiter] 速率 {self.rate:.3f} 次/秒，導覽 {self.navigations} 次 ({self.navigations / elapsed_min:.1f} 次/分)，"
+              f"成功 {self.successes} 次，封鎖 {self.blocks}，累計等待 {self.total_wait:.0f} 秒")
+
+
+class _PageCall(NamedTuple):
+    # _goto_steps yield 給呼叫端執行的 page 操作；stage 不為 None 時以 metrics.stage 記錄耗時
+    method: str
+    args: tuple
+    kwargs: dict
+    stage: str | None = None
+    strategy: str | None = None
+
+
+def _detect_steps(response, check_page: bool):
+    # 封鎖判斷，回傳原因或 None；需要檢查頁面時 yield 一次 page.evaluate
+    if response is not None and response.status in BLOCK_STATUS_CODES:
+        return f"http_{response.status}"
+    if not check_page:
+        return None
+    if (yield _PageCall("evaluate", (_DETECT_BLOCK_JS, [list(BLOCK_TITLE_MARKERS), list(BLOCK_SELECTORS)]), {})):
+        return "verification"
+    return None
+
+
+def _goto_steps(url: str, selector: str, required: bool, timeout: float, wait: WaitStrategy, all_matches: bool):
+    """
+    guarded_goto 的導覽與判斷流程，sync / async 版本共用 (分別由 _run_steps / _run_steps_async 執行)。
+    每個 page 操作以 _PageCall yield 出去，執行結果送回來、拋出的例外丟回來；最後回傳 (response, 原因)。
+    """
+    response = yield _PageCall("goto", (url,), {"wait_until": wait.wait_until, "timeout": wait.goto_timeout},
+                               "goto", wait.mode)
+    wait_selector = _PageCall("wait_for_selector", (selector,),
+                              {"state": "attached", "timeout": wait.selector_timeout_or(timeout)},
+                              "wait_selector", wait.mode)
+
+    if wait.selector_first:
+        reason = yield from _detect_steps(response, check_page=False)
+        if reason is None:
+            found = True
+            try:
+                yield wait_selector
+            except Exception:
+                found = False
+            if not found or (all_matches and wait.mode == "selector"):
+                yield _PageCall("wait_for_load_state", ("domcontentloaded",), {"timeout": wait.goto_timeout})
+            if not found:
+                reason = (yield from _detect_steps(None, check_page=True)) or (MISSING_SELECTOR if required else None)
+    else:
+        reason = yield from _detect_steps(response, check_page=True)
+        if reason is None:
+            try:
+                yield wait_selector
+            except Exception:
+                if required:
+                    reason = MISSING_SELECTOR
+    return response, reason
+
+
+def _call_stage(call: _PageCall):
+    if call.stage is None:
+        return contextlib.nullcontext()
+    return metrics.stage(call.stage, strategy=call.strategy)
+
+
+def _run_steps(page, steps):
+    result, error = None, None
+    while True:
+        try:
+            call = steps.send(result) if error is None else steps.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        result, error = None, None
+        try:
+            with _call_stage(call):
+                result = getattr(page, call.method)(*call.args, **call.kwargs)
+        except Exception as e:
+            error = e
+
+
+async def _run_steps_async(page, steps):
+    result, error = None, None
+    while True:
+        try:
+            call = steps.send(result) if error is None else steps.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        result, error = None, None
+        try:
+            with _call_stage(call):
+                result = await getattr(page, call.method)(*call.args, **call.kwargs)
+        except Exception as e:
+            error = e
+
+
+def _finish_goto(limiter: AdaptiveRateLimiter | None, url: str, wait: WaitStrategy, started: float,
+                 response, reason: str | None):
+    """
+    記錄 page_ready_<mode>，回報 limiter，被擋或元素沒出現時拋出 BlockedError。
+    元素沒出現不是封鎖：不呼叫 report_block (不降速、不暫停)，也不算成功。
+    """
+    metrics.record(f"page_ready_{wait.mode}", time.perf_counter() - started, reason)
+    if reason == MISSING_SELECTOR:
+        metrics.count(MISSING_SELECTOR)
+    elif reason is not None:
+        if limiter is not None:
+            limiter.report_block(reason)
+    else:
+        if limiter is not None:
+            limiter.report_success()
+        metrics.count("pages")
+        return response
+    raise BlockedError(reason, url)
+
+
+def detect_block(page, response) -> str | None:
+    """
+    回傳封鎖原因 (http_429 / http_403 / verification)，正常頁面回傳 None。
+    page 為 None 時只檢查 HTTP 狀態碼；否則以一次 page.evaluate 檢查標題與驗證元素。
+    """
+    return _run_steps(page, _detect_steps(response, check_page=page is not None))
+
+
+async def detect_block_async(page, response) -> str | None:
+    """
+    detect_block 的 async API 版本。
+    """
+    return await _run_steps_async(page, _detect_steps(response, check_page=page is not None))
+
+
+def guarded_goto(page, url: str, limiter: AdaptiveRateLimiter | None, selector: str,
+                 required: bool = True, timeout: float = 30000, wait: WaitStrategy | None = None,
+                 all_matches: bool = False):
+    """
+    經過 limiter 取得 token 後導覽到 url，檢查是否被擋並等待 selector 出現。
+    被擋時回報給 limiter 並拋出 BlockedError；required 的 selector 沒出現時也拋出 BlockedError
+    (reason 為 missing_selector)，但不算封鎖，不降速。
+    wait 決定 goto 等到什麼程度 (見 WaitStrategy)，all_matches 代表之後要讀取所有符合 selector 的元素。
+    從導覽開始到可以讀取的時間記錄為 page_ready_<mode>。
+    """
+    wait = wait or DEFAULT_WAIT
+    if limiter is not None:
+        limiter.acquire()
+    started = time.perf_counter()
+    response, reason = _run_steps(page, _goto_steps(url, selector, required, timeout, wait, all_matches))
+    return _finish_goto(limiter, url, wait, started, response, reason)
+
+
+async def guarded_goto_async(page, url: str, limiter: AdaptiveRateLimiter | None, selector: str,
+                             required: bool = True, timeout: float = 30000, wait: WaitStrategy | None = None,
+                             all_matches: bool = False):
+    """
+    guarded_goto 的 async API 版本。
+    """
+    wait = wait or DEFAULT_WAIT
+    if limiter is not None:
+        await limiter.acquire_async()
+    started = time.perf_counter()
+    response, reason = await _run_steps_async(page, _goto_steps(url, selector, required, timeout, wait, all_matches))
+    return _finish_goto(limiter, url, wait, started, response, reason)
@@ -0,0 +1,105 @@
+from typing import Dict, Iterable
+from urllib.parse import urlparse
+
+# 被擋下的請求沒有回應可以量大小，所以用各類型的平均大小估計節省的流量
+ESTIMATED_BYTES = {
+    "image": 60_000,
+    "font": 40_000,
+    "media": 500_000,
+    "stylesheet": 30_000,
+    "script": 50_000,
+}
+DEFAULT_ESTIMATED_BYTES = 10_000
+
+
+class BlockingStats:
+    """
+    單一 page / context 被擋下的請求數與估計節省的位元組數。
+    """
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.requests_allowed = 0
+        self.requests_blocked = 0
+        self.bytes_saved = 0
+        self.blocked_by_type: Dict[str, int] = {}
+
+    def record_blocked(self, resource_type: str):
+        self.requests_blocked += 1
+        self.bytes_saved += ESTIMATED_BYTES.get(resource_type, DEFAULT_ESTIMATED_BYTES)
+        self.blocked_by_type[resource_type] = self.blocked_by_type.get(resource_type, 0) + 1
+
+    def report(self):
+        print(f"[blocking] {self.label} 允許 {self.requests_allowed} 個請求，擋下 {self.requests_blocked} 個 "
+              f"(約 {self.bytes_saved / 1024:.0f} KB) {self.blocked_by_type}")
+
+
+class BlockingProfile:
+    """
+    用 page.route / context.route 擋掉只讀 DOM 文字時用不到的請求。
+
+    Args:
+        blocked_resource_types (iterable): 要擋的 resource type (image, font, media ...)。
+        allowed_domains (iterable): 允許的網域 (含子網域)，其他網域的非 document 請求一律擋下；
+                                    None 代表不依網域過濾。
+        verbose (bool): 每個 page / context 關閉時是否印出統計。
+    """
+    def __init__(self,
+                 blocked_resource_types: Iterable[str] = ("image", "font", "media"),
+                 allowed_domains: Iterable[str] | None = ("kickstarter.com", "ksr-static.imgix.net", "cloudfront.net"),
+                 verbose: bool = True):
+        self.blocked_resource_types = set(blocked_resource_types)
+        self.allowed_domains = tuple(allowed_domains) if allowed_domains is not None else None
+        self.verbose = verbose
+
+    def _is_allowed_domain(self, url: str) -> bool:
+        if self.allowed_domains is None:
+            return True
+        host = urlparse(url).hostname or ""
+        return any(host == domain or host.endswith("." + domain) for domain in self.allowed_domains)
+
+    def should_block(self, resource_type: str, url: str) -> bool:
+        if resource_type in self.blocked_resource_types:
+            return True
+        if resource_type == "document":
+            return False
+        return not self._is_allowed_domain(url)
+
+    def apply(self, target, label: str = "") -> BlockingStats:
+        """
+        套用到 sync API 的 Page 或 BrowserContext，回傳會隨請求更新的 BlockingStats。
+        """
+        stats = BlockingStats(label)
+
+        def handler(route):
+            request = route.request
+            if self.should_block(request.resource_type, request.url):
+                stats.record_blocked(request.resource_type)
+                route.abort()
+            else:
+                stats.requests_allowed += 1
+                route.fallback()
+
+        target.route("**/*", handler)
+        if self.verbose:
+            target.on("close", lambda _: stats.report())
+        return stats
+
+    async def apply_async(self, target, label: str = "") -> BlockingStats:
+        """
+        apply 的 async API 版本。
+        """
+        stats = BlockingStats(label)
+
+        async def handler(route):
+            request = route.request
+            if self.should_block(request.resource_type, request.url):
+                stats.record_blocked(request.resource_type)
+                await route.abort()
+            else:
+                stats.requests_allowed += 1
+                await route.fallback()
+
+        await target.route("**/*", handler)
+        if self.verbose:
+            target.on("close", lambda _: stats.report())
+        return stats
@@ -0,0 +1,116 @@
+import argparse
+import os
+import zlib
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List
+from combine_db import merge_sqlite_databases
+from done_index import project_key
+from parquet_export import export_parquet
+from get_backer_city_state import CrawlConfig, crawl_csv
+from request_blocking import BlockingProfile
+
+
+def shard_indices(df: pd.DataFrame, shard_count: int, shard_id: int, mode: str = "range") -> List[int]:
+    """
+    回傳第 shard_id 個分片要處理的 CSV 索引。
+
+    Args:
+        df (DataFrame): 專案 CSV (至少要有 urls_web_project 欄位)。
+        shard_count (int): 分片總數。
+        shard_id (int): 分片編號，從 0 開始。
+        mode (str): "range" 依索引切成連續區段；"hash" 依標準化後的專案網址 (done_index.project_key) 的 crc32 分配，
+                    同一個專案不論出現在哪份 CSV、帶什麼 ?ref= 參數都會落在同一個分片。
+    """
+    total_rows = len(df)
+    if mode == "range":
+        size = -(-total_rows // shard_count)  # 無條件進位
+        return list(range(shard_id * size, min((shard_id + 1) * size, total_rows)))
+    if mode == "hash":
+        # 無法辨識的網址 (不是專案網址、空白) 以原始字串分配
+        keys = [project_key(url) or str(url) for url in df['urls_web_project']]
+        return [i for i, key in enumerate(keys) if zlib.crc32(key.encode("utf-8")) % shard_count == shard_id]
+    raise ValueError(f"未知的分片模式: {mode}")
+
+
+def _crawl_shard(file_link: str, db_path: str, row_indices: List[int], location_concurrency: int,
+                 block_assets: bool) -> str:
+    # 每個 worker process 在 crawl_csv 內各自啟動自己的 Playwright，輸出到自己的 .db
+    print(f"[pid {os.getpid()}] 開始處理 {db_path}，共 {len(row_indices)} 筆。")
+    config = CrawlConfig(location_concurrency=location_concurrency,
+                         blocking=BlockingProfile() if block_assets else None)
+    remaining = crawl_csv(file_link, db_path, row_indices=row_indices, config=config)
+    if remaining:
+        raise RuntimeError(f"還有 {remaining} 個可以重試的失敗索引")
+    return db_path
+
+
+def crawl_sharded(file_link: str, shard_count: int | None = None, mode: str = "range",
+                  db_template: str = "backer_city_{}.db", merged_db: str = "merged_backer_data.db",
+                  location_concurrency: int = 1, block_assets: bool = True,
+                  parquet_dir: str | None = None) -> List[str]:
+    """
+    把 CSV 分成 shard_count 份，用多個 process 同時爬取，每份寫入自己的 .db，
+    全部完成後再用 combine_db.merge_sqlite_databases 合併；有任何分片未完成時不合併 (也不匯出 Parquet)。
+    每個分片各自依照自己的 .db 續爬，中斷後重新執行即可。
+
+    Args:
+        file_link (str): 專案 CSV 檔案路徑。
+        shard_count (int): 分片 (process) 數量，預設為 CPU 核心數。
+        mode (str): "range" 或 "hash"，見 shard_indices。
+        db_template (str): 分片 .db 的檔名格式，{} 會被替換成 1 開始的分片編號。
+        merged_db (str): 合併後的 .db 檔案，None 代表不合併。
+        location_concurrency (int): 傳給 crawl_csv 的 location_concurrency。
+        block_assets (bool): 是否套用 request_blocking.BlockingProfile 擋掉圖片、字型等請求。
+        parquet_dir (str): 合併後再把 backer_location 匯出成這個 Parquet 資料夾 (需要 pyarrow)，None 代表不匯出。
+
+    Returns:
+        list: 所有分片 .db 的路徑。
+    """
+    shard_count = shard_count or os.cpu_count() or 1
+    df = pd.read_csv(file_link, usecols=['urls_web_project'])
+    db_paths = [db_template.format(shard_id + 1) for shard_id in range(shard_count)]
+
+    failed = []
+    with ProcessPoolExecutor(max_workers=shard_count) as executor:
+        futures = {
+            executor.submit(_crawl_shard, file_link, db_paths[shard_id],
+                            shard_indices(df, shard_count, shard_id, mode), location_concurrency, block_assets): db_paths[shard_id]
+            for shard_id in range(shard_count)
+        }
+        for future in as_completed(futures):
+            db_path = futures[future]
+            try:
+                future.result()
+                print(f"分片 {db_path} 已完成。")
+            except Exception as e:
+                failed.append(db_path)
+                print(f"分片 {db_path} 發生錯誤: {e}")
+
+    if failed:
+        # 用不完整的分片重建 merged_db 會蓋掉之前完整的合併結果，等全部分片完成後再合併
+        print(f"警告：以下分片未完成，重新執行即可從中斷處續爬：{failed}")
+        if merged_db:
+            print(f"有分片未完成，不合併到 '{merged_db}'。")
+        return db_paths
+    if merged_db:
+        merge_sqlite_databases(db_paths, merged_db, "backer_location")
+        if parquet_dir:
+            export_parquet(merged_db, parquet_dir)
+    return db_paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sharded Kickstarter backer location crawler")
+    parser.add_argument("csv", help="專案 CSV 檔案路徑")
+    parser.add_argument("--shards", type=int, default=None, help="分片 (process) 數量，預設為 CPU 核心數")
+    parser.add_argument("--mode", choices=["range", "hash"], default="range", help="分片方式")
+    parser.add_argument("--db-template", default="backer_city_{}.db", help="分片 .db 檔名格式")
+    parser.add_argument("--merged-db", default="merged_backer_data.db", help="合併後的 .db 檔案")
+    parser.add_argument("--concurrency", type=int, default=1, help="每個分片同時解析地點頁面的上限")
+    parser.add_argument("--no-block-assets", action="store_true", help="不擋圖片、字型、影音與第三方請求")
+    parser.add_argument("--parquet", default=None, help="合併後匯出成這個 Parquet 資料夾 (需要 pyarrow)")
+    args = parser.parse_args()
+
+    crawl_sharded(args.csv, args.shards, args.mode, args.db_template, args.merged_db, args.concurrency,
+                  not args.no_block_assets, args.parquet)
@@ -0,0 +1,120 @@
+import json
+import os
+import threading
+import time
+from typing import Dict
+from playwright.sync_api import Browser
+from http_fetch import BASE_URL
+from rate_limiter import AdaptiveRateLimiter, BlockedError, guarded_goto
+
+
+def storage_state_path(db_path: str) -> str:
+    """
+    storage state 檔案放在輸出 .db 的同一個資料夾，分片的 process 共用同一份。
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), "storage_state.json")
+
+
+class StorageStateManager:
+    """
+    先用一個全新的 context 通過一次網站 (含驗證)，把 cookies / localStorage 存成 storage_state 檔案，
+    之後每個新的 context 都從這份檔案建立，不用每次都從零開始、也不用為了避開驗證重新啟動 browser。
+    每個 context 仍然是獨立的 (關閉後不會寫回檔案)，只是起點相同。
+
+    更新時機：
+    - 檔案不存在或超過 max_age_seconds
+    - 已經被 max_uses 個 context 使用過
+    - 使用這份 state 的頁面被擋 (invalidate())，代表這組 cookies 可能已經被標記
+
+    Args:
+        path (str): storage_state JSON 檔案路徑。
+        warmup_url (str): 取得 state 時開啟的頁面。
+        warmup_selector (str): 取得 state 時等待出現的元素。
+        max_age_seconds (float): state 的有效秒數。
+        max_uses (int): 每份 state 最多給幾個 context 使用，None 代表不限。
+        limiter (AdaptiveRateLimiter): 取得 state 的導覽也算進速率限制。
+        retry_after (float): 取得失敗後隔幾秒才再試，這段期間改用全新的 context。
+    """
+    def __init__(self, path: str, warmup_url: str = BASE_URL + "/discover", warmup_selector: str = "body",
+                 max_age_seconds: float = 3600, max_uses: int | None = 500,
+                 limiter: AdaptiveRateLimiter | None = None, retry_after: float = 300):
+        self.path = path
+        self.warmup_url = warmup_url
+        self.warmup_selector = warmup_selector
+        self.max_age_seconds = max_age_seconds
+        self.max_uses = max_uses
+        self.limiter = limiter
+        self.retry_after = retry_after
+        self.uses = 0
+        self.captures = 0
+        self.invalidations = 0
+        self.capture_failures = 0
+        self._invalid = False
+        self._next_capture_at = 0.0
+        self._lock = threading.Lock()
+
+    def _needs_refresh(self) -> bool:
+        if self._invalid or not os.path.exists(self.path):
+            return True
+        if time.time() - os.path.getmtime(self.path) >= self.max_age_seconds:
+            return True
+        return self.max_uses is not None and self.uses >= self.max_uses
+
+    def capture(self, browser: Browser) -> bool:
+        """
+        用全新的 context 開啟 warmup_url，沒有被擋就把 storage state 寫入檔案 (先寫暫存檔再取代)。
+        """
+        context = browser.new_context()
+        try:
+            page = context.new_page()
+            guarded_goto(page, self.warmup_url, self.limiter, self.warmup_selector)
+            state = context.storage_state()
+        except Exception as e:
+            self.capture_failures += 1
+            self._next_capture_at = time.monotonic() + self.retry_after
+            print(f"[storage_state] 取得 storage state 失敗，這次使用全新的 context: {e}")
+            return False
+        finally:
+            context.close()
+
+        # 多個分片 process 可能同時更新，暫存檔名加上 pid 避免互相覆蓋
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+        self.captures += 1
+        self.uses = 0
+        self._invalid = False
+        print(f"[storage_state] 已更新 {self.path} (cookies {len(state.get('cookies', []))} 個)")
+        return True
+
+    def context_options(self, browser: Browser) -> Dict:
+        """
+        回傳傳給 browser.new_context 的參數。需要更新時先用這個 browser 重新取得 state；
+        取得失敗時回傳空的 dict (和原本一樣使用全新的 context)。
+        """
+        with self._lock:
+            if self._needs_refresh():
+                # 剛失敗過就先不重試，避免每個 context 都多一次會被擋的導覽
+                if time.monotonic() < self._next_capture_at or not self.capture(browser):
+                    return {}
+            self.uses += 1
+            return {"storage_state": self.path}
+
+    def invalidate(self, reason: str = ""):
+        with self._lock:
+            if not self._invalid:
+                self.invalidations += 1
+                print(f"[storage_state] 使用中的 storage state 被擋 ({reason})，下一個 context 會重新取得")
+            self._invalid = True
+
+    def watch(self, error: Exception):
+        """
+        context 使用中拋出的例外是封鎖 (BlockedError.blocked) 時標記 state 失效，元素沒出現不算。
+        """
+        if isinstance(error, BlockedError) and error.blocked:
+            self.invalidate(error.reason)
+
+    def report(self):
+        print(f"[storage_state] 取得 {self.captures} 次 (失敗 {self.capture_failures} 次)，"
+              f"因封鎖失效 {self.invalidations} 次，目前這份已使用 {self.uses} 次")
@@ -0,0 +1,198 @@
+import argparse
+import signal
+import subprocess
+import sys
+import time
+from typing import List
+from process_tree import ProcessInfo, chromium_processes, kill_processes, process_tree
+
+EXIT = "exit"
+RSS = "rss"
+CHROMIUM = "chromium"
+
+
+def _log(message: str):
+    print(f"[{time.strftime('%H:%M:%S')}] [supervisor] {message}", flush=True)
+
+
+class Supervisor:
+    """
+    取代 run_scraper.ps1：啟動爬蟲 worker，監看它的記憶體與 Chromium 子 process，必要時重新啟動。
+    worker 的進度都在 .db 的 crawl_queue / backer_href_progress 中，重新啟動後會從中斷的地方繼續。
+
+    - worker 正常結束 (exit code 0)：爬取完成，supervisor 也結束；
+      crawl_csv 還有可以重試的失敗索引時 worker 以 exit code 1 結束，會被重新啟動
+    - worker 整個 process 樹的 RSS 超過 max_rss_mb，或 Chromium process 超過 max_chromium 個 (browser 沒有被關掉)：
+      先送 SIGTERM 讓 worker 寫完資料並釋放租約，再立即重新啟動 (回收，不算失敗)；
+      Windows 的 terminate() 是 TerminateProcess，worker 沒有機會寫完資料，所以 worker 在新的 process group
+      中啟動，改送 CTRL_BREAK_EVENT (worker 以 SIGBREAK 接收，和 SIGTERM 一樣處理)
+    - worker 異常結束：restart_delay 秒後重新啟動；短時間內連續失敗時等待時間以 backoff_base 倍數增加，
+      上限 backoff_max；worker 執行超過 healthy_after 秒後才結束的失敗重新從 restart_delay 開始
+    - worker 結束後還留著的 Chromium 會被強制結束
+
+    只需要 subprocess，Linux / Windows 都能執行；量測 RSS 使用 psutil (列在 requirements.txt 中)，
+    沒有安裝 psutil 時在 Linux 上改讀 /proc，兩者都沒有 (例如 Windows 沒有 psutil) 時只做重新啟動，不做記憶體回收。
+
+    Args:
+        command (list): 啟動 worker 的指令。
+        max_rss_mb (float): worker process 樹 (含 driver、Chromium) 的 RSS 上限 (MB)，None 代表不限。
+        max_chromium (int): worker 底下 Chromium process 數量上限，None 代表不限。
+        check_interval (float): 每隔幾秒檢查一次。
+        restart_delay (float): 回收或第一次失敗後等待幾秒重新啟動。
+        backoff_base (float): 連續失敗時等待時間的倍數。
+        backoff_max (float): 等待時間上限 (秒)。
+        healthy_after (float): worker 執行超過幾秒才失敗時，連續失敗次數歸零。
+        stop_timeout (float): 送出 SIGTERM (Windows 為 CTRL_BREAK_EVENT) 後等待幾秒才強制結束。
+        max_restarts (int): 最多重新啟動幾次，None 代表不限。
+    """
+    def __init__(self, command: List[str], max_rss_mb: float | None = 3000, max_chromium: int | None = 40,
+                 check_interval: float = 5, restart_delay: float = 3, backoff_base: float = 2,
+                 backoff_max: float = 300, healthy_after: float = 600, stop_timeout: float = 60,
+                 max_restarts: int | None = None):
+        self.command = command
+        self.max_rss_mb = max_rss_mb
+        self.max_chromium = max_chromium
+        self.check_interval = check_interval
+        self.restart_delay = restart_delay
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.healthy_after = healthy_after
+        self.stop_timeout = stop_timeout
+        self.max_restarts = max_restarts
+        self.starts = 0
+        self.recycles = 0
+        self.crashes = 0
+        self.peak_rss_mb = 0.0
+        self._failures = 0
+        self._chromium: List[ProcessInfo] = []
+
+    def _watch(self, proc: subprocess.Popen) -> str:
+        # 等待 worker 結束，或回傳需要回收的原因
+        unmeasurable = False
+        while True:
+            try:
+                proc.wait(timeout=self.check_interval)
+                return EXIT
+            except subprocess.TimeoutExpired:
+                pass
+
+            tree = process_tree(proc.pid)
+            if tree is None:
+                if not unmeasurable:
+                    unmeasurable = True
+                    _log("這個平台無法量測 RSS (請安裝 psutil)，只在 worker 結束時重新啟動")
+                continue
+            self._chromium = chromium_processes(tree)
+            rss_mb = sum(p.rss for p in tree) / 1024 / 1024
+            self.peak_rss_mb = max(self.peak_rss_mb, rss_mb)
+            if self.max_rss_mb is not None and rss_mb > self.max_rss_mb:
+                _log(f"worker RSS {rss_mb:.0f} MB 超過上限 {self.max_rss_mb} MB，回收")
+                return RSS
+            if self.max_chromium is not None and len(self._chromium) > self.max_chromium:
+                _log(f"worker 底下有 {len(self._chromium)} 個 Chromium process，超過上限 {self.max_chromium}，回收")
+                return CHROMIUM
+
+    def _stop(self, proc: subprocess.Popen):
+        # SIGTERM / SIGBREAK 時 worker 會把佇列中的資料寫完 (BackerLocationWriter.install_signal_handlers)
+        if sys.platform == "win32":
+            proc.send_signal(signal.CTRL_BREAK_EVENT)
+        else:
+            proc.terminate()
+        try:
+            proc.wait(timeout=self.stop_timeout)
+        except subprocess.TimeoutExpired:
+            _log(f"worker 在 {self.stop_timeout} 秒內沒有結束，強制結束")
+            proc.kill()
+            proc.wait()
+
+    def _kill_leftover_chromium(self):
+        # worker 結束後 Chromium 會被移到 init 底下，以最後一次看到的 pid 和名稱確認還是同一個 process
+        leftover = []
+        for chromium in self._chromium:
+            tree = process_tree(chromium.pid)
+            if tree and tree[0].pid == chromium.pid and tree[0].name == chromium.name:
+                leftover.append(chromium.pid)
+        if leftover:
+            _log(f"強制結束遺留的 Chromium process {len(leftover)} 個")
+            kill_processes(leftover)
+        self._chromium = []
+
+    def _delay(self, reason: str, elapsed: float) -> float:
+        if reason != EXIT:
+            return self.restart_delay
+        if elapsed >= self.healthy_after:
+            self._failures = 0
+        self._failures += 1
+        return min(self.backoff_max, self.restart_delay * self.backoff_base ** (self._failures - 1))
+
+    def run(self) -> int:
+        """
+        監看並重新啟動 worker，直到 worker 正常結束或達到 max_restarts，回傳 worker 最後的 exit code。
+        """
+        while True:
+            _log(f"啟動 worker: {' '.join(self.command)}")
+            started = time.monotonic()
+            # Windows 上 CTRL_BREAK_EVENT 只能送給 process group，worker 需要自己的 group
+            creationflags = subprocess.CREATE_NEW_PROCESS_GROUP if sys.platform == "win32" else 0
+            proc = subprocess.Popen(self.command, creationflags=creationflags)
+            self.starts += 1
+            try:
+                reason = self._watch(proc)
+                if reason != EXIT:
+                    self._stop(proc)
+            except KeyboardInterrupt:
+                _log("收到中斷，停止 worker")
+                self._stop(proc)
+                self._kill_leftover_chromium()
+                return 130
+            self._kill_leftover_chromium()
+
+            elapsed = time.monotonic() - started
+            if reason == EXIT and proc.returncode == 0:
+                _log(f"worker 已完成 (執行 {elapsed:.0f} 秒)")
+                return 0
+            if reason == EXIT:
+                self.crashes += 1
+                _log(f"worker 異常結束 (exit code {proc.returncode}，執行 {elapsed:.0f} 秒)")
+            else:
+                self.recycles += 1
+
+            if self.max_restarts is not None and self.starts > self.max_restarts:
+                _log(f"已重新啟動 {self.max_restarts} 次，停止")
+                return proc.returncode or 1
+            delay = self._delay(reason, elapsed)
+            _log(f"{delay:.1f} 秒後重新啟動 (回收 {self.recycles} 次，異常結束 {self.crashes} 次)")
+            try:
+                time.sleep(delay)
+            except KeyboardInterrupt:
+                return 130
+
+    def report(self):
+        _log(f"啟動 worker {self.starts} 次，回收 {self.recycles} 次，異常結束 {self.crashes} 次，"
+             f"最大 RSS {self.peak_rss_mb:.0f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="監看爬蟲 worker 的記憶體並在結束或過大時重新啟動 (取代 run_scraper.ps1)",
+        usage="python supervisor.py [options] [-- command ...]")
+    parser.add_argument("--max-rss-mb", type=float, default=3000, help="worker process 樹的 RSS 上限 (MB)，0 代表不限")
+    parser.add_argument("--max-chromium", type=int, default=40, help="Chromium process 數量上限，0 代表不限")
+    parser.add_argument("--check-interval", type=float, default=5, help="每隔幾秒檢查一次")
+    parser.add_argument("--restart-delay", type=float, default=3, help="重新啟動前等待的秒數")
+    parser.add_argument("--backoff-max", type=float, default=300, help="連續失敗時等待秒數的上限")
+    parser.add_argument("--healthy-after", type=float, default=600, help="執行超過幾秒後失敗次數歸零")
+    parser.add_argument("--max-restarts", type=int, default=None, help="最多重新啟動幾次，不指定則不限")
+    parser.add_argument("command", nargs=argparse.REMAINDER,
+                        help="啟動 worker 的指令 (放在 -- 之後)，預設為 python get_backer_city_state.py")
+    args = parser.parse_args()
+
+    command = args.command[1:] if args.command[:1] == ["--"] else args.command
+    supervisor = Supervisor(command or [sys.executable, "get_backer_city_state.py"],
+                            max_rss_mb=args.max_rss_mb or None, max_chromium=args.max_chromium or None,
+                            check_interval=args.check_interval, restart_delay=args.restart_delay,
+                            backoff_max=args.backoff_max, healthy_after=args.healthy_after,
+                            max_restarts=args.max_restarts)
+    exit_code = supervisor.run()
+    supervisor.report()
+    sys.exit(exit_code)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 專案的模組都在最上層，讓測試可以直接 import
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,64 @@
+import os
+from typing import List
+import pytest
+from playwright.sync_api import Page, sync_playwright
+from location_extract import LOCATION_SECONDARY_SELECTOR, extract_location_rows, extract_us_location_hrefs
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "community_locations.html")
+
+
+def _legacy_us_location_hrefs(page: Page) -> List[str | None]:
+    # run 改用 eval_on_selector_all 之前的 locator 邏輯，逐行保留作為比對基準
+    elements = page.locator(LOCATION_SECONDARY_SELECTOR).all()
+    href_list = []
+    for element in elements:
+        if element.all_inner_texts()[0] != 'United States':
+            href_list.append(None)
+        else:
+            # 向上2層
+            parent = element.locator("xpath=../..")
+            # 在同一層找 .primary-text.js-location-primary-text 並click第一個match項目
+            primary_text_element = parent.locator(".primary-text.js-location-primary-text").first
+            ## 拿取 html a element
+            link_element = primary_text_element.locator("a").first
+            href = link_element.get_attribute("href")
+            href_list.append(href)
+    return href_list
+
+
+@pytest.fixture(scope="module")
+def page():
+    with sync_playwright() as playwright:
+        try:
+            browser = playwright.chromium.launch(headless=True)
+        except Exception as e:
+            pytest.skip(f"無法啟動 chromium (請先執行 playwright install chromium): {e}")
+        page = browser.new_page()
+        with open(FIXTURE, encoding="utf-8") as f:
+            page.set_content(f.read())
+        yield page
+        browser.close()
+
+
+def test_matches_legacy_locator_logic(page):
+    assert extract_us_location_hrefs(page) == _legacy_us_location_hrefs(page)
+
+
+def test_us_location_hrefs(page):
+    assert extract_us_location_hrefs(page) == [
+        "/discover/places/brooklyn-ny",
+        None,
+        "/discover/places/austin-tx",
+        "/discover/places/portland-or",
+        "/discover/places/seattle-wa",
+        "https://www.kickstarter.com/discover/places/chicago-il?ref=community",
+        None,
+        None,
+        "/discover/places/san-jos%C3%A9-ca",
+        None,
+    ]
+
+
+def test_rows_keep_page_order(page):
+    rows = extract_location_rows(page)
+    assert [row["secondary_text"] for row in rows] == page.locator(LOCATION_SECONDARY_SELECTOR).all_inner_texts()
@@ -0,0 +1,44 @@
+WAIT_MODES = ("load", "domcontentloaded", "commit", "selector")
+
+
+class WaitStrategy:
+    """
+    guarded_goto 導覽時等到什麼程度才開始讀取元素。
+
+    - "load": page.goto 預設，等所有子資源 (圖片、script ...) 載入完，和原本相同
+    - "domcontentloaded": HTML 解析完就開始，不等子資源
+    - "commit": 收到回應就開始，目標元素一出現 (attached) 就讀取；適合只讀一個元素的頁面 (地點頁面)
+    - "selector": 和 commit 相同，但頁面需要讀取所有符合的元素時 (community 頁面的地點列表)，
+                  元素出現後再等 HTML 解析完，避免只讀到一部分的列表
+
+    commit / selector 會先等目標元素，等不到才檢查是不是驗證頁面 (元素出現就代表不是驗證頁面)。
+
+    Args:
+        mode (str): 上述其中一種。
+        goto_timeout (float): page.goto 的逾時 (毫秒)。
+        selector_timeout (float): 等待目標元素的逾時 (毫秒)，None 代表使用呼叫端各自的設定。
+    """
+    def __init__(self, mode: str = "selector", goto_timeout: float = 30000, selector_timeout: float | None = None):
+        if mode not in WAIT_MODES:
+            raise ValueError(f"wait mode must be one of {WAIT_MODES}, got {mode!r}")
+        self.mode = mode
+        self.goto_timeout = goto_timeout
+        self.selector_timeout = selector_timeout
+
+    @property
+    def wait_until(self) -> str:
+        return "commit" if self.mode == "selector" else self.mode
+
+    @property
+    def selector_first(self) -> bool:
+        return self.wait_until == "commit"
+
+    def selector_timeout_or(self, default: float) -> float:
+        return default if self.selector_timeout is None else self.selector_timeout
+
+    def __repr__(self):
+        return f"WaitStrategy({self.mode!r})"
+
+
+# 沒有指定時和原本一樣等 load
+DEFAULT_WAIT = WaitStrategy("load")
@@ -0,0 +1,200 @@
+import os
+import socket
+import sqlite3
+import time
+from typing import Dict, Iterable, List
+
+PENDING = "pending"
+IN_PROGRESS = "in_progress"
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+
+class WorkQueue:
+    """
+    存在輸出 .db 中的工作佇列，每個 CSV 索引一列，記錄狀態 (pending / in_progress / done / failed / skipped)、
+    嘗試次數、租約時間與最後一次錯誤，取代用 MAX("index") 續爬。
+
+    - claim() 在一個 IMMEDIATE transaction 內取出並鎖定一批索引，多個 worker 不會拿到同一筆
+    - 租約過期 (worker 當掉) 的索引會回到 pending
+    - 失敗的索引在 retry_delay 秒後重試，最多 max_attempts 次
+
+    Args:
+        db_path (str): 輸出的 .db 檔案路徑。
+        table_name (str): 佇列表格名稱。
+        lease_seconds (float): 租約秒數，要大於處理一批所需的時間。
+        max_attempts (int): 每個索引最多嘗試幾次。
+        retry_delay (float): 失敗後至少等幾秒才重試。
+    """
+    def __init__(self, db_path: str, table_name: str = "crawl_queue", lease_seconds: float = 1800,
+                 max_attempts: int = 3, retry_delay: float = 300):
+        self.db_path = db_path
+        self.table_name = table_name
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        # isolation_level=None 讓我們自己控制 BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL;")
+        self._conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table_name} (
+                idx INTEGER PRIMARY KEY,
+                status TEXT NOT NULL DEFAULT '{PENDING}',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_at REAL,
+                worker TEXT,
+                last_error TEXT,
+                updated_at REAL
+            );
+        ''')
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_status ON {table_name} (status);")
+
+    def seed(self, indices: Iterable[int], done_table: str | None = "backer_location", done_key: str = "index"):
+        """
+        把索引加入佇列 (已存在的不變)。
+        done_table 中已經有資料的索引 (舊版用 MAX("index") 續爬時寫入的) 直接標記為 done。
+        done_table 可以是表格或 view (schema="normalized" 時 backer_location 是 view)。
+        """
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.executemany(
+                f"INSERT OR IGNORE INTO {self.table_name} (idx, status, updated_at) VALUES (?, '{PENDING}', ?)",
+                ((int(i), now) for i in indices)
+            )
+            has_done_table = done_table and self._conn.execute(
+                "SELECT name FROM sqlite_master WHERE type IN ('table', 'view') AND name=?", (done_table,)
+            ).fetchone()
+            if has_done_table:
+                self._conn.execute(
+                    f'UPDATE {self.table_name} SET status = \'{DONE}\', updated_at = ? '
+                    f'WHERE status = \'{PENDING}\' AND idx IN (SELECT "{done_key}" FROM {done_table})',
+                    (now,)
+                )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def claim(self, batch_size: int = 10, min_idx: int | None = None, max_idx: int | None = None) -> List[int]:
+        """
+        取出最多 batch_size 個可以處理的索引並標記為 in_progress。
+        min_idx / max_idx 限制只取這個範圍內的索引 (分塊讀取 CSV 時只取目前這一塊)。
+        """
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            # 租約過期的放回 pending；等待夠久、次數未滿的失敗索引也放回 pending
+            self._conn.execute(
+                f"UPDATE {self.table_name} SET status = '{PENDING}', updated_at = ? "
+                f"WHERE status = '{IN_PROGRESS}' AND lease_at < ?",
+                (now, now - self.lease_seconds)
+            )
+            self._conn.execute(
+                f"UPDATE {self.table_name} SET status = '{PENDING}', updated_at = ? "
+                f"WHERE status = '{FAILED}' AND attempts < ? AND updated_at < ?",
+                (now, self.max_attempts, now - self.retry_delay)
+            )
+            rows = self._conn.execute(
+                f"SELECT idx FROM {self.table_name} WHERE status = '{PENDING}' AND idx BETWEEN ? AND ? "
+                f"ORDER BY idx LIMIT ?",
+                (-1 if min_idx is None else int(min_idx), 2**63 - 1 if max_idx is None else int(max_idx), batch_size)
+            ).fetchall()
+            indices = [row[0] for row in rows]
+            self._conn.executemany(
+                f"UPDATE {self.table_name} SET status = '{IN_PROGRESS}', attempts = attempts + 1, "
+                f"lease_at = ?, worker = ?, updated_at = ? WHERE idx = ?",
+                ((now, self.worker_id, now, i) for i in indices)
+            )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return indices
+
+    def mark_failed(self, idx: int, error: str):
+        self._conn.execute(
+            f"UPDATE {self.table_name} SET status = '{FAILED}', last_error = ?, lease_at = NULL, updated_at = ? "
+            f"WHERE idx = ?",
+            (error, time.time(), int(idx))
+        )
+
+    def mark_deferred(self, idx: int, reason: str):
+        """
+        暫時不能處理的索引 (例如同一個專案正由其他索引處理中)：和失敗一樣在 retry_delay 之後重試，
+        但不消耗嘗試次數。
+        """
+        self._conn.execute(
+            f"UPDATE {self.table_name} SET status = '{FAILED}', attempts = MAX(attempts - 1, 0), last_error = ?, "
+            f"lease_at = NULL, updated_at = ? WHERE idx = ?",
+            (reason, time.time(), int(idx))
+        )
+
+    def mark_done(self, idx: int):
+        self._conn.execute(
+            f"UPDATE {self.table_name} SET status = '{DONE}', last_error = NULL, lease_at = NULL, updated_at = ? "
+            f"WHERE idx = ?",
+            (time.time(), int(idx))
+        )
+
+    def mark_skipped(self, idx: int, reason: str):
+        """
+        不需要爬取的索引 (例如其他分片已經完成的重複專案)，結果不寫入這個 .db，之後也不會重試。
+        """
+        self._conn.execute(
+            f"UPDATE {self.table_name} SET status = '{SKIPPED}', last_error = ?, lease_at = NULL, updated_at = ? "
+            f"WHERE idx = ?",
+            (reason, time.time(), int(idx))
+        )
+
+    def mark_done_in_transaction(self, conn: sqlite3.Connection, indices: List[int]):
+        """
+        給 BackerLocationWriter 的 after_write 使用：和結果寫在同一個 transaction 中標記 done，
+        資料寫入與狀態更新不會只成功一半。
+        """
+        now = time.time()
+        conn.executemany(
+            f"UPDATE {self.table_name} SET status = '{DONE}', last_error = NULL, lease_at = NULL, updated_at = ? "
+            f"WHERE idx = ?",
+            ((now, int(i)) for i in indices)
+        )
+
+    def release(self):
+        """
+        把這個 worker 還沒處理完的 in_progress 索引放回 pending，正常結束或例外時呼叫，不用等租約過期。
+        """
+        self._conn.execute(
+            f"UPDATE {self.table_name} SET status = '{PENDING}', lease_at = NULL, updated_at = ? "
+            f"WHERE status = '{IN_PROGRESS}' AND worker = ?",
+            (time.time(), self.worker_id)
+        )
+
+    def retryable(self) -> List[int]:
+        """
+        失敗但還沒用完 max_attempts 次的索引 (不論是否已經等待 retry_delay)。
+        """
+        return [row[0] for row in self._conn.execute(
+            f"SELECT idx FROM {self.table_name} WHERE status = '{FAILED}' AND attempts < ? ORDER BY idx",
+            (self.max_attempts,)
+        )]
+
+    def next_retry_at(self) -> float | None:
+        """
+        最早一個可以重試的失敗索引在什麼時間 (time.time()) 可以被 claim()，沒有可以重試的索引時回傳 None。
+        """
+        (updated_at,) = self._conn.execute(
+            f"SELECT MIN(updated_at) FROM {self.table_name} WHERE status = '{FAILED}' AND attempts < ?",
+            (self.max_attempts,)
+        ).fetchone()
+        return None if updated_at is None else updated_at + self.retry_delay
+
+    def counts(self) -> Dict[str, int]:
+        return dict(self._conn.execute(f"SELECT status, COUNT(*) FROM {self.table_name} GROUP BY status").fetchall())
+
+    def report(self):
+        print(f"[work_queue] {self.counts()}")
+
+    def close(self):
+        self._conn.close()